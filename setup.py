@@ -36,9 +36,12 @@ setuptools.setup(
         'typing_extensions',
         'cloudpickle',
         'boto3',
-        'retrying'
+        'retrying',
+        # pickle_func compresses with these whenever the client has them, so the runtime always needs them
+        'zstandard',
+        'lz4'
     ],
-    extra_requires={
+    extras_require={
         'client': [
             'sagemaker'
         ]
@@ -0,0 +1,171 @@
+"""Reuse the results of earlier jobs when the code and the arguments have not changed.
+
+A call is identified by the hash of the pickled function, the image, the instance count,
+the environment definition and a fingerprint of every argument. The function is pickled
+for every key, so a change to a value it captures changes the key too. Sets are pickled with
+their members in a fixed order, so the key of a call is the same in every process. An entry maps that key
+to the job that ran the call and the URI of its return value. Entries are small JSON
+objects under ``<root>/pathway-cache/`` in S3, or in the local store for local jobs, so
+the cache is shared by every process that uses the same bucket.
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Union
+
+import hashlib
+import json
+import threading
+import time
+
+from pathway.runtime import serializers
+from pathway.runtime.batch import split_item_uri
+from pathway.runtime.dataset import Input, Output, DataObject, _AsyncDataObject, _StoredDataObject, Job, \
+    is_primitive
+from pathway.runtime.transfer import delete_object, list_objects, object_info, read_bytes, write_bytes
+
+CACHE_PREFIX = 'pathway-cache'
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+_caches: Dict[str, 'ResultCache'] = {}
+_caches_lock = threading.Lock()
+
+
+@dataclass
+class CacheEntry:
+    job_name: str
+    result: Optional[str]
+    created: float
+
+
+class ResultCache:
+    """Entries under ``root_uri`` that expire after ``ttl`` seconds.
+
+    Once there are more than ``max_entries``, the oldest are evicted. An entry is also
+    dropped when its result object no longer exists. Evicting an entry leaves the result
+    object itself in place.
+    """
+
+    def __init__(self, root_uri: str, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self._root_uri = root_uri.rstrip('/')
+        self._ttl = ttl
+        self._max_entries = max_entries
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    def key(self, func: Callable, image_uri: str, instance_count: int,
+            environment_definition: Optional[str], arguments_dict: Dict,
+            serialized: Optional[Dict[str, serializers.Serialized]] = None,
+            code_digest: Optional[str] = None) -> Optional[str]:
+        """The key of a call, or None if an argument cannot be fingerprinted yet; see :func:`call_key`."""
+        return call_key(func, image_uri, instance_count, environment_definition, arguments_dict, serialized,
+                        code_digest)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        uri = self._entry_uri(key)
+        if object_info(uri) is None:
+            return None
+        entry = CacheEntry(**json.loads(read_bytes(uri)))
+        if time.time() - entry.created > self._ttl or \
+                (entry.result is not None and object_info(entry.result) is None):
+            delete_object(uri)
+            return None
+        return entry
+
+    def put(self, key: str, job_name: str, result: Optional[str]):
+        entry = CacheEntry(job_name=job_name, result=result, created=time.time())
+        write_bytes(self._entry_uri(key), json.dumps(entry.__dict__).encode())
+        self._evict()
+
+    def record(self, job: Job, key: str):
+        """Add an entry for ``job`` once it completes; failed and stopped jobs are not cached."""
+        if job.results is not None:
+            job.results._cache_key = key
+
+        def done(finished: Job):
+            if finished.is_completed():
+                self.put(key, finished.job_name, None if finished.results is None else finished.results._path)
+
+        job.add_done_callback(done)
+
+    def _entry_uri(self, key: str) -> str:
+        return f'{self._root_uri}/{CACHE_PREFIX}/{key}.json'
+
+    def _evict(self):
+        now = time.time()
+        entries = sorted(list_objects(f'{self._root_uri}/{CACHE_PREFIX}/'), key=lambda info: info.modified)
+        expired = [info for info in entries if now - info.modified > self._ttl]
+        live = entries[len(expired):]
+        for info in expired + live[:max(0, len(live) - self._max_entries)]:
+            delete_object(info.uri)
+
+
+def get_cache(cache: Union[bool, ResultCache], root_uri: str) -> Optional[ResultCache]:
+    """The cache for the ``cache`` argument of a job: None, the given one, or the shared one for a root."""
+    if isinstance(cache, ResultCache):
+        return cache
+    if not cache:
+        return None
+    with _caches_lock:
+        if root_uri not in _caches:
+            _caches[root_uri] = ResultCache(root_uri)
+        return _caches[root_uri]
+
+
+def call_key(func: Callable, image_uri: str, instance_count: int, environment_definition: Optional[str],
+             arguments_dict: Dict, serialized: Optional[Dict[str, serializers.Serialized]] = None,
+             code_digest: Optional[str] = None) -> Optional[str]:
+    """The hash of a call, or None if an argument cannot be fingerprinted yet, e.g. the result of a running job.
+
+    Arguments that are serialized to be hashed are added to ``serialized`` by name, to be
+    uploaded from there. ``code_digest`` is the digest of ``func`` from
+    ``pathway.util._pickle_func``, when the caller has just pickled it.
+    """
+    from .util import _pickle_func
+
+    digest = hashlib.sha256()
+    digest.update((code_digest or _pickle_func(func)[1]).encode())
+    digest.update(f'\0{image_uri}\0{instance_count}\0'.encode())
+    if environment_definition:
+        with open(environment_definition, 'rb') as file:
+            digest.update(hashlib.sha256(file.read()).digest())
+    for name, value in sorted(arguments_dict.items()):
+        fingerprint = _fingerprint(value)
+        if isinstance(fingerprint, serializers.Serialized):
+            if serialized is not None:
+                serialized[name] = fingerprint
+            fingerprint = f'data:{fingerprint.digest}'
+        if fingerprint is None:
+            return None
+        digest.update(f'\0{name}\0{fingerprint}'.encode())
+    return digest.hexdigest()
+
+
+def _fingerprint(value) -> Union[str, serializers.Serialized, None]:
+    """A string that changes whenever the content of an argument does, or the serialized argument to hash."""
+    if is_primitive(type(value)):
+        return f'{type(value).__name__}:{value!r}'
+    if isinstance(value, Output):
+        return f'output:{value.path}'
+    if isinstance(value, Input):
+        versions = ','.join(f'{info.uri}@{info.version}' for info in list_objects(value.path))
+        return f'input:{value.path}:{value.sharding}:{value.record_delimiter.hex()}:{value.mode}:{versions}'
+    if isinstance(value, _AsyncDataObject):
+        if value._cache_key:
+            return f'result:{value._cache_key}'
+        if not value._job.is_completed():
+            print(f"not caching: the result at {value._path} is not ready yet")
+            return None
+        return _stored(value._path)
+    if isinstance(value, _StoredDataObject):
+        return _stored(value._path)
+
+    return serializers.Serialized(value.get() if isinstance(value, DataObject) else value)
+
+
+def _stored(path: str) -> str:
+    item = split_item_uri(path)
+    # an item of a batch result changes with the blob that holds it
+    return f'stored:{path}@{object_info(path if item is None else item[0]).version}'
+
@@ -5,26 +5,84 @@ from functools import wraps
 def processing_job(image_uri: str,
                    instance_type: str,
                    instance_count: int = 1,
-                   environment_definition: str = None):
+                   environment_definition: str = None,
+                   cache=False,
+                   input_mode: str = 'File',
+                   prefetch: bool = False):
+    """Run the decorated function as a processing job.
+
+    With ``cache=True``, or a :class:`pathway.cache.ResultCache`, a call with the same code
+    and arguments as an earlier completed job returns that job and its result instead of
+    launching a new one. In a pipeline it turns on SageMaker step caching instead, and
+    a ``sagemaker.workflow.steps.CacheConfig`` can be given to set the expiry.
+
+    Pickled arguments, results of other jobs and the return value are staged through
+    processing channels in ``input_mode``, 'File' or 'FastFile'. This is the default:
+    SageMaker downloads them before the container starts and uploads the return value
+    once it exits, so the job sees local paths instead of S3 URIs. Past the 10 inputs a
+    job can stage, the remaining arguments are read from S3 as before. With None the job
+    downloads and uploads them itself, as it did before channels were used.
+
+    With ``prefetch=True``, results are downloaded to the local disk cache in the
+    background as soon as their job completes, so ``get()`` reads them from disk.
+
+    ``.map`` submits one job per item, and ``.batch`` runs many calls per job. ``cache``
+    applies to ``.map`` but not to ``.batch``, whose jobs always run.
+    """
 
     def inner(func: Callable):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            from inspect import signature
-            from .invoke import run_processing_job
+            from .invoke import _function_plan, run_processing_job
 
-            # Getting the argument names of the
-            # called function
-            func_signature = signature(func)
-            argument_binding = func_signature.bind(*args, **kwargs)
-            arguments_dict = argument_binding.arguments
+            # the signature is inspected once, on the first call
+            arguments_dict = _function_plan(func).bind(*args, **kwargs)
 
             return run_processing_job(image_uri,
                                       instance_type=instance_type,
                                       instance_count=instance_count,
                                       environment_definition=environment_definition,
                                       func=func,
-                                      arguments_dict=arguments_dict)
+                                      arguments_dict=arguments_dict,
+                                      cache=cache,
+                                      input_mode=input_mode,
+                                      prefetch=prefetch)
+
+        def map(iterable, max_concurrency: int = 8, max_in_flight: int = None, **shared_kwargs):
+            """Submit one job per item of ``iterable``; see :func:`pathway.invoke.map_processing_jobs`."""
+            from .invoke import map_processing_jobs
+
+            return map_processing_jobs(image_uri,
+                                       instance_type=instance_type,
+                                       instance_count=instance_count,
+                                       environment_definition=environment_definition,
+                                       func=func,
+                                       iterable=iterable,
+                                       shared_arguments=shared_kwargs,
+                                       max_concurrency=max_concurrency,
+                                       max_in_flight=max_in_flight,
+                                       cache=cache,
+                                       input_mode=input_mode,
+                                       prefetch=prefetch)
+
+        def batch(iterable, per_job: int = 200, max_concurrency: int = 8, **shared_kwargs):
+            """Run many calls per job; see :func:`pathway.invoke.batch_processing_jobs`."""
+            from .invoke import batch_processing_jobs
+
+            return batch_processing_jobs(image_uri,
+                                         instance_type=instance_type,
+                                         instance_count=instance_count,
+                                         environment_definition=environment_definition,
+                                         func=func,
+                                         iterable=iterable,
+                                         shared_arguments=shared_kwargs,
+                                         per_job=per_job,
+                                         max_concurrency=max_concurrency,
+                                         input_mode=input_mode,
+                                         prefetch=prefetch)
+
+        wrapper.map = map
+        wrapper.batch = batch
         return wrapper
 
     return inner
@@ -1,30 +1,123 @@
-import boto3
-from pathway.runtime.dataset import Input, Output, DataObject, _AsyncDataObject, Job, _PickleDataLoader
-from sagemaker.processing import Processor, ProcessingInput, ProcessingOutput
-from sagemaker.session import Session
-from sagemaker.workflow.pipeline_context import PipelineSession
-from sagemaker.workflow.steps import ProcessingStep
-from typing import Callable, Dict, List, get_type_hints, Optional
-from .util import pickle_func, sagemaker_timestamp, upload_code_package
+from pathway.runtime import clients
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathway.runtime.dataset import Input, Output, DataObject, _AsyncDataObject, _StoredDataObject, Job, \
+    _PickleDataLoader
+from retrying import retry
+from typing import Callable, Dict, Iterable, Iterator, List, get_type_hints, Optional, Tuple, Union, TYPE_CHECKING
+from pathway.runtime.batch import BATCH_SUFFIX, item_uri, split_item_uri
+from .cache import DEFAULT_TTL, ResultCache, call_key, get_cache
+from .util import _pickle_func, pickle_func, sagemaker_timestamp, upload_environment_definition
+from .monitor import JobMonitor, get_monitor, wait_any
 from .pipeline import PipelineContext
+from .scheduler import DagScheduler, upstream_jobs
 
+import inspect
 import os
+import secrets
+import threading
+import weakref
+
+# the SageMaker SDK takes seconds to import; it is only loaded to submit a job
+if TYPE_CHECKING:
+    from sagemaker.processing import Processor, ProcessingInput, ProcessingOutput
+    from sagemaker.session import Session
+
+REGION = 'us-east-2'
+
+# runs the job in a local process instead of a SageMaker instance; see pathway.local
+LOCAL_INSTANCE_TYPE = 'local'
+
+PROCESSING_DIR = '/opt/ml/processing'
+# the limit of ProcessingInputs per job; further arguments are downloaded by the runtime
+MAX_PROCESSING_INPUTS = 10
+# jobs of this process that run at a time, the others wait in the scheduler; 0 for no limit
+MAX_RUNNING_JOBS = int(os.environ.get('PATHWAY_MAX_RUNNING_JOBS', 0))
+
+# the arguments of a pipeline step go under <bucket>/pipelines/<pipeline>/<step>, and its
+# outputs under <bucket>/pipelines/<pipeline>/<step>/<execution id>/outputs
+PIPELINE_PREFIX = 'pipelines'
+# step names are at most 64 characters: the function name, a dash and the hash of the call
+_STEP_KEY_LENGTH = 12
+
+_THROTTLING_ERRORS = ('ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded')
+
+# how often map checks for finished submissions while it waits for running jobs
+_MAP_POLL_INTERVAL = 1.0
+
+_sagemaker_sessions: Dict[str, 'Session'] = {}
+_sagemaker_sessions_lock = threading.Lock()
+
+# function -> _FunctionPlan; entries go away with the function
+_plans = weakref.WeakKeyDictionary()
+_plans_lock = threading.Lock()
+
+_scheduler = DagScheduler(MAX_RUNNING_JOBS or None)
+
+
+class _FunctionPlan:
+    """What every submission of a function shares, worked out on its first call.
+
+    Later calls only bind and marshal their argument values. The function itself is
+    pickled on every submission, as the values it captures may have changed.
+    """
+
+    def __init__(self, func: Callable):
+        self.signature = inspect.signature(func)
+        self.returns = 'return' in get_type_hints(func)
+
+    def bind(self, *args, **kwargs) -> Dict:
+        return self.signature.bind(*args, **kwargs).arguments
+
+
+def _function_plan(func: Callable) -> _FunctionPlan:
+    plan = _plans.get(func)
+    if plan is None:
+        with _plans_lock:
+            plan = _plans.get(func)
+            if plan is None:
+                plan = _plans[func] = _FunctionPlan(func)
+    return plan
 
 
 class ProcessingJob(Job):
-    def __init__(self, job_name: str, sagemaker_session: Session, results=None):
+    def __init__(self, job_name: str, sagemaker_session: 'Session', results=None, started: bool = True):
         super().__init__(results)
         self._sagemaker_session = sagemaker_session
         self._job_name = job_name
         self._is_completed = False
+        # set once the scheduler submits the job, or gives up on it
+        self._started = threading.Event()
+        if started:
+            self._started.set()
+        else:
+            # not polled for until the scheduler submits it
+            self.monitor.hold(job_name)
+        self._failure: Optional[str] = None
+
+    @property
+    def job_name(self):
+        return self._job_name
+
+    @property
+    def monitor(self) -> JobMonitor:
+        """The shared monitor that tracks the status of this job."""
+        return get_monitor(self._sagemaker_session)
 
     def wait(self, logs=True):
         """Waits for the processing job to complete.
 
+        A job that was never submitted, because a job it depends on did not complete,
+        raises ValueError.
+
         Args:
             logs (bool): Whether to show the logs produced by the job (default: True).
 
         """
+        self._started.wait()
+        if self._failure is not None:
+            raise ValueError(self._failure)
         if logs:
             self._sagemaker_session.logs_for_processing_job(self._job_name, wait=True)
         else:
@@ -32,119 +125,602 @@ class ProcessingJob(Job):
 
     def describe(self):
         """Prints out a response from the DescribeProcessingJob API call."""
+        if not self._started.is_set():
+            return {'ProcessingJobName': self._job_name, 'ProcessingJobStatus': 'Pending'}
+        if self._failure is not None:
+            return {'ProcessingJobName': self._job_name, 'ProcessingJobStatus': self.status(),
+                    'FailureReason': self._failure}
         return self._sagemaker_session.describe_processing_job(self._job_name)
 
     def stop(self):
-        """Stops the processing job."""
-        self._sagemaker_session.stop_processing_job(self._job_name)
+        """Stops the processing job, or drops it if it is still waiting for the jobs it depends on."""
+        if _scheduler.cancel(self._job_name):
+            self._abandon(f"{self._job_name} was stopped before it was submitted", status='Stopped')
+            return
+        self._started.wait()
+        if self._failure is None:
+            self._sagemaker_session.stop_processing_job(self._job_name)
+
+    def status(self):
+        """The last status seen by the job monitor, or None if the job has not been listed yet."""
+        return self.monitor.status(self._job_name)
 
     def is_completed(self):
         if not self._is_completed:
-            describe_response = self._sagemaker_session.describe_processing_job(self._job_name)
-            self._is_completed = describe_response['ProcessingJobStatus'] == 'Completed'
+            self._is_completed = self.status() == 'Completed'
         return self._is_completed
 
+    def add_done_callback(self, callback: Callable):
+        """Call ``callback(job)`` once the job has completed, failed or stopped."""
+        self.monitor.add_done_callback(self._job_name, lambda job_name, status: callback(self))
+
+    def _abandon(self, reason: str, status: str = 'Failed'):
+        # the job never reaches SageMaker, so its status is set here
+        print(reason)
+        self._failure = reason
+        self._started.set()
+        self.monitor.track(self._job_name, status=status)
+
+
+def get_sagemaker_session(region_name: str) -> 'Session':
+    """The process-wide SageMaker session for a region, sharing the pooled boto3 clients.
+
+    The session resolves and caches the default bucket on first use; the lock keeps
+    concurrent submissions from resolving it more than once.
+    """
+    from sagemaker.session import Session
+
+    with _sagemaker_sessions_lock:
+        if region_name not in _sagemaker_sessions:
+            sagemaker_session = Session(boto_session=clients.boto_session(region_name),
+                                        sagemaker_client=clients.client('sagemaker', region_name))
+            sagemaker_session.default_bucket()
+            _sagemaker_sessions[region_name] = sagemaker_session
+        return _sagemaker_sessions[region_name]
+
 
 def run_processing_job(image_uri: str,
                        instance_type: str,
                        instance_count: int,
                        environment_definition: Optional[str],
                        func: Callable,
-                       arguments_dict: Dict):
-
-    boto3_session = boto3.session.Session(region_name='us-east-2')
+                       arguments_dict: Dict,
+                       cache: Union[bool, ResultCache] = False,
+                       input_mode: Optional[str] = 'File',
+                       batch: Optional[List[Dict]] = None,
+                       prefetch: bool = False,
+                       pickled_func: Optional[Tuple] = None):
+    """Submit a call of ``func`` as a processing job, or a step of the current pipeline.
+
+    The job runs ``func`` with the values its globals and closure have now. Submissions
+    that share those, like the jobs of one :func:`map_processing_jobs`, pass the pickle
+    from ``pathway.util._pickle_func`` as ``pickled_func``.
+
+    With ``batch``, a list of keyword arguments, the job calls ``func`` once per item
+    instead of with ``arguments_dict``, and its results are a list with one data object
+    per item; see :func:`batch_processing_jobs`. With ``prefetch``, results are downloaded
+    to the disk cache as soon as the job completes; see :mod:`pathway.runtime.disk_cache`.
+
+    By default pickled arguments, results of other jobs and the return value go through
+    processing channels in ``input_mode``; see :class:`_ProcessingChannels`. Arguments past
+    ``MAX_PROCESSING_INPUTS`` are read from S3. With ``input_mode=None`` the runtime
+    downloads and uploads them itself.
+
+    A job that takes the result of another job is submitted once that job completes;
+    see :mod:`pathway.scheduler`. The returned job stands for it in the meantime.
+
+    In a pipeline, the step name and the keys of the step arguments are derived from the
+    code and the arguments of the call, so an unchanged step has the same arguments in
+    every build. Its outputs go under the id of the pipeline execution, so executions that
+    run at the same time do not overwrite each other. ``cache``, True, a ``ResultCache`` for its ttl or a SageMaker
+    ``CacheConfig``, turns on step caching, and SageMaker then skips the unchanged steps.
+    """
+    pickled_func = pickled_func or _pickle_func(func)
+    if instance_type == LOCAL_INSTANCE_TYPE:
+        from .local import run_local_job
+        return run_local_job(image_uri, func, arguments_dict, cache=cache, batch=batch, pickled_func=pickled_func)
+
+    from sagemaker.processing import Processor
+    from sagemaker.workflow.pipeline_context import PipelineSession
+    from sagemaker.workflow.steps import ProcessingStep
+
+    sagemaker_session = get_sagemaker_session(REGION)
+    bucket = sagemaker_session.default_bucket()
+    pipeline_session = PipelineContext.get_current_pipeline_session()
+    if pipeline_session:
+        sagemaker_session = PipelineSession(boto_session=sagemaker_session.boto_session,
+                                            sagemaker_client=sagemaker_session.sagemaker_client,
+                                            default_bucket=bucket)
+    s3_client = clients.client('s3', REGION)
+
+    # pipelines are cached per step by SageMaker
+    result_cache = None if pipeline_session or batch is not None else get_cache(cache, f"s3://{bucket}")
+    # arguments serialized to compute a key are uploaded from there
+    serialized = {}
+    cache_key = result_cache and result_cache.key(func, image_uri, instance_count, environment_definition,
+                                                  arguments_dict, serialized, pickled_func[1])
+    entry = cache_key and result_cache.get(cache_key)
+    if entry:
+        print(f"{func.__name__}: reusing the result of {entry.job_name}")
+        job = ProcessingJob(sagemaker_session=sagemaker_session, job_name=entry.job_name)
+        job.monitor.track(entry.job_name, status='Completed')
+        job._metrics_uri = f"s3://{bucket}/{entry.job_name}/outputs/metrics"
+        if entry.result is not None:
+            job._results = _AsyncDataObject(job, path=entry.result)
+            job._results._cache_key = cache_key
+            if prefetch:
+                job._results.prefetch()
+        return job
 
-    if PipelineContext.get_current_pipeline_session():
-        sagemaker_session = PipelineSession(boto_session=boto3_session)
+    if pipeline_session:
+        step_name = pipeline_session.unique_step_name(
+            _step_name(func, image_uri, instance_count, environment_definition, arguments_dict, serialized,
+                       pickled_func[1]))
+        prefix = f"s3://{bucket}/{PIPELINE_PREFIX}/{pipeline_session.name}/{step_name}"
+        outputs_uri = _execution_uri(prefix, 'outputs')
     else:
-        sagemaker_session = Session(boto_session=boto3_session)
+        job_name = _job_name(func)
+        prefix = f"s3://{bucket}/{job_name}"
+        outputs_uri = f"{prefix}/outputs"
 
-    base_job_name = func.__name__.replace('_', '-')
-    job_name = f"{base_job_name}-{sagemaker_timestamp()}"
-
-    code_location = pickle_func(func, boto3_session, sagemaker_session.default_bucket(), job_name)
+    code_location = pickle_func(func, s3_client, bucket, pickled=pickled_func)
     command = ['--func-code', code_location]
 
     if environment_definition:
-        location = upload_code_package(environment_definition, boto3_session,
-                                       bucket=sagemaker_session.default_bucket(),
-                                       s3_key_prefix=job_name)
+        location = upload_environment_definition(environment_definition, s3_client, bucket=bucket)
         command.append('--env-def')
         command.append(location)
 
     entry_point = ['pathway-runtime']
 
-    processor_inputs = []
-    processor_outputs = []
+    channels = None if input_mode is None else _ProcessingChannels(input_mode)
+    if batch is None:
+        arguments, return_uri = _build_arguments(func, arguments_dict, prefix, channels=channels,
+                                                 serialized=serialized, outputs_uri=outputs_uri)
+    else:
+        arguments, return_uri = _build_batch_arguments(batch, prefix, channels=channels, outputs_uri=outputs_uri)
+    command.extend(arguments)
+    processor_inputs = [] if channels is None else channels.inputs
+    processor_outputs = [] if channels is None else channels.outputs
+
+    _processor = Processor(
+        image_uri=image_uri,
+        instance_type=instance_type,
+        instance_count=instance_count,
+        role="arn:aws:iam::789267064511:role/service-role/AmazonSageMaker-ExecutionRole-20200403T112353",
+        # entrypoint=entry_point,
+        sagemaker_session=sagemaker_session
+    )
 
-    base_dir = "/opt/ml/processing"
+    if pipeline_session:
+        step = ProcessingStep(
+            name=step_name,
+            step_args=_processor.run(
+                arguments=command,
+                inputs=processor_inputs,
+                outputs=processor_outputs
+            ),
+            cache_config=_step_cache_config(cache))
+        pipeline_session.append_step(step)
+        return step
+    else:
+        job = ProcessingJob(sagemaker_session=sagemaker_session, job_name=job_name, started=False)
+        # build the outputs
+        job._results = _results(job, return_uri, batch)
+        job._metrics_uri = f"s3://{bucket}/{job_name}/outputs/metrics"
+        if cache_key:
+            result_cache.record(job, cache_key)
+        if prefetch:
+            for result in ([] if job.results is None else
+                           job.results if isinstance(job.results, list) else [job.results]):
+                result.prefetch()
+
+        def launch():
+            _start_processing_job(_processor,
+                                  arguments=command,
+                                  inputs=processor_inputs,
+                                  outputs=processor_outputs,
+                                  job_name=job_name,
+                                  wait=False,
+                                  logs=False)
+            job.monitor.track(job_name, submitted_at=datetime.now(timezone.utc))
+            job._started.set()
+
+        _scheduler.schedule(job, upstream_jobs(batch or [arguments_dict]), launch, job._abandon)
+        return job
+
+
+class _ProcessingChannels:
+    """Processing inputs and outputs that SageMaker stages under ``/opt/ml/processing``.
+
+    Inputs are downloaded, or mounted with FastFile, before the container starts, and the
+    outputs are uploaded when it exits, so the runtime only reads and writes local paths.
+    """
+
+    def __init__(self, input_mode: str):
+        self.input_mode = input_mode
+        self.inputs: List['ProcessingInput'] = []
+        self.outputs: List['ProcessingOutput'] = []
+
+    def add_input(self, key: str, source: str, mode: Optional[str] = None,
+                  distribution: str = 'FullyReplicated') -> Optional[str]:
+        """The local directory of ``source`` in the container, or None once all channels are in use."""
+        from sagemaker.processing import ProcessingInput
+
+        if len(self.inputs) >= MAX_PROCESSING_INPUTS:
+            return None
+        destination = f"{PROCESSING_DIR}/inputs/{key}"
+        self.inputs.append(ProcessingInput(source=source,
+                                           destination=destination,
+                                           input_name=_channel_name(key),
+                                           s3_input_mode=mode or self.input_mode,
+                                           s3_data_distribution_type=distribution))
+        return destination
+
+    def add_data(self, key: str, uri: str) -> str:
+        """The path of a single serialized object in the container, or its URI without a channel."""
+        # an item of a batch result is staged with the whole blob
+        item = split_item_uri(uri)
+        blob_uri = uri if item is None else item[0]
+        destination = self.add_input(key, blob_uri)
+        if destination is None:
+            return uri
+        path = f"{destination}/{os.path.basename(blob_uri)}"
+        return path if item is None else item_uri(path, item[1])
+
+    def add_output(self, name: str, destination: str) -> str:
+        from sagemaker.processing import ProcessingOutput
+
+        source = f"{PROCESSING_DIR}/{name}"
+        self.outputs.append(ProcessingOutput(source=source, destination=destination,
+                                             output_name=_channel_name(name)))
+        return source
+
+
+def _channel_name(key: str) -> str:
+    return key.replace('_', '-')
+
+
+def _build_arguments(func: Callable, arguments_dict: Dict, prefix: str, shard_inputs: bool = True,
+                     channels: Optional[_ProcessingChannels] = None, serialized: Optional[Dict] = None,
+                     outputs_uri=None):
+    """The runtime arguments for a call of ``func``, and the URI of its return value or None.
+
+    Arguments that are not passed on the command line are serialized under ``prefix``, an
+    ``s3://`` or ``file://`` URI, and the return value and the runtime metrics under
+    ``outputs_uri``, ``<prefix>/outputs`` by default. With ``channels``, serialized
+    arguments, inputs with a ``mode`` and the return value go through processing channels
+    and the runtime gets their local paths. Arguments already in ``serialized``, by name,
+    are uploaded without serializing them again.
+    """
+    command = []
+    # serialized arguments left in S3, which the runtime downloads while it bootstraps
+    prefetch = []
     for key, value in arguments_dict.items():
         print(f"{key}, {value}")
         if isinstance(value, Input):
+            path = value.path
+            sharding = value.sharding if shard_inputs else None
+            if value.mode and channels is not None:
+                if sharding not in (None, 'key'):
+                    raise ValueError(f"{key}: only 'key' sharding is supported for an input with a mode")
+                path = channels.add_input(key, value.path, mode=value.mode,
+                                          distribution='ShardedByS3Key' if sharding else 'FullyReplicated')
+                if path is None:
+                    raise ValueError(f"{key}: at most {MAX_PROCESSING_INPUTS} inputs can be staged")
+                # the platform gives each instance its share of the objects
+                sharding = None
             command.append(f"--{key}")
-            command.append(value.path)
+            command.append(path)
+            if sharding:
+                command.append(f"--{key}-sharding")
+                command.append(sharding)
+                command.append(f"--{key}-record-delimiter")
+                command.append(value.record_delimiter.hex())
         elif isinstance(value, Output):
             command.append(f"--{key}")
             command.append(value.path)
         elif type(value) in (int, str, float, bool):
             command.append(f"--{key}")
             command.append(str(value))
-        elif isinstance(value, _AsyncDataObject):
+        elif isinstance(value, (_AsyncDataObject, _StoredDataObject)):
+            path = value._path if channels is None else channels.add_data(key, value._path)
             command.append(f"--{key}")
-            command.append(value._path)
+            command.append(path)
+            if path.startswith('s3://'):
+                prefetch.append(key)
         else:
             # TODO: should we do this for a pipeline?
-            s3_uri = f"s3://{sagemaker_session.default_bucket()}/{job_name}/{key}.pkl"
+            uri = f"{prefix}/{key}.pkl"
             # TODO: how to avoid accessing the protected method?
-            data = value.get() if isinstance(value, DataObject) else value
-            _PickleDataLoader.save_to_s3(data, s3_uri=s3_uri)
+            if serialized and key in serialized:
+                data = serialized[key]
+            else:
+                data = value.get() if isinstance(value, DataObject) else value
+            _PickleDataLoader.save_to_s3(data, s3_uri=uri)
+            path = uri if channels is None else channels.add_data(key, uri)
             command.append(f"--{key}")
-            command.append(s3_uri)
+            command.append(path)
+            if path.startswith('s3://'):
+                prefetch.append(key)
+
+    if prefetch:
+        command.append("--pathway-prefetch")
+        command.append(','.join(prefetch))
 
     # build the outputs
-    type_hints = get_type_hints(func)
-    if 'return' not in type_hints.keys():
-        pass
-    else:
-        command.append("--return")
-        command.append(f"s3://{sagemaker_session.default_bucket()}/{job_name}/outputs/return.pkl")
+    outputs_uri = outputs_uri or f"{prefix}/outputs"
+    outputs = outputs_uri if channels is None else channels.add_output('outputs', outputs_uri)
+    command.append("--pathway-metrics")
+    command.append(_child_uri(outputs, 'metrics'))
+
+    if not _function_plan(func).returns:
+        return command, None
+    command.append("--return")
+    command.append(_child_uri(outputs, 'return.pkl'))
+    return command, _child_uri(outputs_uri, 'return.pkl')
+
+
+def _build_batch_arguments(batch: List[Dict], prefix: str, channels: Optional[_ProcessingChannels] = None,
+                           outputs_uri=None):
+    """The runtime arguments for a batch of calls, and the URI of the blob with their results.
+
+    The calls are serialized together under ``prefix``. Results of other jobs stay
+    references, and are read in the job.
+    """
+    calls = [{key: _batch_value(value) for key, value in arguments.items()} for arguments in batch]
+    uri = f"{prefix}/batch.pkl"
+    _PickleDataLoader.save_to_s3(calls, s3_uri=uri)
+
+    outputs_uri = outputs_uri or f"{prefix}/outputs"
+    outputs = outputs_uri if channels is None else channels.add_output('outputs', outputs_uri)
+    results = f"results{BATCH_SUFFIX}"
+    return ['--pathway-batch', uri if channels is None else channels.add_data('batch', uri),
+            '--pathway-metrics', _child_uri(outputs, 'metrics'),
+            '--return', _child_uri(outputs, results)], _child_uri(outputs_uri, results)
+
+
+def _execution_uri(prefix: str, name: str):
+    """``<prefix>/<pipeline execution id>/<name>``, resolved by SageMaker when the step runs."""
+    from sagemaker.workflow.execution_variables import ExecutionVariables
+    from sagemaker.workflow.functions import Join
+
+    return Join(on='/', values=[prefix, ExecutionVariables.PIPELINE_EXECUTION_ID, name])
 
-    _processor = Processor(
-        image_uri=image_uri,
-        instance_type=instance_type,
-        instance_count=instance_count,
-        role="arn:aws:iam::789267064511:role/service-role/AmazonSageMaker-ExecutionRole-20200403T112353",
-        # entrypoint=entry_point,
-        sagemaker_session=sagemaker_session
-    )
 
+def _child_uri(parent, name: str):
+    """``<parent>/<name>``, where ``parent`` may also be a pipeline expression such as a ``Join``."""
+    if isinstance(parent, str):
+        return f"{parent}/{name}"
+    from sagemaker.workflow.functions import Join
+
+    return Join(on='/', values=[parent, name])
+
+
+def _batch_value(value):
+    if isinstance(value, (_AsyncDataObject, _StoredDataObject)):
+        # the job behind a result cannot be pickled; the stored object can
+        return _StoredDataObject(value._path)
+    if isinstance(value, DataObject):
+        return value.get()
+    return value
+
+
+def _results(job: Job, return_uri: Optional[str], batch: Optional[List[Dict]]):
+    if batch is not None:
+        return [_AsyncDataObject(job, path=item_uri(return_uri, index)) for index in range(len(batch))]
+    return None if return_uri is None else _AsyncDataObject(job, path=return_uri)
+
+
+def _step_name(func: Callable, image_uri: str, instance_count: int, environment_definition: Optional[str],
+               arguments_dict: Dict, serialized: Optional[Dict] = None, code_digest: Optional[str] = None) -> str:
+    """The name of the pipeline step for a call, the same in every build while the call does not change."""
+    key = call_key(func, image_uri, instance_count, environment_definition, arguments_dict, serialized, code_digest)
+    if key is None:
+        # the step cannot be cached; a fresh name keeps its artifacts apart
+        key = secrets.token_hex(_STEP_KEY_LENGTH)
+    return f"{func.__name__[:64 - _STEP_KEY_LENGTH - 1]}-{key[:_STEP_KEY_LENGTH]}"
+
+
+def _step_cache_config(cache):
+    """The SageMaker ``CacheConfig`` of a step for the ``cache`` argument of a job, or None."""
+    from sagemaker.workflow.steps import CacheConfig
+
+    if isinstance(cache, CacheConfig):
+        return cache
+    if not cache:
+        return None
+    ttl = cache.ttl if isinstance(cache, ResultCache) else DEFAULT_TTL
+    # an ISO 8601 duration
+    return CacheConfig(enable_caching=True, expire_after=f"PT{max(1, round(ttl / 3600))}H")
+
+
+def _job_name(func: Callable) -> str:
+    base_job_name = func.__name__.replace('_', '-')
+    # the suffix keeps names unique when the same function is submitted from several threads
+    return f"{base_job_name}-{sagemaker_timestamp()}-{secrets.token_hex(2)}"
+
+
+def _is_throttling_error(exception: Exception) -> bool:
+    from botocore.exceptions import ClientError
+
+    return isinstance(exception, ClientError) and \
+        exception.response.get('Error', {}).get('Code') in _THROTTLING_ERRORS
+
+
+@retry(retry_on_exception=_is_throttling_error, stop_max_attempt_number=8,
+       wait_exponential_multiplier=500, wait_exponential_max=30000, wait_jitter_max=1000)
+def _start_processing_job(processor: 'Processor', **kwargs):
+    processor.run(**kwargs)
+
+
+def map_processing_jobs(image_uri: str,
+                        instance_type: str,
+                        instance_count: int,
+                        environment_definition: Optional[str],
+                        func: Callable,
+                        iterable: Iterable,
+                        shared_arguments: Dict,
+                        max_concurrency: int = 8,
+                        max_in_flight: Optional[int] = None,
+                        cache: Union[bool, ResultCache] = False,
+                        input_mode: Optional[str] = 'File',
+                        prefetch: bool = False) -> Iterator[ProcessingJob]:
+    """Submit one processing job per item of ``iterable`` and yield the jobs as they finish.
+
+    An item is a dict of keyword arguments, a tuple of positional arguments, or the single
+    first argument. ``shared_arguments`` are passed to every call; the ones that need
+    pickling are uploaded once up front. Submissions run on ``max_concurrency`` threads
+    and are retried with backoff when the API throttles them. With ``max_in_flight`` at
+    most that many jobs are submitted or running at a time, and the next items are
+    submitted as the iterator is consumed.
+
+    Submission is lazy: nothing is submitted until the iterator is first advanced, and
+    items are only taken from ``iterable`` as there is room for them. A caller that stops
+    iterating early leaves the remaining items unsubmitted, while the jobs already
+    submitted keep running. ``func`` is pickled once, before the first submission, so
+    every job sees the values its globals and closure had then.
+
+    Jobs are yielded in completion order, whether they completed, failed or stopped.
+    A submission that fails does not stop the others: the jobs that did start are all
+    yielded, then the error is raised. ``cache`` applies to every job, so unchanged items
+    are not run again.
+    """
     if PipelineContext.get_current_pipeline_session():
-        step = ProcessingStep(
-            name=func.__name__,
-            step_args=_processor.run(
-                arguments=command,
-                inputs=processor_inputs,
-                outputs=processor_outputs
-            ))
-        PipelineContext.get_current_pipeline_session().append_step(step)
-        return step
-    else:
-        _processor.run(arguments=command,
-                       inputs=processor_inputs,
-                       outputs=processor_outputs,
-                       job_name=job_name,
-                       wait=False,
-                       logs=False)
-        job = ProcessingJob(sagemaker_session=sagemaker_session, job_name=job_name)
-        # build the outputs
-        type_hints = get_type_hints(func)
-        if 'return' not in type_hints.keys():
-            results = None
+        raise ValueError("map is not supported inside a pipeline")
+
+    shared_arguments = _stage_shared_arguments(func, shared_arguments, instance_type)
+    pickled_func = _pickle_func(func)
+
+    def submit(arguments_dict):
+        return run_processing_job(image_uri,
+                                  instance_type=instance_type,
+                                  instance_count=instance_count,
+                                  environment_definition=environment_definition,
+                                  func=func,
+                                  arguments_dict=arguments_dict,
+                                  cache=cache,
+                                  input_mode=input_mode,
+                                  prefetch=prefetch,
+                                  pickled_func=pickled_func)
+
+    pending_calls = _bind_items(func, iterable, shared_arguments)
+    failures = []
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        submitting = set()
+        running = []
+        exhausted = False
+        while True:
+            while not exhausted and (max_in_flight is None or len(submitting) + len(running) < max_in_flight):
+                try:
+                    submitting.add(executor.submit(submit, next(pending_calls)))
+                except StopIteration:
+                    exhausted = True
+
+            if not submitting and not running:
+                break
+
+            done, submitting = futures.wait(submitting, timeout=0 if running else None,
+                                            return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    running.append(future.result())
+                else:
+                    print(f"{func.__name__}: a job could not be submitted: {future.exception()!r}")
+                    failures.append(future.exception())
+
+            if running:
+                job = wait_any(running, timeout=_MAP_POLL_INTERVAL if submitting or not exhausted else None)
+                if job is not None:
+                    running.remove(job)
+                    yield job
+
+    if len(failures) == 1:
+        raise failures[0]
+    if failures:
+        raise ValueError(f"{len(failures)} jobs could not be submitted: {failures}") from failures[0]
+
+
+def batch_processing_jobs(image_uri: str,
+                          instance_type: str,
+                          instance_count: int,
+                          environment_definition: Optional[str],
+                          func: Callable,
+                          iterable: Iterable,
+                          shared_arguments: Dict,
+                          per_job: int = 200,
+                          max_concurrency: int = 8,
+                          input_mode: Optional[str] = 'File',
+                          prefetch: bool = False) -> List[_AsyncDataObject]:
+    """Run the calls for the items of ``iterable`` in jobs of ``per_job`` calls each.
+
+    Items are given as for :func:`map_processing_jobs`. The calls of a job are serialized
+    into one payload and run on a process pool in the container, which saves the
+    provisioning time of a job per call. The results are written to one indexed blob per
+    job, and the returned list holds one data object per item, in order, that reads only
+    its own result. ``get()`` raises for an item whose call failed. Results are not cached,
+    and every call runs again.
+    """
+    if PipelineContext.get_current_pipeline_session():
+        raise ValueError("batch is not supported inside a pipeline")
+    if per_job < 1:
+        raise ValueError(f"per_job must be at least 1, got {per_job}")
+
+    shared_arguments = _stage_shared_arguments(func, shared_arguments, instance_type)
+    calls = list(_bind_items(func, iterable, shared_arguments))
+    batches = [calls[start:start + per_job] for start in range(0, len(calls), per_job)]
+    pickled_func = _pickle_func(func)
+
+    def submit(batch):
+        return run_processing_job(image_uri,
+                                  instance_type=instance_type,
+                                  instance_count=instance_count,
+                                  environment_definition=environment_definition,
+                                  func=func,
+                                  arguments_dict={},
+                                  input_mode=input_mode,
+                                  batch=batch,
+                                  prefetch=prefetch,
+                                  pickled_func=pickled_func)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        return [item for job in executor.map(submit, batches) for item in job.results]
+
+
+def _bind_items(func: Callable, iterable: Iterable, shared_arguments: Dict) -> Iterator[Dict]:
+    """The arguments of a call per item: a dict of keyword arguments, a tuple of positional ones, or one value."""
+    plan = _function_plan(func)
+    for item in iterable:
+        if isinstance(item, dict):
+            args, kwargs = (), item
+        elif isinstance(item, tuple):
+            args, kwargs = item, {}
         else:
-            results = _AsyncDataObject(
-                job, path=f"s3://{sagemaker_session.default_bucket()}/{job_name}/outputs/return.pkl")
-        job._results = results
-        return job
+            args, kwargs = (item,), {}
+        yield plan.bind(*args, **kwargs, **shared_arguments)
+
+
+def _stage_shared_arguments(func: Callable, shared_arguments: Dict, instance_type: str = None) -> Dict:
+    """Upload the shared arguments that need pickling once, and pass them to every job by path."""
+    staged = {}
+    prefix = None
+    for key, value in shared_arguments.items():
+        if isinstance(value, (Input, Output, _AsyncDataObject, _StoredDataObject)) or \
+                type(value) in (int, str, float, bool):
+            staged[key] = value
+            continue
+
+        if prefix is None:
+            name = f"{func.__name__.replace('_', '-')}-shared-{sagemaker_timestamp()}"
+            if instance_type == LOCAL_INSTANCE_TYPE:
+                from .local import store_uri
+                prefix = store_uri(name)
+            else:
+                prefix = f"s3://{get_sagemaker_session(REGION).default_bucket()}/{name}"
+        s3_uri = f"{prefix}/{key}.pkl"
+        _PickleDataLoader.save_to_s3(value.get() if isinstance(value, DataObject) else value, s3_uri=s3_uri)
+        staged[key] = _StoredDataObject(s3_uri)
+    return staged
 
 
 def run_training_job(func: Callable, func_args: Dict, image_uri: str):
@@ -0,0 +1,225 @@
+"""Run processing jobs in local processes, with a directory standing in for S3.
+
+Decorate a function with ``instance_type='local'`` to run it here instead of on a
+SageMaker instance. Jobs run in parallel on a shared process pool, and pickled arguments
+and return values are kept under :data:`LOCAL_STORE_DIR` as ``file://`` URIs, so the
+returned jobs and data objects behave like the SageMaker ones. A job that takes the
+result of another job waits for it before it starts, which lets chained jobs, and the
+body of a pipeline, run end to end offline. Jobs are handed to the pool by a
+:class:`pathway.scheduler.DagScheduler`, so when more are ready than there are workers,
+the ones on the longest chain run first.
+"""
+from concurrent import futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from pathway.runtime.dataset import Job, _AsyncDataObject
+from .cache import ResultCache, get_cache
+from .scheduler import DagScheduler, upstream_jobs
+from .util import _pickle_func, pickle_func_to_directory
+
+LOCAL_STORE_DIR = os.environ.get('PATHWAY_LOCAL_STORE_DIR',
+                                 os.path.join(tempfile.gettempdir(), 'pathway', 'local-store'))
+MAX_WORKERS = int(os.environ.get('PATHWAY_LOCAL_WORKERS', os.cpu_count() or 1))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_scheduler = DagScheduler(MAX_WORKERS)
+
+
+class LocalJobMonitor:
+    """The :class:`pathway.monitor.JobMonitor` counterpart for local jobs, backed by their futures."""
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def track(self, job_name: str, future: Future):
+        with self._lock:
+            self._futures[job_name] = future
+
+    def status(self, job_name: str) -> Optional[str]:
+        with self._lock:
+            future = self._futures.get(job_name)
+        if future is None:
+            return None
+        if future.cancelled():
+            return 'Stopped'
+        if not future.done():
+            return 'InProgress'
+        return 'Failed' if future.exception() is not None else 'Completed'
+
+    def add_done_callback(self, job_name: str, callback: Callable):
+        """Call ``callback(job_name, status)`` once the job has completed, failed or stopped."""
+        self._futures[job_name].add_done_callback(lambda _: callback(job_name, self.status(job_name)))
+
+    def wait_all(self, job_names: Iterable[str], timeout: Optional[float] = None) -> bool:
+        _, pending = futures.wait([self._futures[name] for name in job_names], timeout=timeout)
+        return not pending
+
+    def wait_any(self, job_names: Iterable[str], timeout: Optional[float] = None) -> Optional[str]:
+        by_future = {self._futures[name]: name for name in job_names}
+        done, _ = futures.wait(by_future, timeout=timeout, return_when=futures.FIRST_COMPLETED)
+        return next((by_future[future] for future in done), None)
+
+
+_monitor = LocalJobMonitor()
+
+
+class LocalProcessingJob(Job):
+    def __init__(self, job_name: str, future: Future, results=None):
+        super().__init__(results)
+        self._job_name = job_name
+        self._future = future
+
+    @property
+    def job_name(self):
+        return self._job_name
+
+    @property
+    def monitor(self) -> LocalJobMonitor:
+        return _monitor
+
+    def wait(self, logs=True):
+        """Waits for the job to complete, and raises the exception it failed with.
+
+        Args:
+            logs (bool): Ignored; the output of local jobs goes straight to this console.
+
+        """
+        self._future.result()
+
+    def describe(self):
+        status = self.status()
+        description = {'ProcessingJobName': self._job_name, 'ProcessingJobStatus': status}
+        if status == 'Failed':
+            description['FailureReason'] = repr(self._future.exception())
+        return description
+
+    def stop(self):
+        """Stops the job if it has not started yet; a running local job runs to the end."""
+        self._future.cancel()
+
+    def status(self):
+        return _monitor.status(self._job_name)
+
+    def is_completed(self):
+        return self.status() == 'Completed'
+
+    def add_done_callback(self, callback: Callable):
+        """Call ``callback(job)`` once the job has completed, failed or stopped."""
+        self._future.add_done_callback(lambda _: callback(self))
+
+
+def run_local_job(image_uri: str, func: Callable, arguments_dict: Dict,
+                  cache: Union[bool, ResultCache] = False,
+                  batch: Optional[List[Dict]] = None, pickled_func: Optional[Tuple] = None) -> LocalProcessingJob:
+    """Run ``processing_script`` for a call of ``func``, or a ``batch`` of calls, on the local process pool.
+
+    The job runs in the current Python environment on a single instance, so an
+    environment definition is not installed and inputs are not sharded. With ``cache``,
+    results are reused as described in :mod:`pathway.cache`, from entries in the local store.
+    """
+    from .invoke import _build_arguments, _build_batch_arguments, _job_name, _results
+
+    result_cache = None if batch is not None else get_cache(cache, store_uri())
+    serialized = {}
+    pickled_func = pickled_func or _pickle_func(func)
+    cache_key = result_cache and result_cache.key(func, image_uri, 1, None, arguments_dict, serialized,
+                                                  pickled_func[1])
+    entry = cache_key and result_cache.get(cache_key)
+    if entry:
+        print(f"{func.__name__}: reusing the result of {entry.job_name}")
+        future = Future()
+        future.set_result(0.0)
+        job = LocalProcessingJob(entry.job_name, future)
+        job._metrics_uri = store_uri(entry.job_name, 'outputs', 'metrics')
+        _monitor.track(entry.job_name, future)
+        if entry.result is not None:
+            job._results = _AsyncDataObject(job, path=entry.result)
+            job._results._cache_key = cache_key
+        return job
+
+    job_name = _job_name(func)
+    command = ['--func-code', pickle_func_to_directory(func, LOCAL_STORE_DIR, pickled=pickled_func)]
+    if batch is None:
+        arguments, return_uri = _build_arguments(func, arguments_dict, store_uri(job_name), shard_inputs=False,
+                                                 serialized=serialized)
+    else:
+        arguments, return_uri = _build_batch_arguments(batch, store_uri(job_name))
+    command.extend(arguments)
+
+    future = Future()
+    job = LocalProcessingJob(job_name, future)
+    job._results = _results(job, return_uri, batch)
+    job._metrics_uri = store_uri(job_name, 'outputs', 'metrics')
+    _monitor.track(job_name, future)
+
+    on_success = None
+    if cache_key:
+        def on_success():
+            # add the entry before the job is seen as completed
+            result_cache.put(cache_key, job_name, return_uri)
+
+        if job.results is not None:
+            job.results._cache_key = cache_key
+    _scheduler.schedule(job, upstream_jobs(batch or [arguments_dict]),
+                        lambda: _launch(command, future, on_success), lambda reason: _abandon(future, reason))
+    return job
+
+
+def store_uri(*parts: str) -> str:
+    """The ``file://`` URI of a path in the local store."""
+    return 'file://' + os.path.join(os.path.abspath(LOCAL_STORE_DIR), *parts)
+
+
+def _launch(command: list, future: Future, on_success: Optional[Callable] = None):
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        running = _get_executor().submit(_run, command)
+    except BaseException as e:
+        future.set_exception(e)
+        return
+    running.add_done_callback(lambda done: _copy_outcome(done, future, on_success))
+
+
+def _abandon(future: Future, reason: str):
+    if future.set_running_or_notify_cancel():
+        future.set_exception(ValueError(reason))
+
+
+def _copy_outcome(source: Future, target: Future, on_success: Optional[Callable] = None):
+    if source.exception() is not None:
+        target.set_exception(source.exception())
+        return
+    try:
+        if on_success is not None:
+            on_success()
+    except Exception as e:
+        print(f"{e!r} after a successful job")
+    target.set_result(source.result())
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawned workers do not inherit the locks held by the threads of this process
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _run(command: list) -> float:
+    from pathway.runtime.process_entry_point import processing_script
+
+    start = time.perf_counter()
+    processing_script(command)
+    return time.perf_counter() - start
@@ -0,0 +1,231 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import os
+import threading
+import time
+
+TERMINAL_STATUSES = ('Completed', 'Failed', 'Stopped')
+# a submitted job that is not listed this many seconds later is given up as failed
+MISSING_JOB_TIMEOUT = float(os.environ.get('PATHWAY_MISSING_JOB_TIMEOUT', 600))
+
+# listed jobs are filtered by creation time; leave room for clock skew
+_CREATION_TIME_SLACK = timedelta(minutes=5)
+
+
+class JobMonitor:
+    """Tracks the status of many processing jobs with one batched list call per interval.
+
+    Every tracked job is refreshed from ``ListProcessingJobs`` pages sorted by creation
+    time, instead of one ``DescribeProcessingJob`` call per job. A daemon thread polls
+    while any tracked job is still running. The interval doubles on throttling or other
+    errors, up to ``max_interval``, and goes back to ``interval`` after a successful call.
+
+    A job tracked with its ``submitted_at`` time that has still not been listed
+    ``missing_after`` seconds later is given up, and recorded as 'Failed'. A job that is
+    held, e.g. waiting in the scheduler, is not listed until it is submitted.
+    """
+
+    def __init__(self, sagemaker_client, interval: float = 5.0, max_interval: float = 60.0,
+                 missing_after: float = MISSING_JOB_TIMEOUT):
+        self._client = sagemaker_client
+        self._interval = interval
+        self._max_interval = max_interval
+        self._missing_after = missing_after
+        self._condition = threading.Condition()
+        self._submitted_at: Dict[str, datetime] = {}
+        # monotonic time by which a submitted job must have been listed
+        self._deadlines: Dict[str, float] = {}
+        self._statuses: Dict[str, str] = {}
+        self._callbacks: Dict[str, List[Callable]] = defaultdict(list)
+        # jobs that have not been submitted yet
+        self._held: Set[str] = set()
+        self._last_refresh = 0.0
+        self._thread = None
+
+    def track(self, job_name: str, submitted_at: Optional[datetime] = None, status: Optional[str] = None):
+        """Start polling a job. A known ``status``, e.g. of a job that finished or was abandoned, is recorded as is.
+
+        ``submitted_at``, the time the job was submitted, also starts the wait for it to be listed.
+        """
+        callbacks = []
+        with self._condition:
+            if submitted_at is None and status is None and job_name in self._held:
+                return
+            self._held.discard(job_name)
+            if submitted_at is not None:
+                self._submitted_at[job_name] = submitted_at
+                self._deadlines[job_name] = time.monotonic() + self._missing_after
+            elif job_name not in self._submitted_at:
+                self._submitted_at[job_name] = datetime.now(timezone.utc)
+            if status is not None:
+                self._statuses[job_name] = status
+                if status in TERMINAL_STATUSES:
+                    callbacks = self._callbacks.pop(job_name, [])
+                self._condition.notify_all()
+            self._ensure_polling()
+        _call_back(callbacks, job_name, status)
+
+    def hold(self, job_name: str):
+        """Know of a job that has not been submitted yet, without polling for it.
+
+        Callbacks and waits on the job are kept until it is tracked with its ``submitted_at``
+        time, from when it is polled, or with a known ``status``.
+        """
+        with self._condition:
+            if job_name not in self._submitted_at:
+                self._held.add(job_name)
+
+    def status(self, job_name: str) -> Optional[str]:
+        """The last known status of a tracked job, refreshing once if it has never been seen."""
+        self.track(job_name)
+        with self._condition:
+            status = self._statuses.get(job_name)
+            held = job_name in self._held
+        if status is None and not held and time.monotonic() - self._last_refresh >= self._interval:
+            self.refresh()
+            with self._condition:
+                status = self._statuses.get(job_name)
+        return status
+
+    def add_done_callback(self, job_name: str, callback: Callable[[str, str], None]):
+        """Call ``callback(job_name, status)`` once the job reaches a terminal status."""
+        self.track(job_name)
+        with self._condition:
+            status = self._statuses.get(job_name)
+            if status not in TERMINAL_STATUSES:
+                self._callbacks[job_name].append(callback)
+                return
+        callback(job_name, status)
+
+    def wait_all(self, job_names: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """Block until every job is in a terminal status. Returns False on timeout."""
+        job_names = list(job_names)
+        for job_name in job_names:
+            self.track(job_name)
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: all(self._statuses.get(name) in TERMINAL_STATUSES for name in job_names), timeout)
+
+    def wait_any(self, job_names: Iterable[str], timeout: Optional[float] = None) -> Optional[str]:
+        """Block until one of the jobs is in a terminal status and return its name, or None on timeout."""
+        job_names = list(job_names)
+        for job_name in job_names:
+            self.track(job_name)
+
+        def finished():
+            return next((name for name in job_names if self._statuses.get(name) in TERMINAL_STATUSES), None)
+
+        with self._condition:
+            self._condition.wait_for(lambda: finished() is not None, timeout)
+            return finished()
+
+    def refresh(self):
+        """Update every tracked job that is still running with one paginated list call."""
+        with self._condition:
+            live = {name for name in self._submitted_at if self._statuses.get(name) not in TERMINAL_STATUSES}
+            if not live:
+                return
+            created_after = min(self._submitted_at[name] for name in live) - _CREATION_TIME_SLACK
+        self._last_refresh = time.monotonic()
+
+        updates = {}
+        request = {'CreationTimeAfter': created_after, 'SortBy': 'CreationTime',
+                   'SortOrder': 'Descending', 'MaxResults': 100}
+        while True:
+            response = self._client.list_processing_jobs(**request)
+            for summary in response.get('ProcessingJobSummaries', []):
+                if summary['ProcessingJobName'] in live:
+                    updates[summary['ProcessingJobName']] = summary['ProcessingJobStatus']
+            if len(updates) == len(live) or not response.get('NextToken'):
+                break
+            request['NextToken'] = response['NextToken']
+
+        finished = []
+        now = time.monotonic()
+        with self._condition:
+            for name in live:
+                if name in updates:
+                    self._deadlines.pop(name, None)
+                elif self._statuses.get(name) is None and self._deadlines.get(name, now) < now:
+                    print(f"job monitor: {name} was not listed {self._missing_after:.0f} s after it was submitted,"
+                          f" giving up on it")
+                    updates[name] = 'Failed'
+            for name, status in updates.items():
+                self._statuses[name] = status
+                if status in TERMINAL_STATUSES:
+                    finished.append((name, status, self._callbacks.pop(name, [])))
+            self._condition.notify_all()
+
+        for name, status, callbacks in finished:
+            _call_back(callbacks, name, status)
+
+    def _ensure_polling(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._poll, name='pathway-job-monitor', daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        interval = self._interval
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh()
+                interval = self._interval
+            except Exception as e:
+                # throttling or a transient network error; keep polling, but back off
+                print(f"job monitor: {e}")
+                interval = min(interval * 2, self._max_interval)
+
+            with self._condition:
+                if all(self._statuses.get(name) in TERMINAL_STATUSES for name in self._submitted_at):
+                    self._thread = None
+                    return
+
+
+def _call_back(callbacks: List[Callable], job_name: str, status: str):
+    # one failing callback must not keep the others, or the polling thread, from running
+    for callback in callbacks:
+        try:
+            callback(job_name, status)
+        except Exception as e:
+            print(f"job monitor: a callback for {job_name} raised {e!r}")
+
+
+_monitors: Dict[str, JobMonitor] = {}
+_monitors_lock = threading.Lock()
+
+
+def get_monitor(sagemaker_session) -> JobMonitor:
+    """The shared monitor for the region of a SageMaker session."""
+    region = sagemaker_session.boto_region_name
+    with _monitors_lock:
+        if region not in _monitors:
+            _monitors[region] = JobMonitor(sagemaker_session.sagemaker_client)
+        return _monitors[region]
+
+
+def wait_all(jobs: Iterable, timeout: Optional[float] = None) -> bool:
+    """Block until every ``ProcessingJob`` is finished. Returns False on timeout."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for job in jobs:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if not job.monitor.wait_all([job.job_name], remaining):
+            return False
+    return True
+
+
+def wait_any(jobs: Iterable, timeout: Optional[float] = None):
+    """Block until one ``ProcessingJob`` is finished and return it, or None on timeout."""
+    jobs = list(jobs)
+    by_monitor = defaultdict(list)
+    for job in jobs:
+        by_monitor[job.monitor].append(job)
+    if len(by_monitor) > 1:
+        raise ValueError("wait_any needs jobs from a single region")
+
+    for monitor, monitored in by_monitor.items():
+        name = monitor.wait_any([job.job_name for job in monitored], timeout)
+        return next((job for job in monitored if job.job_name == name), None)
+    return None
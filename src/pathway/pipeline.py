@@ -1,12 +1,13 @@
 from pathway.runtime.dataset import AbstractDataObject
-from sagemaker.workflow.steps import Step
-from sagemaker.workflow.pipeline import Pipeline
-from typing import Optional, List, Callable, Any
+from typing import Optional, Dict, List, Callable, Any, TYPE_CHECKING
 from dataclasses import dataclass
 
+if TYPE_CHECKING:
+    from sagemaker.workflow.steps import Step
+
 
 class _PipelineDataObject(AbstractDataObject):
-    def __init__(self, step: Step, path: str):
+    def __init__(self, step: 'Step', path: str):
         self._step = step
         self._path = path
 
@@ -23,7 +24,7 @@ class _PipelineDataObject(AbstractDataObject):
 
 
 class StepDelegation:
-    def __init__(self, delegated: Step, results: _PipelineDataObject):
+    def __init__(self, delegated: 'Step', results: _PipelineDataObject):
         self._delegated = delegated
         self._results = results
 
@@ -35,10 +36,12 @@ class StepDelegation:
 def pipeline(name: str):
     def inner(func: Callable):
         def wrapper(*args, **kwargs):
+            from sagemaker.workflow.pipeline import Pipeline
+
             # validate the arguments
 
             # run under pipeline context
-            with PipelineSession():
+            with PipelineSession(name):
                 func(*args, **kwargs)
                 steps = PipelineContext.get_current_pipeline_session().steps
                 return Pipeline(name=name, steps=steps)
@@ -48,8 +51,10 @@ def pipeline(name: str):
 
 
 class PipelineSession:
-    def __init__(self):
-        self.steps: List[Step] = list()
+    def __init__(self, name: str = 'pipeline'):
+        self.name = name
+        self.steps: List['Step'] = list()
+        self._step_names: Dict[str, int] = {}
 
     # /Context Manager ----------------------------------------------
     def __enter__(self):
@@ -59,9 +64,14 @@ class PipelineSession:
     def __exit__(self, exc_type, exc_val, exc_tb):
         PipelineContext.pop_pipeline_session()
 
-    def append_step(self, step: Step):
+    def append_step(self, step: 'Step'):
         self.steps.append(step)
 
+    def unique_step_name(self, name: str) -> str:
+        """``name``, numbered from its second use on, e.g. for the same call made twice."""
+        count = self._step_names[name] = self._step_names.get(name, 0) + 1
+        return name if count == 1 else f'{name}-{count}'
+
 
 class PipelineContext:
     _pipeline_session: Optional[PipelineSession] = None
@@ -0,0 +1,168 @@
+"""Many calls of one function in a single job, with their results in one indexed blob.
+
+The blob holds the serialized result of every call, one after the other, then an index
+of ``(offset, length)`` pairs and a fixed-size footer::
+
+    [result 0][result 1]...[index: count x <QQ>][footer: index offset <Q>, count <Q>, MAGIC]
+
+An item is addressed as ``<blob uri>#<index>``, and reading it costs two small ranged
+reads for the footer and the index, cached per blob, and one for the item itself.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import io
+import multiprocessing
+import os
+import re
+import struct
+import threading
+import traceback
+
+from pathway.runtime import serializers
+from pathway.runtime.compression import compress_bytes, open_decompressed
+
+MAGIC = b'PWBT'
+BATCH_SUFFIX = '.batch'
+
+_ENTRY = struct.Struct('<QQ')
+_FOOTER = struct.Struct('<QQ4s')
+_ITEM_URI = re.compile(r'^(.*\.batch)#(\d+)$')
+
+# indexes of recently read blobs; a blob never changes once written
+_INDEX_CACHE_SIZE = 64
+_indexes: 'OrderedDict[str, List[Tuple[int, int]]]' = OrderedDict()
+_indexes_lock = threading.Lock()
+
+# the function and calls of the running batch, inherited by the forked workers
+_func: Optional[Callable] = None
+_calls: List[Dict[str, Any]] = []
+
+
+class BatchItemError:
+    """Stored in place of the result of a call that raised."""
+
+    def __init__(self, message: str, formatted_traceback: str):
+        self.message = message
+        self.traceback = formatted_traceback
+
+
+def item_uri(uri: str, index: int) -> str:
+    return f'{uri}#{index}'
+
+
+def split_item_uri(uri: str) -> Optional[Tuple[str, int]]:
+    """``(blob uri, index)`` for the URI of a batch item, or None for any other URI."""
+    match = _ITEM_URI.match(uri)
+    return None if match is None else (match.group(1), int(match.group(2)))
+
+
+def run_batch(func: Callable, calls: List[Dict[str, Any]], uri: str, max_workers: Optional[int] = None):
+    """Call ``func`` with each set of keyword arguments on a process pool and write the blob to ``uri``.
+
+    A call that raises stores a :class:`BatchItemError`, which is raised again when its
+    item is read, so one failure does not fail the whole batch.
+
+    The data objects in ``calls`` are loaded here, before the workers are forked, so the
+    workers do not download with clients and threads that were running at the fork.
+    """
+    from pathway.runtime import metrics
+    from pathway.runtime.dataset import AbstractDataObject
+    from pathway.runtime.transfer import open_writer
+
+    # arguments shared by several calls are one object after unpickling, and are loaded once
+    for call in calls:
+        for value in call.values():
+            if isinstance(value, AbstractDataObject):
+                value.get()
+
+    global _func, _calls
+    _func, _calls = func, calls
+    max_workers = min(max_workers or os.cpu_count() or 1, len(calls))
+    try:
+        with open_writer(uri) as writer:
+            if max_workers <= 1:
+                write_blob(map(_call, range(len(calls))), writer)
+            else:
+                # forked workers inherit the function and the calls instead of unpickling them
+                with ProcessPoolExecutor(max_workers=max_workers,
+                                         mp_context=multiprocessing.get_context('fork')) as executor:
+                    write_blob(executor.map(_call, range(len(calls))), writer)
+        metrics.add_bytes(writer.bytes_written)
+    finally:
+        _func, _calls = None, []
+
+
+def write_blob(results, file) -> int:
+    """Write serialized results and their index to ``file``. Returns the number of items."""
+    entries = []
+    offset = 0
+    for data in results:
+        file.write(data)
+        entries.append((offset, len(data)))
+        offset += len(data)
+    for entry in entries:
+        file.write(_ENTRY.pack(*entry))
+    file.write(_FOOTER.pack(offset, len(entries), MAGIC))
+    return len(entries)
+
+
+def load_item(uri: str, index: int) -> Any:
+    """Read the result of one call from a blob, raising if the call failed."""
+    from pathway.runtime.transfer import open_reader
+
+    offset, length = read_index(uri)[index]
+    with open_reader(uri, start=offset, end=offset + length) as reader:
+        with open_decompressed(reader) as stream:
+            return check_item(serializers.load(stream), uri, index)
+
+
+def check_item(data: Any, uri: str, index: int) -> Any:
+    """The result read for an item, or raise if the call failed."""
+    if isinstance(data, BatchItemError):
+        raise RuntimeError(f"item {index} of {uri} failed: {data.message}\n{data.traceback}")
+    return data
+
+
+def read_index(uri: str) -> List[Tuple[int, int]]:
+    from pathway.runtime.transfer import object_info, open_reader
+
+    with _indexes_lock:
+        if uri in _indexes:
+            _indexes.move_to_end(uri)
+            return _indexes[uri]
+
+    size = object_info(uri).size
+    with open_reader(uri, start=size - _FOOTER.size, end=size) as reader:
+        index_offset, count, magic = _FOOTER.unpack(reader.read())
+    if magic != MAGIC:
+        raise ValueError(f"{uri} is not a batch result")
+    with open_reader(uri, start=index_offset, end=index_offset + count * _ENTRY.size) as reader:
+        raw = reader.read()
+    index = [_ENTRY.unpack_from(raw, i * _ENTRY.size) for i in range(count)]
+
+    with _indexes_lock:
+        _indexes[uri] = index
+        while len(_indexes) > _INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _call(index: int) -> bytes:
+    from pathway.runtime.dataset import AbstractDataObject, DataObject, _close_outputs
+
+    try:
+        kwargs = {key: value.get() if isinstance(value, AbstractDataObject) else value
+                  for key, value in _calls[index].items()}
+        result = _func(**kwargs)
+        _close_outputs()
+        if isinstance(result, DataObject):
+            result = result.get()
+    except Exception as e:
+        _close_outputs(abort=True)
+        result = BatchItemError(repr(e), traceback.format_exc())
+
+    buffer = io.BytesIO()
+    serializers.dump(result, buffer)
+    return compress_bytes(buffer.getvalue())
@@ -1,19 +1,44 @@
-import boto3
+import hashlib
 import os
+import platform
+import shlex
+import sys
+import time
 
 from pathway.util import check_output, Timer
+from pathway.runtime import clients
 from pathway.runtime.dataset import parse_s3_url
 
+SNAPSHOT_PREFIX = 'env-snapshots'
+SNAPSHOT_CACHE_DIR = os.environ.get('PATHWAY_SNAPSHOT_CACHE_DIR', '/tmp/pathway/env-snapshots')
+
 
 def bootstrap(runtime_env_definition: str):
+    """Bring the running environment in line with an env.yml or requirements.txt in S3.
+
+    The resolved environment is packed into ``s3://<bucket>/env-snapshots/<hash>.tar.gz``
+    keyed by the content of the definition and the packages of the image, so later
+    containers unpack the snapshot instead of solving and installing again. Set ``PATHWAY_ENV_SNAPSHOT=0`` to always
+    install from scratch.
+    """
     base_name = os.path.basename(runtime_env_definition)
     _download_env_definition(runtime_env_definition, base_name)
 
+    use_snapshot = os.environ.get('PATHWAY_ENV_SNAPSHOT', '1') != '0'
+    if use_snapshot:
+        bucket, _ = parse_s3_url(runtime_env_definition)
+        snapshot_key = _snapshot_key(base_name)
+        if _restore_snapshot(bucket, snapshot_key):
+            return
+
     if base_name == 'requirements.txt':
         _pip_install(base_name)
     elif base_name == 'env.yml':
         _conda_update(base_name)
 
+    if use_snapshot:
+        _save_snapshot(bucket, snapshot_key)
+
 
 def _conda_update(config_yaml: str):
     package_manager = os.environ.get('PACKAGEMANAGER', 'conda')
@@ -32,7 +57,99 @@ def _download_env_definition(s3_location: str, local_path: str):
     with Timer(name=f"loading env definition {s3_location}"):
         bucket, object_key = parse_s3_url(s3_location)
 
-        session = boto3.session.Session()
-        s3_resource = session.resource('s3')
+        clients.client('s3').download_file(bucket, object_key, local_path)
+
+
+def _snapshot_key(env_definition: str) -> str:
+    """Hash the definition together with the interpreter and the image it is installed into."""
+    digest = hashlib.sha256()
+    with open(env_definition, 'rb') as file:
+        digest.update(file.read())
+    digest.update(os.path.basename(env_definition).encode())
+    digest.update(sys.prefix.encode())
+    digest.update(platform.python_version().encode())
+    digest.update(platform.machine().encode())
+    digest.update(_image_identity())
+    return digest.hexdigest()
+
+
+def _image_identity() -> bytes:
+    """The packages installed before bootstrap, so that a rebuilt image never restores a snapshot of the old one.
+
+    The files of pathway itself are listed too, as its version does not change with every build.
+    """
+    from importlib import metadata
+
+    packages = sorted(f"{distribution.metadata['Name']}=={distribution.version}"
+                      for distribution in metadata.distributions())
+    try:
+        pathway_files = metadata.distribution('pathway').read_text('RECORD') or ''
+    except metadata.PackageNotFoundError:
+        pathway_files = ''
+    return '\n'.join(packages + [pathway_files]).encode()
+
+
+def _snapshot_marker(snapshot_key: str) -> str:
+    return os.path.join(sys.prefix, f'.pathway-env-{snapshot_key}')
+
+
+def _restore_snapshot(bucket: str, snapshot_key: str) -> bool:
+    """Unpack a snapshot over the running environment. Returns False on a cache miss."""
+    from botocore.exceptions import ClientError
+
+    if os.path.exists(_snapshot_marker(snapshot_key)):
+        print(f'env snapshot {snapshot_key}: cache hit (already installed)')
+        return True
+
+    archive = os.path.join(SNAPSHOT_CACHE_DIR, f'{snapshot_key}.tar.gz')
+    if os.path.exists(archive):
+        with Timer(name=f'env snapshot {snapshot_key}: cache hit (local copy), unpack'):
+            _unpack(archive)
+        return True
+
+    os.makedirs(SNAPSHOT_CACHE_DIR, exist_ok=True)
+    # a failed or interrupted download must not be mistaken for a local copy
+    temporary_archive = f'{archive}.{os.getpid()}.tmp'
+    start = time.perf_counter()
+    try:
+        clients.client('s3').download_file(bucket, f'{SNAPSHOT_PREFIX}/{snapshot_key}.tar.gz', temporary_archive)
+        os.replace(temporary_archive, archive)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        print(f'env snapshot {snapshot_key}: cache miss')
+        return False
+    finally:
+        if os.path.exists(temporary_archive):
+            os.remove(temporary_archive)
+    print(f'env snapshot {snapshot_key}: cache hit, download: {time.perf_counter() - start} s')
+
+    with Timer(name=f'env snapshot {snapshot_key}: unpack'):
+        _unpack(archive)
+    return True
+
+
+def _save_snapshot(bucket: str, snapshot_key: str):
+    """Pack and upload the installed environment. The environment is ready either way, so failures only print."""
+    archive = os.path.join(SNAPSHOT_CACHE_DIR, f'{snapshot_key}.tar.gz')
+    # an archive packed halfway must not be mistaken for a local copy
+    temporary_archive = f'{archive}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(SNAPSHOT_CACHE_DIR, exist_ok=True)
+        with open(_snapshot_marker(snapshot_key), 'w'):
+            pass
+
+        with Timer(name=f'env snapshot {snapshot_key}: pack'):
+            check_output(f'tar -czf {shlex.quote(temporary_archive)} -C {shlex.quote(sys.prefix)} .')
+        os.replace(temporary_archive, archive)
+        with Timer(name=f'env snapshot {snapshot_key}: upload'):
+            clients.client('s3').upload_file(archive, bucket, f'{SNAPSHOT_PREFIX}/{snapshot_key}.tar.gz')
+    except Exception as e:
+        print(f'env snapshot {snapshot_key}: not saved: {e!r}')
+    finally:
+        if os.path.exists(temporary_archive):
+            os.remove(temporary_archive)
+
 
-        s3_resource.Bucket(bucket).download_file(object_key, local_path)
\ No newline at end of file
+def _unpack(archive: str):
+    check_output(f'tar -xzf {shlex.quote(archive)} -C {shlex.quote(sys.prefix)}')
@@ -0,0 +1,70 @@
+from typing import Optional, TYPE_CHECKING
+
+import os
+import threading
+
+# boto3 takes a few hundred milliseconds to import, so it is only loaded with the first client
+if TYPE_CHECKING:
+    import boto3
+
+# connections kept open per client; transfers and fan-out run many requests in parallel
+MAX_POOL_CONNECTIONS = 64
+
+_lock = threading.Lock()
+_config = None
+_sessions = {}
+_clients = {}
+
+
+def _reset():
+    # a forked child must not reuse the connections of its parent, nor a lock another thread held
+    global _lock
+    _lock = threading.Lock()
+    _sessions.clear()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset)
+
+
+def boto_session(region_name: Optional[str] = None) -> 'boto3.session.Session':
+    """The process-wide boto3 session for a region (None for the default region)."""
+    with _lock:
+        return _get_session(region_name)
+
+
+def client(service_name: str, region_name: Optional[str] = None):
+    """A shared client for a service and region.
+
+    boto3 clients are thread-safe, so one client and its connection pool serve every
+    thread in the process. Sessions are not, which is why they are only used under a lock
+    to create clients.
+    """
+    key = (service_name, region_name)
+    try:
+        return _clients[key]
+    except KeyError:
+        pass
+
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _get_session(region_name).client(service_name, config=_get_config())
+        return _clients[key]
+
+
+def _get_session(region_name: Optional[str]) -> 'boto3.session.Session':
+    import boto3.session
+
+    if region_name not in _sessions:
+        _sessions[region_name] = boto3.session.Session(region_name=region_name)
+    return _sessions[region_name]
+
+
+def _get_config():
+    global _config
+    from botocore.config import Config
+
+    if _config is None:
+        _config = Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                         retries={'mode': 'adaptive', 'max_attempts': 10})
+    return _config
@@ -43,6 +43,10 @@ class Cluster:
     def master_port(self):
         return 55555
 
+    @property
+    def hosts(self):
+        return self._hosts
+
     @property
     def current_host(self):
         return self._current_host
@@ -0,0 +1,195 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import io
+import operator
+import socket
+import struct
+import time
+
+from pathway.runtime import serializers
+from pathway.runtime.cluster import Cluster
+
+_LENGTH = struct.Struct('<Q')
+# a child sends its rank in plain bytes when it connects, before anything is unpickled
+_RANK = struct.Struct('<Q')
+
+# how long a rank keeps trying to reach its parent while the other hosts start up
+CONNECT_TIMEOUT = 15 * 60
+# how long a connection has to name its rank before it is closed
+HANDSHAKE_TIMEOUT = 60
+
+
+class Communicator:
+    """Barrier, broadcast, gather and reduce between the instances of one processing job.
+
+    The ranks form a binary tree rooted at rank 0, the master host: rank ``r`` has the
+    children ``2r + 1`` and ``2r + 2`` and listens for them on its own address. Every
+    operation moves data along the tree, so the root handles two connections whatever
+    the size of the cluster, and a reduce combines partial results on the way up.
+
+    Objects travel with :mod:`pathway.runtime.serializers`, so NumPy arrays and Arrow
+    tables are sent in their native formats. All ranks must call the same operations in
+    the same order.
+
+    Ranks trust each other: what a peer sends is unpickled, so it can run code. A rank
+    only listens on its own cluster address and accepts a child only from the address of
+    that rank in ``addresses``. This keeps out other hosts, but not other processes on the
+    cluster hosts, so the network of the job must not be shared with untrusted code.
+    """
+
+    def __init__(self, rank: int, addresses: List[Tuple[str, int]], timeout: float = CONNECT_TIMEOUT):
+        self._rank = rank
+        self._size = len(addresses)
+        self._parent = None
+        self._children = []
+
+        child_ranks = [r for r in (2 * rank + 1, 2 * rank + 2) if r < self._size]
+        listener = None
+        if child_ranks:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind(addresses[rank])
+            listener.listen(len(child_ranks))
+
+        try:
+            if rank > 0:
+                self._parent = _connect(addresses[(rank - 1) // 2], timeout)
+                self._parent.sendall(_RANK.pack(rank))
+
+            children = {}
+            if listener is not None:
+                child_ips = {r: socket.gethostbyname(addresses[r][0]) for r in child_ranks}
+                listener.settimeout(timeout)
+                while len(children) < len(child_ranks):
+                    connection, (ip, _) = listener.accept()
+                    child = _accept_child(connection, ip, child_ips, children)
+                    if child is not None:
+                        children[child] = connection
+            self._children = [children[r] for r in child_ranks]
+        finally:
+            if listener is not None:
+                listener.close()
+
+    @classmethod
+    def from_cluster(cls, cluster: Optional[Cluster] = None) -> 'Communicator':
+        """Connect the hosts of the current job on ``Cluster.master_port``."""
+        cluster = cluster or Cluster()
+        return cls(cluster.rank, [(host, cluster.master_port) for host in cluster.hosts])
+
+    @property
+    def rank(self) -> int:
+        return self._rank
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def barrier(self):
+        """Wait until every rank has reached the barrier."""
+        self.reduce(None, op=lambda a, b: None)
+        self.broadcast(None)
+
+    def broadcast(self, data: Any = None) -> Any:
+        """Send ``data`` from rank 0 to every rank, and return it on all of them."""
+        if self._parent is not None:
+            data = _recv(self._parent)
+        for child in self._children:
+            _send(child, data)
+        return data
+
+    def gather(self, data: Any) -> Optional[List[Any]]:
+        """Collect one object per rank on rank 0, ordered by rank. Other ranks get None."""
+        gathered = {self._rank: data}
+        for child in self._children:
+            gathered.update(_recv(child))
+        if self._parent is not None:
+            _send(self._parent, gathered)
+            return None
+        return [gathered[r] for r in range(self._size)]
+
+    def reduce(self, data: Any, op: Callable[[Any, Any], Any] = operator.add) -> Any:
+        """Combine one object per rank with ``op`` up the tree. Rank 0 gets the result, others None.
+
+        ``op`` must be associative and commutative: each rank combines its own object with
+        the results of its subtrees, so ranks are not combined in rank order. Use
+        :meth:`gather` to combine objects such as lists or strings in order.
+        """
+        for child in self._children:
+            data = op(data, _recv(child))
+        if self._parent is not None:
+            _send(self._parent, data)
+            return None
+        return data
+
+    def allreduce(self, data: Any, op: Callable[[Any, Any], Any] = operator.add) -> Any:
+        """Like :meth:`reduce`, but every rank gets the result."""
+        return self.broadcast(self.reduce(data, op))
+
+    def close(self):
+        for connection in self._children + ([self._parent] if self._parent else []):
+            connection.close()
+        self._children = []
+        self._parent = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _accept_child(connection: socket.socket, ip: str, child_ips: Dict[int, str], children: Dict) -> Optional[int]:
+    """The rank of a child that connected from its own address, or None once a stranger is turned away."""
+    try:
+        if ip in child_ips.values():
+            connection.settimeout(HANDSHAKE_TIMEOUT)
+            child = _RANK.unpack(_recv_exactly(connection, _RANK.size))[0]
+            if child_ips.get(child) == ip and child not in children:
+                connection.settimeout(None)
+                connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                return child
+    except OSError:
+        pass
+    print(f"collective: rejected a connection from {ip}, which is not a child of this rank")
+    connection.close()
+    return None
+
+
+def _connect(address: Tuple[str, int], timeout: float) -> socket.socket:
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            connection = socket.create_connection(address)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return connection
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+
+def _send(connection: socket.socket, data: Any):
+    buffer = io.BytesIO()
+    serializers.dump(data, buffer)
+    payload = buffer.getbuffer()
+    connection.sendall(_LENGTH.pack(len(payload)))
+    connection.sendall(payload)
+
+
+def _recv(connection: socket.socket) -> Any:
+    length = _LENGTH.unpack(_recv_exactly(connection, _LENGTH.size))[0]
+    return serializers.load(io.BytesIO(_recv_exactly(connection, length)))
+
+
+def _recv_exactly(connection: socket.socket, size: int) -> bytearray:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = connection.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("connection closed by peer")
+        received += n
+    return buffer
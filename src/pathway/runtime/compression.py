@@ -0,0 +1,279 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import io
+import os
+import struct
+
+from pathway.runtime.serializers import _PrefixedReader, _read_exactly, _readinto_exactly
+
+MAGIC = b'PWZ1'
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+# payloads smaller than this are never compressed
+MIN_COMPRESS_SIZE = 64 * 1024
+# how much of the first chunk is compressed to estimate the ratio
+SAMPLE_SIZE = 256 * 1024
+# below this ratio compression is not worth the CPU time
+MIN_RATIO = 1.2
+# above this ratio the stronger codec pays for itself
+ZSTD_RATIO = 2.0
+
+_FRAME = struct.Struct('<II')
+_U8 = struct.Struct('<B')
+
+
+class _Codec:
+    name: str
+
+    def compress(self, data) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data, raw_size: int) -> bytes:
+        raise NotImplementedError
+
+
+class _Zstd(_Codec):
+    name = 'zstd'
+
+    def __init__(self, level: int = 3):
+        import zstandard
+
+        self._module = zstandard
+        self._level = level
+
+    def compress(self, data) -> bytes:
+        # compressor objects are not thread-safe, so every chunk gets its own
+        return self._module.ZstdCompressor(level=self._level).compress(data)
+
+    def decompress(self, data, raw_size: int) -> bytes:
+        return self._module.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+
+
+class _Lz4(_Codec):
+    name = 'lz4'
+
+    def __init__(self):
+        import lz4.block
+
+        self._module = lz4.block
+
+    def compress(self, data) -> bytes:
+        return self._module.compress(data, store_size=False)
+
+    def decompress(self, data, raw_size: int) -> bytes:
+        return self._module.decompress(data, uncompressed_size=raw_size)
+
+
+_codec_types = {'zstd': _Zstd, 'lz4': _Lz4}
+
+
+def get_codec(name: str) -> _Codec:
+    try:
+        return _codec_types[name]()
+    except KeyError:
+        raise ValueError(f"Unknown compression codec: {name}")
+
+
+def available_codecs():
+    """Names of the codecs whose libraries are installed."""
+    names = []
+    for name in _codec_types:
+        try:
+            get_codec(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def choose_codec(first_chunk, complete: bool) -> Optional[str]:
+    """Pick a codec from the payload size and the compression ratio of a sample.
+
+    Args:
+        first_chunk: the beginning of the payload.
+        complete (bool): whether ``first_chunk`` is the whole payload.
+
+    Returns:
+        str: the codec name, or None to store the payload uncompressed.
+    """
+    if complete and len(first_chunk) < MIN_COMPRESS_SIZE:
+        return None
+
+    codecs = available_codecs()
+    if not codecs:
+        return None
+
+    sample = bytes(first_chunk[:SAMPLE_SIZE])
+    ratio = len(sample) / max(1, len(get_codec(codecs[0]).compress(sample)))
+    if ratio < MIN_RATIO:
+        return None
+    if ratio >= ZSTD_RATIO and 'zstd' in codecs:
+        return 'zstd'
+    return 'lz4' if 'lz4' in codecs else codecs[0]
+
+
+class CompressingWriter(io.RawIOBase):
+    """Compresses a stream in independent chunks, in parallel, and writes them in order.
+
+    With ``codec='auto'`` the first chunk is buffered and sampled to decide, and a payload
+    that does not compress well is written through unchanged, without any framing.
+    Closing the writer flushes it but leaves the underlying stream open.
+    """
+
+    def __init__(self, file, codec: Optional[str] = 'auto',
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_workers: int = DEFAULT_MAX_WORKERS):
+        super().__init__()
+        self._file = file
+        self._chunk_size = chunk_size
+        self._max_workers = max_workers
+        self._buffer = bytearray()
+        self._pending = deque()
+        self._executor = None
+        self._codec = None
+        self._decided = codec != 'auto'
+        if codec not in ('auto', None):
+            self._start(codec)
+
+    @property
+    def codec(self) -> Optional[str]:
+        return self._codec.name if self._codec else None
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        view = memoryview(b).cast('B')
+        written = 0
+        while written < len(view):
+            if self._decided and self._codec is None:
+                self._file.write(view[written:])
+                break
+            chunk = view[written:written + self._chunk_size - len(self._buffer)]
+            self._buffer += chunk
+            written += len(chunk)
+            if len(self._buffer) >= self._chunk_size:
+                chunk, self._buffer = self._buffer, bytearray()
+                self._write_chunk(chunk, complete=False)
+        return len(view)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._decided:
+                self._write_chunk(self._buffer, complete=True)
+                self._buffer = bytearray()
+            if self._codec is not None:
+                self._drain(0)
+                self._file.write(_FRAME.pack(0, 0))
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+            super().close()
+
+    def _start(self, codec: str):
+        self._codec = get_codec(codec)
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        name = self._codec.name.encode()
+        self._file.write(MAGIC + _U8.pack(len(name)) + name)
+
+    def _write_chunk(self, chunk, complete: bool):
+        if not self._decided:
+            self._decided = True
+            codec = choose_codec(chunk, complete)
+            if codec is not None:
+                self._start(codec)
+
+        if self._codec is None:
+            self._file.write(chunk)
+            return
+
+        self._drain(self._max_workers - 1)
+        self._pending.append((len(chunk), self._executor.submit(self._codec.compress, chunk)))
+
+    def _drain(self, keep: int):
+        while len(self._pending) > keep:
+            raw_size, future = self._pending.popleft()
+            compressed = future.result()
+            self._file.write(_FRAME.pack(raw_size, len(compressed)))
+            self._file.write(compressed)
+
+
+class DecompressingReader(io.RawIOBase):
+    """Reads a stream written by :class:`CompressingWriter`, decompressing frames in parallel.
+
+    Frames are read ahead and handed to a thread pool, so decompression overlaps with
+    the download feeding ``file`` and with the consumer of this stream.
+    """
+
+    def __init__(self, file, codec: str, max_workers: int = DEFAULT_MAX_WORKERS):
+        super().__init__()
+        self._file = file
+        self._codec = get_codec(codec)
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = deque()
+        self._chunk = memoryview(b'')
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast('B')
+        filled = 0
+        while filled < len(view):
+            if not self._chunk:
+                self._fill()
+                if not self._pending:
+                    break
+                self._chunk = memoryview(self._pending.popleft().result())
+            n = min(len(view) - filled, len(self._chunk))
+            view[filled:filled + n] = self._chunk[:n]
+            self._chunk = self._chunk[n:]
+            filled += n
+        return filled
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(wait=True)
+        super().close()
+
+    def _fill(self):
+        while not self._eof and len(self._pending) < self._max_workers:
+            header = _read_exactly(self._file, _FRAME.size)
+            if len(header) < _FRAME.size:
+                raise EOFError("truncated compressed stream")
+            raw_size, compressed_size = _FRAME.unpack(header)
+            if raw_size == 0:
+                self._eof = True
+                break
+            compressed = bytearray(compressed_size)
+            _readinto_exactly(self._file, compressed)
+            self._pending.append(self._executor.submit(self._codec.decompress, compressed, raw_size))
+
+
+def open_decompressed(file, max_workers: int = DEFAULT_MAX_WORKERS):
+    """Wrap a readable stream so compressed payloads are decompressed and plain ones pass through."""
+    magic = _read_exactly(file, len(MAGIC))
+    if magic != MAGIC:
+        return _PrefixedReader(magic, file)
+    codec = _read_exactly(file, _read_exactly(file, _U8.size)[0]).decode()
+    return DecompressingReader(file, codec, max_workers=max_workers)
+
+
+def compress_bytes(data: bytes, codec: Optional[str] = 'auto') -> bytes:
+    file = io.BytesIO()
+    with CompressingWriter(file, codec=codec) as writer:
+        writer.write(data)
+    return file.getvalue()
+
+
+def decompress_bytes(data: bytes) -> bytes:
+    with open_decompressed(io.BytesIO(data)) as reader:
+        return reader.read()
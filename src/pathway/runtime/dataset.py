@@ -1,67 +1,262 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import TypeVar, Generic, Any
+from typing import TypeVar, Generic, Any, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import boto3
-import pickle
-import pathlib
+import csv
 import io
+import json
+import os
+import pathlib
+import shutil
+import threading
 import time
 
 
 primitives = (int, float, bool, str)
 
+RECORD_FORMATS = ('bytes', 'text', 'json', 'csv')
+# how much of a stream is split into records at a time
+RECORD_CHUNK_SIZE = 1024 * 1024
+# SageMaker uploads what a job writes here to S3 once it exits, so it is compressed like an S3 object
+STAGED_OUTPUT_DIR = '/opt/ml/processing/outputs'
+
+# streams opened by Output.open(), closed by the runtime once the function returns
+_open_writers = []
+_open_writers_lock = threading.Lock()
+
 
 @dataclass
 class Input:
+    """An S3 object or prefix read by the job.
+
+    With ``sharding`` set to 'key', 'range' or 'record', each instance of a multi-instance
+    job gets only its part of the input in ``slices``; see
+    :func:`pathway.runtime.sharding.shard_input`. Only ``open()``, ``iter_records()`` and
+    ``slices`` are sharded: ``path`` still names the whole input, and code that lists or
+    reads it directly sees every object on every instance.
+
+    With ``mode`` set to 'File' or 'FastFile', SageMaker stages the input as a processing
+    channel before the job starts, and ``path`` is a local directory in the job. Only
+    'key' sharding applies to a staged input, and then the directory holds just the
+    objects of the instance.
+    """
     path: str
+    sharding: Optional[str] = None
+    record_delimiter: bytes = b'\n'
+    slices: Optional[list] = None
+    mode: Optional[str] = None
+
+    def open(self, part_size: int = None, max_concurrency: int = None) -> io.BufferedReader:
+        """A binary stream over the objects of the input, or over its ``slices`` once sharded.
+
+        The objects are read in key order with ranged GETs, and the next chunks are fetched
+        in the background while the current one is consumed, so memory stays bounded by
+        ``part_size * max_concurrency`` for inputs of any size.
+        """
+        from pathway.runtime.transfer import ChainedReader, STREAM_PART_SIZE, STREAM_MAX_CONCURRENCY
+
+        part_size = part_size or STREAM_PART_SIZE
+        return io.BufferedReader(ChainedReader(self._ranges(), part_size=part_size,
+                                               max_concurrency=max_concurrency or STREAM_MAX_CONCURRENCY),
+                                 buffer_size=min(part_size, RECORD_CHUNK_SIZE))
+
+    def iter_records(self, format: str = 'bytes', encoding: str = 'utf-8',
+                     part_size: int = None, max_concurrency: int = None) -> Iterator[Any]:
+        """Stream the records of the input, split on ``record_delimiter``.
+
+        ``format`` is 'bytes' for the raw records, 'text' for decoded strings, 'json' for
+        one JSON document per record, or 'csv' for rows as lists of strings. Records do not
+        span objects. With 'range' sharding a record may be split between instances; use
+        'record' sharding to keep them whole.
+        """
+        from pathway.runtime.transfer import ChainedReader, STREAM_PART_SIZE, STREAM_MAX_CONCURRENCY
+
+        if format not in RECORD_FORMATS:
+            raise ValueError(f"Unknown record format {format}, expecting one of {RECORD_FORMATS}")
+        with ChainedReader(self._ranges(), part_size=part_size or STREAM_PART_SIZE,
+                           max_concurrency=max_concurrency or STREAM_MAX_CONCURRENCY) as chained:
+            for reader in chained.readers():
+                if format == 'csv':
+                    yield from csv.reader(io.TextIOWrapper(io.BufferedReader(reader), encoding=encoding,
+                                                           newline=''))
+                    continue
+                for record in _split_records(reader, self.record_delimiter):
+                    if format == 'bytes':
+                        yield record
+                    elif format == 'text':
+                        yield record.decode(encoding)
+                    elif record.strip():
+                        yield json.loads(record)
+
+    def _ranges(self) -> List[Tuple[str, int, Optional[int]]]:
+        from pathway.runtime.transfer import list_objects
+
+        if self.slices is not None:
+            return [(piece.path, piece.start, piece.end) for piece in self.slices]
+        return [(info.uri, 0, info.size) for info in list_objects(self.path) if not info.uri.endswith('/')]
+
+
+def _split_records(stream, delimiter: bytes) -> Iterator[bytes]:
+    pending = b''
+    while True:
+        chunk = stream.read(RECORD_CHUNK_SIZE)
+        if not chunk:
+            break
+        records = (pending + chunk).split(delimiter)
+        pending = records.pop()
+        yield from records
+    if pending:
+        yield pending
 
 
 @dataclass
 class Output:
+    """An S3 object or prefix written by the job."""
     path: str
 
+    def open(self, mode: str = 'wb', name: str = None, encoding: str = 'utf-8',
+             part_size: int = None, max_concurrency: int = None):
+        """A stream that uploads to ``path``, or to the object ``name`` under it, while it is written.
+
+        Full parts are uploaded in the background as the function keeps writing, and once
+        ``max_concurrency`` parts are in flight further writes wait for one to be
+        committed. The object appears when the stream is closed. Streams still open when
+        the function returns are closed by the runtime before the job finishes, and
+        discarded if the function raised.
+        """
+        from pathway.runtime.transfer import open_writer, STREAM_PART_SIZE, STREAM_MAX_CONCURRENCY
+
+        if mode not in ('wb', 'w'):
+            raise ValueError(f"Unsupported mode {mode}, expecting 'wb' or 'w'")
+        uri = self.path if name is None else f"{self.path.rstrip('/')}/{name}"
+        writer = open_writer(uri, part_size=part_size or STREAM_PART_SIZE,
+                             max_concurrency=max_concurrency or STREAM_MAX_CONCURRENCY)
+        stream = writer if mode == 'wb' else io.TextIOWrapper(writer, encoding=encoding)
+        with _open_writers_lock:
+            _open_writers.append(stream)
+        return stream
+
+
+def _close_outputs(abort: bool = False):
+    """Complete the uploads of the streams opened with :meth:`Output.open`, or discard them.
+
+    If completing one upload fails, the others are discarded and the error is raised.
+    """
+    global _open_writers
+    with _open_writers_lock:
+        streams, _open_writers = _open_writers, []
+    error = None
+    for stream in streams:
+        if stream.closed:
+            continue
+        if abort or error is not None:
+            # the writer under a text stream; its buffered text is dropped
+            getattr(stream, 'buffer', stream).abort()
+            continue
+        try:
+            stream.close()
+        except BaseException as e:
+            error = e
+    if error is not None:
+        raise error
+
 
 class _PickleDataLoader:
+    # objects at least this large are downloaded and memory-mapped when a local directory is given
+    MMAP_THRESHOLD = 64 * 1024 * 1024
 
     @staticmethod
-    def load_from_s3(s3_uri: str):
+    def load_from_s3(s3_uri: str, part_size: int = None, max_concurrency: int = None, mmap_dir: str = None):
+        """Deserialize straight from a parallel, ranged download of the object.
+
+        With ``mmap_dir``, large objects are downloaded to that directory first and their
+        buffers memory-mapped instead of being materialized on the heap. ``file://`` URIs
+        and local paths are read from disk, and memory-mapped in place when uncompressed.
+        A ``<blob>#<index>`` URI reads one item of a batch result.
+        """
+        from pathway.runtime import batch, metrics, serializers
+        from pathway.runtime.compression import DecompressingReader, open_decompressed
+        from pathway.runtime.transfer import open_reader, local_path, DEFAULT_PART_SIZE, DEFAULT_MAX_CONCURRENCY
+
+        item = batch.split_item_uri(s3_uri)
+        if item is not None:
+            with Timer(name=f"unpickle batch item from s3: {s3_uri}"):
+                return batch.load_item(*item)
+
         with Timer(name=f"unpickle from s3: {s3_uri}"):
-            bucket, object_key = parse_s3_url(s3_uri)
-            s3_resource = boto3.resource("s3")
-            bytes_io = io.BytesIO()
-            s3_resource.Bucket(bucket).download_fileobj(object_key, bytes_io)
-            bytes_io.seek(0)
-            return pickle.loads(bytes_io.read())
+            with open_reader(s3_uri,
+                             part_size=part_size or DEFAULT_PART_SIZE,
+                             max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY) as reader:
+                with open_decompressed(reader) as stream:
+                    path = local_path(s3_uri)
+                    if path is not None and not isinstance(stream, DecompressingReader):
+                        metrics.add_bytes(reader.size)
+                        return _PickleDataLoader.load_from_local(path)
+
+                    if path is not None or mmap_dir is None or reader.size < _PickleDataLoader.MMAP_THRESHOLD:
+                        data = serializers.load(stream)
+                        metrics.add_bytes(reader.bytes_read)
+                        return data
+
+                    os.makedirs(mmap_dir, exist_ok=True)
+                    local_copy = os.path.join(mmap_dir, parse_s3_url(s3_uri)[1].replace('/', '_'))
+                    with open(local_copy, "wb") as file:
+                        shutil.copyfileobj(stream, file, part_size or DEFAULT_PART_SIZE)
+                    metrics.add_bytes(reader.bytes_read)
+        return _PickleDataLoader.load_from_local(local_copy)
 
     @staticmethod
-    def save_to_s3(data: Any, s3_uri: str):
+    def save_to_s3(data: Any, s3_uri: str, part_size: int = None, max_concurrency: int = None,
+                   compression: Optional[str] = 'auto'):
+        """Serialize directly into a multipart upload, without an intermediate copy.
+
+        ``compression`` names a codec ('zstd', 'lz4'), None for no compression, or 'auto'
+        to pick one from the payload size and a sample of its compression ratio. 'auto'
+        leaves ``file://`` URIs and local paths uncompressed so they can be memory-mapped,
+        apart from outputs staged under ``STAGED_OUTPUT_DIR`` for upload.
+        """
+        from pathway.runtime import metrics, serializers
+        from pathway.runtime.compression import CompressingWriter
+        from pathway.runtime.transfer import open_writer, local_path, DEFAULT_PART_SIZE, DEFAULT_MAX_CONCURRENCY
+
+        path = local_path(s3_uri)
+        if compression == 'auto' and path is not None and not _is_staged_output(path):
+            compression = None
+
         with Timer(name=f"pickle to s3: {s3_uri}"):
-            bucket, object_key = parse_s3_url(s3_uri)
-            s3 = boto3.resource("s3")
-            data_file = io.BytesIO(pickle.dumps(data))
-            s3.Bucket(bucket).upload_fileobj(data_file, object_key)
+            with open_writer(s3_uri,
+                             part_size=part_size or DEFAULT_PART_SIZE,
+                             max_concurrency=max_concurrency or DEFAULT_MAX_CONCURRENCY) as writer:
+                with CompressingWriter(writer, codec=compression) as stream:
+                    serializers.dump(data, stream)
+            metrics.add_bytes(writer.bytes_written)
 
     @staticmethod
     def load_from_local(path: str):
-        with open(path, "rb") as file:
-            data = pickle.load(file)
-        return data
+        from pathway.runtime import serializers
+
+        return serializers.load_file(path)
 
     @staticmethod
     def save_to_local(data: Any, path: str):
+        from pathway.runtime import serializers
+
         if data is None:
             raise ValueError
 
         with open(path, "wb") as file:
-            pickle.dump(data, file)
+            serializers.dump(data, file)
 
 
+def _is_staged_output(path: str) -> bool:
+    return os.path.abspath(path).startswith(os.path.join(STAGED_OUTPUT_DIR, ''))
+
 
 class Job(ABC):
     def __init__(self, results=None):
         self._results = results
+        self._metrics_uri = None
 
     @abstractmethod
     def wait(self, logs=True):
@@ -79,6 +274,15 @@ class Job(ABC):
     def results(self):
         return self._results
 
+    def metrics(self):
+        """Timings and bytes moved per phase of the runtime, by host, once the job has finished.
+
+        See :class:`pathway.runtime.metrics.Metrics`.
+        """
+        from pathway.runtime.metrics import load_metrics
+
+        return None if self._metrics_uri is None else load_metrics(self._metrics_uri)
+
 
 class AbstractDataObject(ABC):
 
@@ -104,18 +308,46 @@ class _AsyncDataObject(AbstractDataObject):
         self._job = job
         self._path = path
         self._data = None
+        self._loaded = False
+        # the result cache key of the call that produces the data, if it is cached
+        self._cache_key = None
 
     def get(self) -> Any:
-        if self._data is not None:
+        """The result, loaded once per object through the disk cache; see :mod:`pathway.runtime.disk_cache`."""
+        from pathway.runtime.disk_cache import load_result
+
+        if self._loaded:
             return self._data
 
         if self._job.is_completed():
             # load
-            self._data = _PickleDataLoader.load_from_s3(self._path)
+            self._data = load_result(self._path)
+            self._loaded = True
             return self._data
 
         raise ValueError
 
+    def prefetch(self):
+        """Download the result to the disk cache in the background as soon as the job completes."""
+        from pathway.runtime.disk_cache import prefetch
+
+        prefetch(self)
+
+
+class _StoredDataObject(AbstractDataObject):
+    """An argument that has already been serialized to ``path``, e.g. one shared by many jobs."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._data = None
+        self._loaded = False
+
+    def get(self) -> Any:
+        if not self._loaded:
+            self._data = _PickleDataLoader.load_from_s3(self._path)
+            self._loaded = True
+        return self._data
+
 
 def _is_data_object(type_annotation):
     return issubclass(type_annotation, AbstractDataObject)
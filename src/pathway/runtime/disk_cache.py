@@ -0,0 +1,169 @@
+"""Downloaded job results kept on local disk, shared by every process of the user.
+
+An entry is keyed by the URI of a result and the version of the object behind it, the
+S3 ETag, so a result is downloaded once per machine rather than once per process or
+kernel, and downloaded again only if the object changes. Entries are files written
+under a temporary name and renamed into place, so processes can share the directory
+without locking. Reading an entry marks it as recently used, and once the directory
+holds more than ``max_bytes``, the least recently used entries are removed. A result
+larger than ``max_bytes`` is not cached and is read from S3 every time.
+"""
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+import hashlib
+import os
+import shutil
+import threading
+
+from pathway.runtime import batch
+from pathway.runtime.transfer import local_path, object_info, open_reader, DEFAULT_PART_SIZE
+
+DISK_CACHE_DIR = os.environ.get('PATHWAY_DISK_CACHE_DIR',
+                                os.path.join(os.path.expanduser('~'), '.cache', 'pathway', 'results'))
+# 0 turns the cache off
+DISK_CACHE_SIZE = int(os.environ.get('PATHWAY_DISK_CACHE_SIZE', 10 * 1024 ** 3))
+PREFETCH_WORKERS = 4
+
+_TEMPORARY_SUFFIX = '.tmp'
+
+
+class DiskCache:
+    def __init__(self, directory: str = DISK_CACHE_DIR, max_bytes: int = DISK_CACHE_SIZE):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        # one download per entry at a time in this process, e.g. a prefetch and a get()
+        self._locks = defaultdict(threading.Lock)
+        self._locks_lock = threading.Lock()
+
+    def load(self, uri: str) -> Any:
+        """The object at ``uri``, read from the cache and added to it first if needed."""
+        from pathway.runtime.dataset import _PickleDataLoader
+
+        path = self.fetch(uri)
+        try:
+            if path is None:
+                raise FileNotFoundError(uri)
+            data = _PickleDataLoader.load_from_s3(path)
+        except FileNotFoundError:
+            # too large to cache, or evicted by another process in the meantime
+            return _PickleDataLoader.load_from_s3(uri)
+        item = batch.split_item_uri(uri)
+        return data if item is None else batch.check_item(data, *item)
+
+    def fetch(self, uri: str) -> Optional[str]:
+        """The path of a local copy of the current version of ``uri``, downloaded if it is not cached.
+
+        An item of a batch result is cached on its own, without the rest of the blob.
+        Returns None for an object larger than the whole cache.
+        """
+        item = batch.split_item_uri(uri)
+        object_uri = uri if item is None else item[0]
+        info = object_info(object_uri)
+        if info is None:
+            raise FileNotFoundError(f"{object_uri} does not exist")
+        key = hashlib.sha256(f'{uri}\0{info.version}'.encode()).hexdigest()
+        path = os.path.join(self._directory, key)
+
+        with self._lock(key):
+            try:
+                # the modification time orders the entries for eviction
+                os.utime(path)
+                return path
+            except FileNotFoundError:
+                pass
+
+            start, end = 0, info.size
+            if item is not None:
+                offset, length = batch.read_index(object_uri)[item[1]]
+                start, end = offset, offset + length
+            if end - start > self._max_bytes:
+                return None
+            os.makedirs(self._directory, exist_ok=True)
+            temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}{_TEMPORARY_SUFFIX}'
+            try:
+                with open_reader(object_uri, start=start, end=end) as reader, open(temporary_path, 'wb') as file:
+                    shutil.copyfileobj(reader, file, DEFAULT_PART_SIZE)
+                os.replace(temporary_path, path)
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+        self._evict(keep=path)
+        return path
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks[key]
+
+    def _evict(self, keep: str):
+        """Remove the least recently used entries past ``max_bytes``, other than ``keep``, the one being returned."""
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(_TEMPORARY_SUFFIX) or entry.path == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+        for _, size, path in sorted(entries):
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+_cache: Optional[DiskCache] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """The shared cache, or None when ``PATHWAY_DISK_CACHE_SIZE`` is 0."""
+    global _cache
+    if DISK_CACHE_SIZE <= 0:
+        return None
+    with _lock:
+        if _cache is None:
+            _cache = DiskCache()
+        return _cache
+
+
+def load_result(uri: str) -> Any:
+    """Load a job result through the disk cache; local results are read in place."""
+    from pathway.runtime.dataset import _PickleDataLoader
+
+    cache = get_disk_cache()
+    if cache is None or local_path(uri) is not None:
+        return _PickleDataLoader.load_from_s3(uri)
+    return cache.load(uri)
+
+
+def prefetch(data_object):
+    """Download the result of an ``_AsyncDataObject`` to the disk cache once its job completes."""
+    global _executor
+    cache = get_disk_cache()
+    if cache is None or local_path(data_object._path) is not None:
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='pathway-prefetch')
+
+    def done(job):
+        if job.is_completed():
+            _executor.submit(_fetch_quietly, cache, data_object._path)
+
+    data_object._job.add_done_callback(done)
+
+
+def _fetch_quietly(cache: DiskCache, uri: str):
+    try:
+        cache.fetch(uri)
+    except Exception as e:
+        # get() downloads the result itself and reports the error
+        print(f"prefetching {uri} failed: {e!r}")
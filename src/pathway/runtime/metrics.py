@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import json
+import threading
+import time
+
+# resource config of a processing container; absent when running locally
+RESOURCE_CONFIG = '/opt/ml/config/resourceconfig.json'
+
+_current: Optional['Metrics'] = None
+
+
+class Metrics:
+    """Wall time of each phase of a run of the runtime, with the bytes each transfer moved.
+
+    While a ``Metrics`` is active (``with metrics:``), the module level :func:`phase` and
+    :func:`add_bytes` record into it, so the loaders need not be handed the collector.
+    Bytes are counted against the phase that was opened last and is still open.
+    """
+
+    def __init__(self, host: Optional[str] = None):
+        self.host = host or _current_host()
+        self._phases: List[Dict[str, Any]] = []
+        self._open: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._started = None
+        self._duration = None
+        self._status = None
+        self._error = None
+
+    def __enter__(self):
+        global _current
+        self._started = time.time()
+        _current = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        global _current
+        _current = None
+        self._duration = time.time() - self._started
+        self._status = 'Completed' if exc_type is None else 'Failed'
+        if exc_val is not None:
+            self._error = repr(exc_val)
+
+    @contextmanager
+    def phase(self, name: str, **attributes):
+        record = dict(name=name, **attributes)
+        with self._lock:
+            self._phases.append(record)
+            self._open.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['duration'] = time.perf_counter() - start
+            with self._lock:
+                self._open.remove(record)
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            if self._open:
+                record = self._open[-1]
+                record['bytes'] = record.get('bytes', 0) + n
+
+    def to_dict(self) -> Dict[str, Any]:
+        phases = []
+        for record in self._phases:
+            record = dict(record)
+            if 'bytes' in record and record.get('duration'):
+                record['throughput'] = record['bytes'] / record['duration']
+            phases.append(record)
+        return {'host': self.host, 'started': self._started, 'duration': self._duration,
+                'status': self._status, 'error': self._error, 'phases': phases}
+
+    def save(self, prefix: str):
+        """Write the metrics as JSON to ``<prefix>/<host>.json``."""
+        from pathway.runtime.transfer import write_bytes
+
+        write_bytes(f"{prefix.rstrip('/')}/{self.host}.json", json.dumps(self.to_dict(), indent=1).encode())
+
+
+@contextmanager
+def phase(name: str, **attributes):
+    """Time a phase of the active :class:`Metrics`, if any."""
+    if _current is None:
+        yield {}
+        return
+    with _current.phase(name, **attributes) as record:
+        yield record
+
+
+def add_bytes(n: int):
+    """Count bytes moved by the current phase of the active :class:`Metrics`, if any."""
+    if _current is not None:
+        _current.add_bytes(n)
+
+
+def load_metrics(prefix: str) -> Dict[str, Dict[str, Any]]:
+    """The metrics written under ``prefix``, by host."""
+    from pathway.runtime.transfer import list_objects, read_bytes
+
+    documents = {}
+    for info in list_objects(prefix.rstrip('/') + '/'):
+        if info.uri.endswith('.json'):
+            document = json.loads(read_bytes(info.uri))
+            documents[document['host']] = document
+    return documents
+
+
+def _current_host() -> str:
+    try:
+        with open(RESOURCE_CONFIG) as file:
+            return json.load(file)['current_host']
+    except (FileNotFoundError, KeyError, ValueError):
+        return 'local'
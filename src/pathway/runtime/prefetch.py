@@ -0,0 +1,64 @@
+"""Download the code and the serialized arguments of a job while its environment is bootstrapped.
+
+The URIs are known from the command line before anything is unpickled, so the objects
+are copied to a scratch directory in the background as soon as the runtime starts, and
+unpickled from there once the environment is ready. The time to the first instruction
+of the function is then the longest of the steps rather than their sum.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+import os
+import shutil
+import tempfile
+
+from pathway.runtime import metrics
+from pathway.runtime.transfer import local_path, open_reader, DEFAULT_PART_SIZE
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class Prefetcher:
+    """Copies S3 objects to local files on a thread pool.
+
+    ``path(uri)`` waits for the copy of ``uri`` and returns the local path to read it from.
+    Local paths, ``file://`` URIs and items of a batch result are not copied, and are
+    returned unchanged. The copies are removed when the prefetcher is closed.
+    """
+
+    def __init__(self, uris: Iterable[Optional[str]], directory: str, max_workers: int = DEFAULT_MAX_WORKERS):
+        from pathway.runtime.batch import split_item_uri
+
+        uris = [uri for uri in dict.fromkeys(uris)
+                if uri and local_path(uri) is None and split_item_uri(uri) is None]
+        os.makedirs(directory, exist_ok=True)
+        self._directory = tempfile.mkdtemp(prefix='prefetch-', dir=directory)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(uris))))
+        self._downloads: Dict[str, Future] = {
+            uri: self._executor.submit(self._download, uri, os.path.join(self._directory, str(i)))
+            for i, uri in enumerate(uris)}
+
+    def path(self, uri: str) -> str:
+        download = self._downloads.get(uri)
+        return uri if download is None else download.result()
+
+    def close(self):
+        for download in self._downloads.values():
+            download.cancel()
+        self._executor.shutdown(wait=True)
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def _download(uri: str, path: str) -> str:
+        # several downloads run at once, so the bytes go to their own phase record
+        with metrics.phase('prefetch', uri=uri) as record, open_reader(uri) as reader:
+            with open(path, 'wb') as file:
+                shutil.copyfileobj(reader, file, DEFAULT_PART_SIZE)
+            record['bytes'] = reader.bytes_read
+        return path
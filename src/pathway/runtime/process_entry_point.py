@@ -1,38 +1,96 @@
 import argparse
-import boto3
+import io
 import pickle
 import inspect
+import os
+import tempfile
 
+from pathway.runtime import serializers
+from pathway.runtime.batch import run_batch
 from pathway.runtime.bootstrap import bootstrap
+from pathway.runtime.cluster import Cluster
+from pathway.runtime.compression import decompress_bytes
+from pathway.runtime.metrics import Metrics, add_bytes, phase
+from pathway.runtime.prefetch import Prefetcher
+from pathway.runtime.sharding import shard_input
+from pathway.runtime.transfer import read_bytes
+from pathway.util import BLOB_PERSISTENT_ID, code_blob_uri
 
-from .dataset import Input, Output, _PickleDataLoader, is_primitive, Timer, parse_s3_url
+from .dataset import Input, Output, DataObject, _PickleDataLoader, _close_outputs, is_primitive, Timer
 
 from typing import Callable
 from urllib.parse import urlparse
 
+# large arguments are downloaded here and memory-mapped
+SCRATCH_DIR = os.environ.get('PATHWAY_SCRATCH_DIR', os.path.join(tempfile.gettempdir(), 'pathway'))
+
 
 def processing_script(input_args):
     # limits on container arguments
     # https://code.amazon.com/packages/IronmanApiServiceModel/blobs/269d344ed88965188aecc541b99e69d02deb839f/--/model/processing/types/common-types.xml#L620
 
-    parser = argparse.ArgumentParser()
+    # the runtime's own options have a dash in their name, so no function parameter can take them, and
+    # abbreviations are off so that a parameter is never read as a prefix of one of them
+    parser = argparse.ArgumentParser(allow_abbrev=False)
     parser.add_argument('--func-code', type=str)
     parser.add_argument('--env-def', type=str)
+    parser.add_argument('--pathway-metrics', dest='metrics', type=str)
+    parser.add_argument('--pathway-batch', dest='batch', type=str)
+    parser.add_argument('--pathway-batch-workers', dest='batch_workers', type=int)
+    parser.add_argument('--pathway-prefetch', dest='prefetch', type=str)
     args, _ = parser.parse_known_args(input_args)
 
-    # bootstrap
-    if args.env_def:
-        bootstrap(args.env_def)
+    metrics = Metrics()
+    try:
+        with metrics:
+            _process(args, input_args)
+    finally:
+        if args.metrics:
+            metrics.save(args.metrics)
+
+
+def _process(args: argparse.Namespace, input_args):
+    # download the code and the serialized arguments while the environment is installed
+    with Prefetcher([args.func_code, args.batch] + _prefetched_arguments(args, input_args),
+                    SCRATCH_DIR) as prefetcher:
+        # bootstrap
+        if args.env_def:
+            with phase('bootstrap'):
+                bootstrap(args.env_def)
+
+        # deserialize the code
+        func = _get_function(args.func_code, prefetcher)
+
+        if args.batch:
+            _process_batch(func, args, input_args, prefetcher)
+        else:
+            _process_call(func, input_args, prefetcher)
+
+
+def _prefetched_arguments(args: argparse.Namespace, input_args):
+    """The URIs of the arguments named by ``--pathway-prefetch``."""
+    if not args.prefetch:
+        return []
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    keys = args.prefetch.split(',')
+    for key in keys:
+        parser.add_argument(f"--{key}", type=str)
+    values, _ = parser.parse_known_args(input_args)
+    return [getattr(values, key.replace('-', '_')) for key in keys]
 
-    # deserialize the code
-    func = _get_function(args.func_code)
 
-    # rebuild the arguments
+def _process_call(func: Callable, input_args, prefetcher: Prefetcher):
+
+    # rebuild the arguments, apart from the runtime's own so that their names can't clash
+    parser = argparse.ArgumentParser(allow_abbrev=False)
     signature = inspect.signature(func)
     parameters = signature.parameters
     for key in parameters.keys():
         if parameters.get(key).annotation == Input:
             parser.add_argument(f"--{key}", type=str)
+            parser.add_argument(f"--{key}-sharding", dest=f"{key}-sharding", type=str)
+            parser.add_argument(f"--{key}-record-delimiter", dest=f"{key}-record-delimiter", type=bytes.fromhex,
+                                default=b'\n')
         elif parameters.get(key).annotation == Output:
             parser.add_argument(f"--{key}", type=str)
         elif parameters.get(key).annotation in (int, float, bool, str):
@@ -49,30 +107,82 @@ def processing_script(input_args):
     args, _ = parser.parse_known_args(input_args)
 
     call_args = {}
+    cluster = None
     for key in parameters.keys():
         if parameters.get(key).annotation == Input:
-            call_args[key] = Input(getattr(args, key))
+            call_args[key] = Input(getattr(args, key),
+                                   sharding=getattr(args, f'{key}-sharding'),
+                                   record_delimiter=getattr(args, f'{key}-record-delimiter'))
+            if call_args[key].sharding:
+                cluster = cluster or Cluster()
+                with Timer(name=f"sharding {key} for host {cluster.rank} of {cluster.size}"), \
+                        phase('sharding', argument=key):
+                    call_args[key] = shard_input(call_args[key], cluster.rank, cluster.size)
         elif parameters.get(key).annotation == Output:
             call_args[key] = Output(getattr(args, key))
         elif is_primitive(parameters.get(key).annotation):
             call_args[key] = getattr(args, key)
         else:
-            call_args[key] = _PickleDataLoader.load_from_s3(getattr(args, key))
+            with phase('argument_load', argument=key, uri=getattr(args, key)):
+                call_args[key] = _PickleDataLoader.load_from_s3(prefetcher.path(getattr(args, key)),
+                                                                mmap_dir=SCRATCH_DIR)
 
     # invoke
-    results = func(**call_args)
+    with phase('user_function'):
+        try:
+            results = func(**call_args)
+        except BaseException:
+            _close_outputs(abort=True)
+            raise
+    # the job is finished only once every part written to an output is committed
+    with phase('output_flush'):
+        _close_outputs()
 
     if signature.return_annotation is not inspect._empty:
-        _PickleDataLoader.save_to_s3(results, getattr(args, 'return'))
+        if isinstance(results, DataObject):
+            results = results.get()
+        with phase('result_save', uri=getattr(args, 'return')):
+            _PickleDataLoader.save_to_s3(results, getattr(args, 'return'))
 
 
-def _get_function(code_location: str) -> Callable:
-    with Timer(name=f"loading code from {code_location}"):
-        bucket, object_key = parse_s3_url(code_location)
+def _process_batch(func: Callable, args: argparse.Namespace, input_args, prefetcher: Prefetcher):
+    """Call ``func`` once per set of keyword arguments in the batch and write the indexed results."""
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument('--return', type=str)
+    result_uri = getattr(parser.parse_known_args(input_args)[0], 'return')
 
-        session = boto3.session.Session()
-        s3_resource = session.resource('s3')
+    with phase('argument_load', uri=args.batch):
+        calls = _PickleDataLoader.load_from_s3(prefetcher.path(args.batch), mmap_dir=SCRATCH_DIR)
+    with Timer(name=f"running a batch of {len(calls)} calls"), phase('user_function', calls=len(calls)):
+        run_batch(func, calls, result_uri, max_workers=args.batch_workers)
 
-        code = s3_resource.Object(bucket, object_key).get()['Body'].read()
-        return pickle.loads(code)
+
+def _get_function(code_location: str, prefetcher: Prefetcher = None) -> Callable:
+    with Timer(name=f"loading code from {code_location}"):
+        with phase('code_fetch', uri=code_location):
+            code = read_bytes(code_location if prefetcher is None else prefetcher.path(code_location))
+            add_bytes(len(code))
+        with phase('code_unpickle'):
+            return _CodeUnpickler(io.BytesIO(decompress_bytes(code)), code_location).load()
+
+
+class _CodeUnpickler(pickle.Unpickler):
+    """Unpickles a function, loading the large objects it captures from where the client stored them apart.
+
+    Sets the client wrote with their members in a fixed order are rebuilt here too.
+    """
+
+    def __init__(self, file, code_location: str):
+        super().__init__(file)
+        self._code_location = code_location
+
+    def persistent_load(self, pid):
+        if pid[0] == serializers.SET_PERSISTENT_ID:
+            return serializers.load_persistent_set(pid)
+        kind, digest = pid
+        if kind != BLOB_PERSISTENT_ID:
+            raise pickle.UnpicklingError(f"unsupported persistent id {pid}")
+        uri = code_blob_uri(self._code_location, digest)
+        with phase('code_blob', uri=uri):
+            return _PickleDataLoader.load_from_s3(uri, mmap_dir=SCRATCH_DIR)
 
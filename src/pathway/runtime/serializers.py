@@ -0,0 +1,452 @@
+from abc import ABC, abstractmethod
+from typing import Any, List, Optional
+
+import hashlib
+import io
+import mmap
+import pickle
+import shutil
+import struct
+import sys
+import tempfile
+
+MAGIC = b'PWSR'
+
+# out-of-band buffers are aligned to this many bytes from the start of the file
+ALIGNMENT = 64
+# buffers smaller than this stay inside the pickle stream
+OUT_OF_BAND_THRESHOLD = 64 * 1024
+# the in-band part of a pickle is spooled to disk beyond this size
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+# how many bytes are copied at a time from a spooled file
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# the persistent id of a set pickled with its members in a fixed order; a set otherwise
+# pickles in iteration order, which for strings depends on the hash seed of the process
+SET_PERSISTENT_ID = 'pathway-set'
+
+_U8 = struct.Struct('<B')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+
+class Serializer(ABC):
+    """Writes and reads one family of objects.
+
+    Every serialized object starts with a small header naming the serializer, so the
+    reader does not need to know the type in advance.
+    """
+    name: str
+
+    @abstractmethod
+    def can_serialize(self, data: Any) -> bool:
+        """Whether this serializer handles ``data``."""
+
+    def prepare(self, data: Any) -> Any:
+        """Convert ``data`` before the header is written; raise TypeError or ValueError to decline it."""
+        return data
+
+    @abstractmethod
+    def dump(self, data: Any, file):
+        """Write the prepared ``data`` to a writable stream."""
+
+    @abstractmethod
+    def load(self, file) -> Any:
+        """Read an object back from a readable stream."""
+
+    def load_mapped(self, path: str, offset: int) -> Any:
+        """Read an object stored in a local file at ``offset``, memory-mapping large buffers when possible."""
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            return self.load(file)
+
+
+class PickleSerializer(Serializer):
+    """Pickle protocol 5, with large buffers stored out-of-band after a small header.
+
+    Layout: ``[buffer count][(length, padding, bytes) per buffer][in-band pickle]``. The
+    buffers come first so a stream reader has them before unpickling, and they are
+    aligned so a memory-mapped file can back them directly.
+
+    With ``canonical``, the members of every set are pickled in a fixed order, so equal
+    objects give the same bytes in every process. This is slower, as every object goes
+    through ``persistent_id``, and is only used where the bytes are hashed.
+    """
+    name = 'pickle5'
+
+    def __init__(self, canonical: bool = False):
+        self._canonical = canonical
+
+    def can_serialize(self, data: Any) -> bool:
+        return True
+
+    def dump(self, data: Any, file):
+        buffers = []
+
+        def buffer_callback(buffer: pickle.PickleBuffer):
+            if buffer.raw().nbytes < OUT_OF_BAND_THRESHOLD:
+                return True
+            buffers.append(buffer)
+            return False
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as in_band:
+            pickler = _CanonicalPickler if self._canonical else pickle.Pickler
+            pickler(in_band, protocol=5, buffer_callback=buffer_callback).dump(data)
+
+            file.write(_U32.pack(len(buffers)))
+            for buffer in buffers:
+                raw = buffer.raw()
+                padding = -(file.position + _U64.size + _U8.size) % ALIGNMENT
+                file.write(_U64.pack(raw.nbytes) + _U8.pack(padding) + b'\0' * padding)
+                file.write(raw)
+
+            in_band.seek(0)
+            shutil.copyfileobj(in_band, file)
+
+    def load(self, file) -> Any:
+        buffers = []
+        for _ in range(_read_struct(file, _U32)):
+            length = _read_struct(file, _U64)
+            _read_exactly(file, _read_struct(file, _U8))
+            buffer = bytearray(length)
+            _readinto_exactly(file, buffer)
+            buffers.append(buffer)
+        return _Unpickler(file, buffers=buffers).load()
+
+    def load_mapped(self, path: str, offset: int) -> Any:
+        with open(path, 'rb') as file:
+            mapped = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+            file.seek(offset)
+            buffers = []
+            for _ in range(_read_struct(file, _U32)):
+                length = _read_struct(file, _U64)
+                file.seek(_read_struct(file, _U8), io.SEEK_CUR)
+                start = file.tell()
+                buffers.append(mapped[start:start + length])
+                file.seek(length, io.SEEK_CUR)
+            return _Unpickler(file, buffers=buffers).load()
+
+
+class NumpySerializer(Serializer):
+    """NumPy arrays in ``.npy`` format, memory-mapped copy-on-write from local files."""
+    name = 'npy'
+
+    def can_serialize(self, data: Any) -> bool:
+        numpy = sys.modules.get('numpy')
+        # subclasses such as masked arrays and matrices have state that .npy drops
+        return numpy is not None and type(data) is numpy.ndarray and not data.dtype.hasobject
+
+    def dump(self, data: Any, file):
+        import numpy.lib.format
+
+        numpy.lib.format.write_array(file, data, allow_pickle=False)
+
+    def load(self, file) -> Any:
+        import numpy.lib.format
+
+        return numpy.lib.format.read_array(file, allow_pickle=False)
+
+    def load_mapped(self, path: str, offset: int) -> Any:
+        import numpy
+        import numpy.lib.format
+
+        with open(path, 'rb') as file:
+            file.seek(offset)
+            version = numpy.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(file)
+            data_offset = file.tell()
+
+        if not shape or 0 in shape:
+            return numpy.zeros(shape, dtype=dtype, order='F' if fortran_order else 'C')
+        return numpy.memmap(path, dtype=dtype, mode='c', shape=shape,
+                            order='F' if fortran_order else 'C', offset=data_offset)
+
+
+class ArrowSerializer(Serializer):
+    """Arrow tables in the IPC stream format, zero-copy from memory-mapped local files."""
+    name = 'arrow'
+
+    def can_serialize(self, data: Any) -> bool:
+        pyarrow = sys.modules.get('pyarrow')
+        return pyarrow is not None and isinstance(data, pyarrow.Table)
+
+    def dump(self, data: Any, file):
+        import pyarrow
+
+        with pyarrow.ipc.new_stream(pyarrow.PythonFile(file, mode='w'), data.schema) as writer:
+            writer.write_table(data)
+
+    def load(self, file) -> Any:
+        import pyarrow
+
+        return pyarrow.ipc.open_stream(pyarrow.PythonFile(file, mode='r')).read_all()
+
+    def load_mapped(self, path: str, offset: int) -> Any:
+        import pyarrow
+
+        source = pyarrow.memory_map(path, 'r')
+        source.seek(offset)
+        return pyarrow.ipc.open_stream(source).read_all()
+
+
+class PandasSerializer(ArrowSerializer):
+    """pandas DataFrames, stored as Arrow tables with the pandas metadata attached.
+
+    Only frames whose columns and labels come back from Arrow unchanged are taken:
+    numeric, bool, datetime, timedelta, categorical and string dtypes. Object columns,
+    among others, would come back with another dtype or other values, and are pickled.
+    """
+    name = 'arrow-pandas'
+
+    def can_serialize(self, data: Any) -> bool:
+        pandas = sys.modules.get('pandas')
+        return pandas is not None and isinstance(data, pandas.DataFrame)
+
+    def prepare(self, data: Any) -> Any:
+        import pyarrow
+
+        if data.attrs or not all(_exact_in_arrow(dtype) for dtype in data.dtypes) or \
+                not _labels_exact_in_arrow(data.index) or not _labels_exact_in_arrow(data.columns):
+            raise TypeError("the frame does not round-trip through Arrow")
+        return pyarrow.Table.from_pandas(data)
+
+    def load(self, file) -> Any:
+        return super().load(file).to_pandas()
+
+    def load_mapped(self, path: str, offset: int) -> Any:
+        return super().load_mapped(path, offset).to_pandas()
+
+
+def _exact_in_arrow(dtype) -> bool:
+    import pandas
+
+    if isinstance(dtype, pandas.CategoricalDtype):
+        return _exact_in_arrow(dtype.categories.dtype)
+    if isinstance(dtype, (pandas.StringDtype, pandas.DatetimeTZDtype)):
+        return True
+    types = pandas.api.types
+    return (types.is_numeric_dtype(dtype) and not types.is_complex_dtype(dtype)) or \
+        types.is_datetime64_dtype(dtype) or types.is_timedelta64_dtype(dtype)
+
+
+def _labels_exact_in_arrow(index) -> bool:
+    # the frequency of a datetime index is not stored
+    return getattr(index, 'freq', None) is None and \
+        all(_exact_in_arrow(index.get_level_values(level).dtype) for level in range(index.nlevels))
+
+
+# tried in order; the first serializer that accepts an object writes it
+_serializers: List[Serializer] = [
+    NumpySerializer(),
+    PandasSerializer(),
+    ArrowSerializer(),
+    PickleSerializer(),
+]
+_canonical_pickle = PickleSerializer(canonical=True)
+
+
+def register_serializer(serializer: Serializer):
+    """Register a serializer ahead of the built-in ones."""
+    _serializers.insert(0, serializer)
+
+
+def serializer_named(name: str) -> Serializer:
+    for serializer in _serializers:
+        if serializer.name == name:
+            return serializer
+    raise ValueError(f"Unknown serializer: {name}")
+
+
+def dump(data: Any, file, canonical: bool = False):
+    """Write ``data`` with a header naming the serializer chosen for its type, and return that name.
+
+    With ``canonical``, equal objects are written as the same bytes in every process.
+    """
+    if isinstance(data, Serialized):
+        data.write_to(file)
+        return data.name
+    for serializer in _serializers:
+        if not serializer.can_serialize(data):
+            continue
+        if canonical and isinstance(serializer, PickleSerializer):
+            serializer = _canonical_pickle
+        try:
+            prepared = serializer.prepare(data)
+        except (TypeError, ValueError):
+            continue
+
+        file = _CountingWriter(file)
+        name = serializer.name.encode()
+        file.write(MAGIC + _U8.pack(len(name)) + name)
+        serializer.dump(prepared, file)
+        return serializer.name
+    raise ValueError(f"No serializer for {type(data)}")
+
+
+def load(file) -> Any:
+    """Read an object written by :func:`dump`, or a plain pickle."""
+    magic = _read_exactly(file, len(MAGIC))
+    if magic != MAGIC:
+        return pickle.load(_PrefixedReader(magic, file))
+    name = _read_exactly(file, _read_struct(file, _U8)).decode()
+    return serializer_named(name).load(file)
+
+
+def load_file(path: str) -> Any:
+    """Read an object from a local file, memory-mapping large buffers instead of copying them."""
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+        if magic != MAGIC:
+            file.seek(0)
+            return pickle.load(file)
+        name = _read_exactly(file, _read_struct(file, _U8)).decode()
+        offset = file.tell()
+    return serializer_named(name).load_mapped(path, offset)
+
+
+class Serialized:
+    """The canonical output of :func:`dump` for an object, kept aside with its sha256 digest.
+
+    Passing it to :func:`dump` writes the kept bytes, so an object that was hashed is
+    stored without being serialized again. Large outputs are spooled to disk.
+    """
+
+    def __init__(self, data: Any):
+        self._file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        digest = _DigestingWriter(self._file)
+        self.name = dump(data, digest, canonical=True)
+        self.digest = digest.hexdigest()
+
+    def write_to(self, file):
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, file, COPY_CHUNK_SIZE)
+
+
+def canonical_bytes(obj: Any) -> bytes:
+    """A pickle of ``obj`` that is the same in every process, with the members of sets sorted."""
+    buffer = io.BytesIO()
+    _CanonicalPickler(buffer, protocol=5).dump(obj)
+    return buffer.getvalue()
+
+
+def set_persistent_id(obj: Any) -> Optional[tuple]:
+    """The persistent id that pickles a set or frozenset with its members sorted, or None for anything else."""
+    if type(obj) not in (set, frozenset):
+        return None
+    try:
+        members = sorted(obj, key=canonical_bytes)
+    except Exception:
+        # a member that cannot be pickled on its own; the set is pickled as is
+        return None
+    return SET_PERSISTENT_ID, type(obj) is frozenset, members
+
+
+def load_persistent_set(pid: tuple):
+    """The set for a persistent id from :func:`set_persistent_id`."""
+    _, frozen, members = pid
+    return frozenset(members) if frozen else set(members)
+
+
+class _CanonicalPickler(pickle.Pickler):
+    # the C pickler does not consult reducer_override or the dispatch table for sets,
+    # but it asks persistent_id about every object
+    def persistent_id(self, obj):
+        return set_persistent_id(obj)
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid[0] == SET_PERSISTENT_ID:
+            return load_persistent_set(pid)
+        raise pickle.UnpicklingError(f"unsupported persistent id {pid}")
+
+
+def _read_exactly(file, size: int) -> bytes:
+    buffer = bytearray(size)
+    filled = _readinto_exactly(file, buffer, allow_eof=True)
+    return bytes(buffer[:filled])
+
+
+def _readinto_exactly(file, buffer, allow_eof: bool = False) -> int:
+    """Fill ``buffer`` from ``file``; raw streams may return short reads."""
+    view = memoryview(buffer)
+    filled = 0
+    while filled < len(view):
+        n = file.readinto(view[filled:])
+        if not n:
+            if allow_eof:
+                break
+            raise EOFError("truncated serialized object")
+        filled += n
+    return filled
+
+
+def _read_struct(file, layout: struct.Struct) -> int:
+    data = _read_exactly(file, layout.size)
+    if len(data) != layout.size:
+        raise EOFError("truncated serializer header")
+    return layout.unpack(data)[0]
+
+
+class _CountingWriter(io.RawIOBase):
+    """Tracks the position of a stream that cannot ``tell()``."""
+
+    def __init__(self, file):
+        super().__init__()
+        self._file = file
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        written = self._file.write(b)
+        if written is None:
+            written = memoryview(b).nbytes
+        self.position += written
+        return written
+
+
+class _DigestingWriter(io.RawIOBase):
+    """Hashes what is written on its way to another stream."""
+
+    def __init__(self, file):
+        super().__init__()
+        self._file = file
+        self._digest = hashlib.sha256()
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        self._digest.update(b)
+        self._file.write(b)
+        return memoryview(b).nbytes
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Replays bytes already consumed from a stream before reading the rest of it."""
+
+    def __init__(self, prefix: bytes, file):
+        super().__init__()
+        self._prefix = memoryview(prefix)
+        self._file = file
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast('B')
+        n = min(len(view), len(self._prefix))
+        view[:n] = self._prefix[:n]
+        self._prefix = self._prefix[n:]
+        if n < len(view):
+            n += self._file.readinto(view[n:]) or 0
+        return n
@@ -0,0 +1,118 @@
+from dataclasses import dataclass, replace
+from typing import List, Tuple
+
+from pathway.runtime import clients
+from pathway.runtime.dataset import Input, parse_s3_url
+from pathway.runtime.transfer import key_in_directory
+
+SHARDING_POLICIES = ('key', 'range', 'record')
+
+# how much is read at a time when looking for the end of a record
+_PROBE_SIZE = 64 * 1024
+
+
+@dataclass(frozen=True)
+class InputSlice:
+    """A byte range ``[start, end)`` of one S3 object."""
+    path: str
+    start: int
+    end: int
+
+
+def shard_input(data: Input, rank: int, size: int, s3_client=None) -> Input:
+    """Return the part of ``data`` that the instance ``rank`` out of ``size`` should process.
+
+    The objects under ``data.path`` are split according to ``data.sharding``:
+
+    * ``key``: whole objects, balanced by size across the instances.
+    * ``range``: contiguous byte ranges of equal size across all objects.
+    * ``record``: like ``range``, but every boundary is moved forward to just after the
+      next ``data.record_delimiter`` so that no record is split.
+
+    Every instance lists the same objects and computes the same boundaries, so the
+    slices are disjoint and cover the input without any coordination.
+    """
+    if data.sharding not in SHARDING_POLICIES:
+        raise ValueError(f"Unknown sharding policy {data.sharding}, expecting one of {SHARDING_POLICIES}")
+
+    s3_client = s3_client or clients.client('s3')
+    objects = _list_objects(s3_client, data.path)
+
+    if data.sharding == 'key':
+        slices = [InputSlice(path, 0, length) for path, length in _assign_by_size(objects, size)[rank]]
+    else:
+        total = sum(length for _, length in objects)
+        start, end = total * rank // size, total * (rank + 1) // size
+        if data.sharding == 'record':
+            start = _align_to_record(s3_client, objects, start, data.record_delimiter)
+            end = _align_to_record(s3_client, objects, end, data.record_delimiter)
+        slices = _slices_in_range(objects, start, end)
+
+    return replace(data, slices=slices)
+
+
+def _list_objects(s3_client, path: str) -> List[Tuple[str, int]]:
+    """(uri, size) of the object at ``path``, or of every object under it, sorted by key."""
+    bucket, prefix = parse_s3_url(path)
+    objects = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            if item['Key'] == prefix:
+                return [(f"s3://{bucket}/{item['Key']}", item['Size'])]
+            if item['Key'].endswith('/') or not key_in_directory(item['Key'], prefix):
+                continue
+            objects.append((f"s3://{bucket}/{item['Key']}", item['Size']))
+    return sorted(objects)
+
+
+def _assign_by_size(objects: List[Tuple[str, int]], size: int) -> List[List[Tuple[str, int]]]:
+    """Greedily give the largest remaining object to the least loaded instance."""
+    assignments = [[] for _ in range(size)]
+    loads = [0] * size
+    for path, length in sorted(objects, key=lambda item: (-item[1], item[0])):
+        rank = min(range(size), key=lambda r: (loads[r], r))
+        assignments[rank].append((path, length))
+        loads[rank] += length
+    return [sorted(assigned) for assigned in assignments]
+
+
+def _slices_in_range(objects: List[Tuple[str, int]], start: int, end: int) -> List[InputSlice]:
+    """Map a range of the concatenated objects back to per-object slices."""
+    slices = []
+    offset = 0
+    for path, length in objects:
+        lo, hi = max(start, offset), min(end, offset + length)
+        if lo < hi:
+            slices.append(InputSlice(path, lo - offset, hi - offset))
+        offset += length
+    return slices
+
+
+def _align_to_record(s3_client, objects: List[Tuple[str, int]], position: int, delimiter: bytes) -> int:
+    """Move a position in the concatenated objects to just after the next delimiter.
+
+    Records never span objects, so a position is also aligned at the start of an object,
+    and the search stops at the end of the object it started in.
+    """
+    offset = 0
+    for path, length in objects:
+        if position < offset + length:
+            local = position - offset
+            if local == 0:
+                return position
+            bucket, key = parse_s3_url(path)
+            # a record starting exactly at the boundary belongs to this shard
+            probe = max(0, local - len(delimiter))
+            while probe < length:
+                response = s3_client.get_object(Bucket=bucket, Key=key,
+                                                 Range=f'bytes={probe}-{min(length, probe + _PROBE_SIZE) - 1}')
+                chunk = response['Body'].read()
+                found = chunk.find(delimiter)
+                if found >= 0:
+                    return offset + probe + found + len(delimiter)
+                # keep a partial delimiter that straddles two probes
+                probe += max(1, len(chunk) - len(delimiter) + 1)
+            return offset + length
+        offset += length
+    return position
@@ -0,0 +1,476 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+import io
+import os
+import secrets
+import threading
+
+from pathway.runtime import clients
+from pathway.runtime.dataset import parse_s3_url
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 8
+
+# smaller windows for streams consumed while they download, such as Input.open()
+STREAM_PART_SIZE = 8 * 1024 * 1024
+STREAM_MAX_CONCURRENCY = 4
+
+# S3 rejects multipart parts smaller than this, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3Writer(io.RawIOBase):
+    """A write-only stream that uploads to S3 as a multipart upload.
+
+    Written bytes are buffered until a part is full, then the part is uploaded in the
+    background. At most ``max_concurrency`` parts are in flight; further writes block
+    until one of them is committed, which bounds memory to roughly
+    ``part_size * (max_concurrency + 1)``. Objects smaller than one part are sent with a
+    single ``PutObject`` call. Closing the stream completes the upload; leaving a ``with``
+    block on an exception aborts it.
+    """
+
+    def __init__(self, s3_uri: str,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 s3_client=None):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes, got {part_size}")
+
+        self._bucket, self._key = parse_s3_url(s3_uri)
+        self._part_size = part_size
+        self._s3_client = s3_client or clients.client('s3')
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._raise_failed_parts()
+
+        view = memoryview(b).cast('B')
+        written = 0
+        while written < len(view):
+            chunk = view[written:written + self._part_size - len(self._buffer)]
+            self._buffer += chunk
+            written += len(chunk)
+            if len(self._buffer) >= self._part_size:
+                self._upload_part()
+        self.bytes_written += written
+        return written
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._s3_client.put_object(Bucket=self._bucket, Key=self._key, Body=bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part()
+                parts = [{'PartNumber': number, 'ETag': future.result()} for number, future in self._parts]
+                self._s3_client.complete_multipart_upload(Bucket=self._bucket, Key=self._key,
+                                                          UploadId=self._upload_id,
+                                                          MultipartUpload={'Parts': parts})
+        except BaseException:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def abort(self):
+        """Discard the upload without creating the object."""
+        if self._upload_id is not None:
+            self._executor.shutdown(wait=True)
+            self._s3_client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            response = self._s3_client.create_multipart_upload(Bucket=self._bucket, Key=self._key)
+            self._upload_id = response['UploadId']
+
+        body, self._buffer = self._buffer, bytearray()
+        part_number = len(self._parts) + 1
+
+        self._slots.acquire()
+        future = self._executor.submit(self._send_part, part_number, body)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._parts.append((part_number, future))
+
+    def _send_part(self, part_number: int, body: bytearray) -> str:
+        response = self._s3_client.upload_part(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id,
+                                               PartNumber=part_number, Body=body)
+        return response['ETag']
+
+    def _raise_failed_parts(self):
+        for _, future in self._parts:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+
+class S3Reader(io.RawIOBase):
+    """A read-only stream over an S3 object built from parallel ranged GETs.
+
+    Up to ``max_concurrency`` chunks of ``part_size`` bytes are fetched ahead of the read
+    position, so the download overlaps with whatever consumes the stream while memory
+    stays bounded by the read-ahead window. ``start`` and ``end`` restrict the stream to
+    a byte range of the object.
+    """
+
+    def __init__(self, s3_uri: str,
+                 part_size: int = DEFAULT_PART_SIZE,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 s3_client=None,
+                 start: int = 0,
+                 end: Optional[int] = None):
+        super().__init__()
+        self._bucket, self._key = parse_s3_url(s3_uri)
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        self._s3_client = s3_client or clients.client('s3')
+        if end is None:
+            end = self._s3_client.head_object(Bucket=self._bucket, Key=self._key)['ContentLength']
+        self._end = end
+        self._next_offset = start
+        self._pending = deque()
+        self._chunk = memoryview(b'')
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.bytes_read = 0
+
+    @property
+    def size(self) -> int:
+        return self._end
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast('B')
+        filled = 0
+        while filled < len(view):
+            if not self._chunk:
+                if not self._next_chunk():
+                    break
+            n = min(len(view) - filled, len(self._chunk))
+            view[filled:filled + n] = self._chunk[:n]
+            self._chunk = self._chunk[n:]
+            filled += n
+        self.bytes_read += filled
+        return filled
+
+    def close(self):
+        if not self.closed:
+            for future in self._pending:
+                future.cancel()
+            self._executor.shutdown(wait=True)
+            self._chunk = memoryview(b'')
+        super().close()
+
+    def prefetch(self):
+        """Start fetching the read-ahead window before the first read."""
+        while len(self._pending) < self._max_concurrency and self._next_offset < self._end:
+            length = min(self._part_size, self._end - self._next_offset)
+            self._pending.append(self._executor.submit(self._fetch, self._next_offset, length))
+            self._next_offset += length
+
+    def _next_chunk(self) -> bool:
+        self.prefetch()
+        if not self._pending:
+            return False
+        self._chunk = memoryview(self._pending.popleft().result())
+        return True
+
+    def _fetch(self, offset: int, length: int) -> bytes:
+        response = self._s3_client.get_object(Bucket=self._bucket, Key=self._key,
+                                              Range=f'bytes={offset}-{offset + length - 1}')
+        return response['Body'].read()
+
+
+class LocalReader(io.RawIOBase):
+    """A read-only stream over a byte range of a local file, the stand-in for :class:`S3Reader`."""
+
+    def __init__(self, path: str, start: int = 0, end: Optional[int] = None):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._end = os.fstat(self._file.fileno()).st_size if end is None else end
+        self._file.seek(start)
+        self._position = start
+        self.bytes_read = 0
+
+    @property
+    def size(self) -> int:
+        return self._end
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        view = memoryview(b).cast('B')[:max(0, self._end - self._position)]
+        n = self._file.readinto(view) or 0
+        self._position += n
+        self.bytes_read += n
+        return n
+
+    def prefetch(self):
+        pass
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+
+class ChainedReader(io.RawIOBase):
+    """One read-only stream over byte ranges ``(uri, start, end)`` of several objects, in order.
+
+    While a range is read, the read-ahead window of the next one is already being
+    fetched, so object boundaries do not stall the consumer. Memory is bounded by two
+    windows of ``part_size * max_concurrency`` bytes whatever the total size.
+    """
+
+    def __init__(self, ranges: List[Tuple[str, int, Optional[int]]],
+                 part_size: int = STREAM_PART_SIZE,
+                 max_concurrency: int = STREAM_MAX_CONCURRENCY):
+        super().__init__()
+        self._ranges = deque(ranges)
+        self._part_size = part_size
+        self._max_concurrency = max_concurrency
+        self._current = None
+        self._upcoming = None
+        self._started = False
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readers(self) -> Iterator[io.RawIOBase]:
+        """The stream of each range in turn; a reader is closed when the next one is taken."""
+        while self._advance():
+            yield self._current
+
+    def readinto(self, b) -> int:
+        if not self._started:
+            self._advance()
+        while self._current is not None:
+            n = self._current.readinto(b)
+            if n:
+                self.bytes_read += n
+                return n
+            self._advance()
+        return 0
+
+    def close(self):
+        if not self.closed:
+            for reader in (self._current, self._upcoming):
+                if reader is not None:
+                    reader.close()
+            self._current = self._upcoming = None
+        super().close()
+
+    def _advance(self) -> bool:
+        from pathway.runtime import metrics
+
+        if self._current is not None:
+            metrics.add_bytes(self._current.bytes_read)
+            self._current.close()
+        self._current = self._upcoming if self._started else self._open_next()
+        self._started = True
+        self._upcoming = self._open_next() if self._current is not None else None
+        if self._upcoming is not None:
+            self._upcoming.prefetch()
+        return self._current is not None
+
+    def _open_next(self) -> Optional[io.RawIOBase]:
+        if not self._ranges:
+            return None
+        uri, start, end = self._ranges.popleft()
+        return open_reader(uri, part_size=self._part_size, max_concurrency=self._max_concurrency,
+                           start=start, end=end)
+
+
+class LocalWriter(io.RawIOBase):
+    """A write-only stream to a local file, the stand-in for :class:`S3Writer`.
+
+    Like an S3 object, the file only appears once the stream is closed: the bytes go to a
+    temporary file next to it that is renamed into place, and leaving a ``with`` block on
+    an exception discards them.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._path = path
+        self._temporary_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        self._file = open(self._temporary_path, 'wb')
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        n = self._file.write(b)
+        self.bytes_written += n
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._file.close()
+            os.replace(self._temporary_path, self._path)
+        except BaseException:
+            self.abort()
+            raise
+        super().close()
+
+    def abort(self):
+        """Discard the written bytes without creating the file."""
+        self._file.close()
+        if os.path.exists(self._temporary_path):
+            os.remove(self._temporary_path)
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def local_path(uri: str) -> Optional[str]:
+    """The path behind a ``file://`` URI or a plain path, or None for an S3 URI."""
+    parsed = urlparse(uri)
+    if parsed.scheme == 'file':
+        return parsed.path
+    if parsed.scheme == '':
+        return uri
+    return None
+
+
+def open_reader(uri: str,
+                part_size: int = DEFAULT_PART_SIZE,
+                max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                start: int = 0,
+                end: Optional[int] = None) -> io.RawIOBase:
+    """Open an ``s3://`` URI, a ``file://`` URI or a local path for reading."""
+    path = local_path(uri)
+    if path is not None:
+        return LocalReader(path, start=start, end=end)
+    return S3Reader(uri, part_size=part_size, max_concurrency=max_concurrency, start=start, end=end)
+
+
+def open_writer(uri: str,
+                part_size: int = DEFAULT_PART_SIZE,
+                max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> io.RawIOBase:
+    """Open an ``s3://`` URI, a ``file://`` URI or a local path for writing."""
+    path = local_path(uri)
+    if path is not None:
+        return LocalWriter(path)
+    return S3Writer(uri, part_size=part_size, max_concurrency=max_concurrency)
+
+
+def read_bytes(uri: str) -> bytes:
+    with open_reader(uri) as reader:
+        return reader.read()
+
+
+def write_bytes(uri: str, data: bytes):
+    with open_writer(uri) as writer:
+        writer.write(data)
+
+
+class ObjectInfo(NamedTuple):
+    uri: str
+    size: int
+    modified: float
+    # the ETag of an S3 object, or the size and modification time of a local file
+    version: str
+
+
+def object_info(uri: str) -> Optional[ObjectInfo]:
+    """Size, modification time and version of an object, or None if it does not exist."""
+    path = local_path(uri)
+    if path is not None:
+        if not os.path.isfile(path):
+            return None
+        return _local_object_info(uri, path)
+
+    from botocore.exceptions import ClientError
+
+    bucket, key = parse_s3_url(uri)
+    try:
+        response = clients.client('s3').head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return ObjectInfo(uri, response['ContentLength'], response['LastModified'].timestamp(), response['ETag'])
+
+
+def list_objects(uri: str) -> List[ObjectInfo]:
+    """The object at ``uri``, or every object under it as a prefix or directory, sorted by URI."""
+    path = local_path(uri)
+    if path is not None:
+        if os.path.isfile(path):
+            return [_local_object_info(uri, path)]
+        objects = []
+        for directory, _, files in os.walk(path):
+            for name in files:
+                file_path = os.path.join(directory, name)
+                file_uri = file_path if uri == path else f'file://{file_path}'
+                objects.append(_local_object_info(file_uri, file_path))
+        return sorted(objects)
+
+    bucket, prefix = parse_s3_url(uri)
+    objects = []
+    for page in clients.client('s3').get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get('Contents', []):
+            info = ObjectInfo(f"s3://{bucket}/{item['Key']}", item['Size'],
+                              item['LastModified'].timestamp(), item['ETag'])
+            if item['Key'] == prefix:
+                return [info]
+            if key_in_directory(item['Key'], prefix):
+                objects.append(info)
+    return sorted(objects)
+
+
+def key_in_directory(key: str, prefix: str) -> bool:
+    """Whether ``key`` is under ``prefix`` as a directory, so ``data`` does not take in ``data-old/``."""
+    return not prefix or prefix.endswith('/') or key.startswith(f'{prefix}/')
+
+
+def delete_object(uri: str):
+    path = local_path(uri)
+    if path is not None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    bucket, key = parse_s3_url(uri)
+    clients.client('s3').delete_object(Bucket=bucket, Key=key)
+
+
+def _local_object_info(uri: str, path: str) -> ObjectInfo:
+    stat = os.stat(path)
+    return ObjectInfo(uri, stat.st_size, stat.st_mtime, f'{stat.st_size}-{stat.st_mtime_ns}')
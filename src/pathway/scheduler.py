@@ -0,0 +1,178 @@
+"""Submit chained processing jobs as soon as the jobs they depend on complete.
+
+A call that takes the result of another job, an ``_AsyncDataObject``, depends on that
+job. The scheduler holds such a job back until all of its upstream jobs have completed,
+and abandons it if one of them failed or was stopped. At most ``max_running`` scheduled
+jobs run at a time. When more are ready, the ones with the longest chain of jobs waiting
+on them go first, so the critical path of the graph is not held up by jobs that can wait,
+and the whole graph takes about as long as its longest chain.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+import heapq
+import itertools
+import threading
+
+from pathway.runtime.dataset import _AsyncDataObject
+
+# threads that launch jobs once their upstream jobs complete, off the monitor thread
+LAUNCH_WORKERS = 4
+
+
+class _Node:
+    def __init__(self, job, launch: Callable[[], None], abandon: Callable[[str], None], order: int):
+        self.job = job
+        self.launch = launch
+        self.abandon = abandon
+        self.order = order
+        # 'waiting', 'ready', 'running', 'abandoned', 'cancelled' or 'finished'
+        self.state = 'waiting'
+        self.waiting = 0
+        self.failed: List[str] = []
+        # the number of jobs in the longest chain that starts with this one
+        self.height = 1
+        self.upstream: List['_Node'] = []
+
+
+class DagScheduler:
+    def __init__(self, max_running: Optional[int] = None):
+        self._max_running = max_running
+        self._lock = threading.Lock()
+        # jobs that have not been launched yet, by name
+        self._pending: Dict[str, _Node] = {}
+        # (-height, order, node) of the jobs whose upstream jobs have completed
+        self._ready = []
+        self._running = 0
+        self._order = itertools.count()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def schedule(self, job, upstream: Iterable, launch: Callable[[], None], abandon: Callable[[str], None]):
+        """Call ``launch()`` to start ``job`` once every job in ``upstream`` has completed.
+
+        A job that can start right away is launched in the calling thread, and an exception
+        from ``launch`` is raised here. Otherwise ``launch`` runs on a scheduler thread
+        later. If an upstream job fails or is stopped, or a later ``launch`` raises,
+        ``abandon(reason)`` is called instead. Both must leave ``job`` calling its done
+        callbacks once it is finished.
+        """
+        upstream = list({upstream_job.job_name: upstream_job for upstream_job in upstream
+                         if not upstream_job.is_completed()}.values())
+        node = _Node(job, launch, abandon, next(self._order))
+        with self._lock:
+            start_now = not upstream and not self._ready and self._has_slot()
+            if start_now:
+                node.state = 'running'
+                self._running += 1
+            else:
+                self._pending[job.job_name] = node
+                node.waiting = len(upstream)
+                node.upstream = [self._pending[upstream_job.job_name] for upstream_job in upstream
+                                 if upstream_job.job_name in self._pending]
+                self._raise_heights(node)
+                if not upstream:
+                    node.state = 'ready'
+                    heapq.heappush(self._ready, (-node.height, node.order, node))
+
+        job.add_done_callback(lambda _: self._finished(node))
+        if start_now:
+            try:
+                launch()
+            except BaseException as e:
+                abandon(f"{job.job_name} could not be started: {e!r}")
+                raise
+            return
+        if not upstream:
+            self._dispatch_later()
+        for upstream_job in upstream:
+            upstream_job.add_done_callback(lambda finished: self._upstream_done(node, finished))
+
+    def cancel(self, job_name: str) -> bool:
+        """Drop a job that has not been launched yet. Returns False if it has been, or is not known."""
+        with self._lock:
+            node = self._pending.pop(job_name, None)
+            if node is None:
+                return False
+            node.state = 'cancelled'
+            return True
+
+    def _has_slot(self) -> bool:
+        return self._max_running is None or self._running < self._max_running
+
+    def _raise_heights(self, node: _Node):
+        # a new job lengthens the chains of the jobs it waits on, and of theirs in turn
+        stack = [node]
+        while stack:
+            child = stack.pop()
+            for parent in child.upstream:
+                if parent.height < child.height + 1:
+                    parent.height = child.height + 1
+                    if parent.state == 'ready':
+                        # the entry with the old height is skipped
+                        heapq.heappush(self._ready, (-parent.height, parent.order, parent))
+                    stack.append(parent)
+
+    def _upstream_done(self, node: _Node, finished):
+        completed = finished.is_completed()
+        with self._lock:
+            if not completed:
+                node.failed.append(finished.job_name)
+            node.waiting -= 1
+            if node.waiting or node.state != 'waiting':
+                return
+            abandoned = bool(node.failed)
+            if abandoned:
+                node.state = 'abandoned'
+                self._pending.pop(node.job.job_name, None)
+            else:
+                node.state = 'ready'
+                heapq.heappush(self._ready, (-node.height, node.order, node))
+
+        if abandoned:
+            node.abandon(f"{node.job.job_name} depends on jobs that did not complete: {node.failed}")
+        else:
+            self._dispatch_later()
+
+    def _finished(self, node: _Node):
+        with self._lock:
+            if node.state == 'running':
+                self._running -= 1
+            elif node.state in ('waiting', 'ready'):
+                # stopped before it was launched
+                self._pending.pop(node.job.job_name, None)
+            node.state = 'finished'
+        self._dispatch_later()
+
+    def _dispatch_later(self):
+        with self._lock:
+            if not self._ready or not self._has_slot():
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=LAUNCH_WORKERS, thread_name_prefix='pathway-scheduler')
+        self._executor.submit(self._dispatch)
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                node = None
+                while self._ready and self._has_slot():
+                    height, _, candidate = heapq.heappop(self._ready)
+                    if candidate.state == 'ready' and -height == candidate.height:
+                        node = candidate
+                        break
+                if node is None:
+                    return
+                node.state = 'running'
+                self._running += 1
+                self._pending.pop(node.job.job_name, None)
+            try:
+                node.launch()
+            except Exception as e:
+                node.abandon(f"{node.job.job_name} could not be started: {e!r}")
+
+
+def upstream_jobs(calls: Iterable[Dict]) -> list:
+    """The jobs whose results are passed to any of ``calls``, each a dict of arguments."""
+    jobs = {id(value._job): value._job for arguments in calls
+            for value in arguments.values() if isinstance(value, _AsyncDataObject)}
+    return list(jobs.values())
@@ -1,14 +1,35 @@
 import contextlib
+import hashlib
+import inspect
+import io
 import os.path
+import types
+import warnings
 
-import cloudpickle
 import shutil
 import subprocess
 import shlex
 import tempfile
+import threading
 import time
 
-from typing import Callable
+from pathway.runtime.compression import compress_bytes
+from typing import Callable, Dict, Optional, Tuple
+
+# captured objects at least this large are stored apart from the pickled function
+EXTERNALIZE_THRESHOLD = int(os.environ.get('PATHWAY_EXTERNALIZE_THRESHOLD', 1024 * 1024))
+# more than the header, dtype and shape a serialized object adds to its data
+_SERIALIZED_OVERHEAD = 4096
+# a pickled function larger than this is reported
+LARGE_PAYLOAD_THRESHOLD = int(os.environ.get('PATHWAY_LARGE_PAYLOAD_THRESHOLD', 16 * 1024 * 1024))
+BLOB_DIRECTORY = 'blobs'
+# the persistent id of an object stored apart, resolved by the runtime when it unpickles the function
+BLOB_PERSISTENT_ID = 'pathway-blob'
+
+# (bucket, key) of payloads known to exist in S3
+_uploaded_objects = set()
+# (bucket, path, size, modification time) of environment definitions -> their S3 URI
+_uploaded_environments = {}
 
 
 class Timer:
@@ -27,23 +48,170 @@ class Timer:
         print(f"{self._name}: {stop - self._start} s")
 
 
-def pickle_func(func: Callable, session, bucket: str, s3_key_prefix: str):
+def pickle_func(func: Callable, s3_client, bucket: str, s3_key_prefix: str = 'code', pickled: Tuple = None):
     """
-    Package source files and upload a compress tar file to S3.
+    Pickle a function and upload it to S3 under a content-addressed key.
+
+    The payload is stored as ``{s3_key_prefix}/<sha256>.pkl``, so submitting the same
+    function again skips the upload (existence check on the key). The function is pickled
+    on every call, with the current values of the globals and closure it captures; pass
+    ``pickled``, the result of :func:`_pickle_func`, to upload a pickle taken earlier. The
+    digest is taken before compression, so the key does not depend on the codec chosen for
+    the payload.
+
+    Captured objects of at least :data:`EXTERNALIZE_THRESHOLD` bytes are stored apart, as
+    ``{s3_key_prefix}/blobs/<sha256>.pkl``, and uploaded once whatever function captures them.
     """
+    pickled, digest, blobs = pickled or _pickle_func(func)
 
-    pickled = cloudpickle.dumps(func)
+    for blob_digest, data in blobs.items():
+        _upload_once(s3_client, bucket, f'{s3_key_prefix}/{BLOB_DIRECTORY}/{blob_digest}.pkl', data)
+    object_key = f'{s3_key_prefix}/{digest}.pkl'
+    _upload_once(s3_client, bucket, object_key, pickled)
 
-    s3_resource = session.resource("s3", region_name=session.region_name)
-    s3_resource.Object(bucket, f'{s3_key_prefix}/func.pkl').put(Body=pickled)
+    return f's3://{bucket}/{object_key}'
+
+
+def pickle_func_to_directory(func: Callable, directory: str, prefix: str = 'code', pickled: Tuple = None):
+    """Like :func:`pickle_func`, but store the payload in a local directory and return its ``file://`` URI."""
+    pickled, digest, blobs = pickled or _pickle_func(func)
+
+    code_directory = os.path.join(os.path.abspath(directory), prefix)
+    for blob_digest, data in blobs.items():
+        _write_once(os.path.join(code_directory, BLOB_DIRECTORY, f'{blob_digest}.pkl'), data)
+    path = os.path.join(code_directory, f'{digest}.pkl')
+    _write_once(path, pickled)
+
+    return f'file://{path}'
+
+
+def code_blob_uri(code_uri: str, digest: str) -> str:
+    """The URI of a captured object stored apart from the function at ``code_uri``."""
+    return f"{code_uri.rsplit('/', 1)[0]}/{BLOB_DIRECTORY}/{digest}.pkl"
 
-    return f's3://{bucket}/{s3_key_prefix}/func.pkl'
+
+def _upload_once(s3_client, bucket: str, object_key: str, data: bytes):
+    if (bucket, object_key) not in _uploaded_objects:
+        if not _s3_object_exists(s3_client, bucket, object_key):
+            s3_client.put_object(Bucket=bucket, Key=object_key, Body=compress_bytes(data))
+        _uploaded_objects.add((bucket, object_key))
+
+
+def _write_once(path: str, data: bytes):
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique per thread, as jobs are submitted from several threads
+        temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary_path, 'wb') as file:
+            file.write(data)
+        os.replace(temporary_path, path)
+
+
+def _pickle_func(func: Callable) -> Tuple[bytes, str, Dict[str, bytes]]:
+    """(pickled bytes, sha256 digest, externalized objects by digest) of a function.
+
+    Nothing is reused from an earlier call, as the values the function captures may have
+    changed since.
+    """
+    import cloudpickle
+    from pathway.runtime import serializers
+
+    candidates = _large_captured_objects(func)
+    used = {}
+
+    class Pickler(cloudpickle.Pickler):
+        def persistent_id(self, obj):
+            pid = serializers.set_persistent_id(obj)
+            if pid is not None:
+                # the members in a fixed order, so the digest is the same in every process
+                return pid
+            candidate = candidates.get(id(obj))
+            if candidate is None:
+                return None
+            digest, data = candidate
+            used[digest] = data
+            return BLOB_PERSISTENT_ID, digest
+
+    buffer = io.BytesIO()
+    Pickler(buffer).dump(func)
+    pickled = buffer.getvalue()
+    if len(pickled) > LARGE_PAYLOAD_THRESHOLD:
+        warnings.warn(f"{getattr(func, '__name__', func)} pickles to {len(pickled)} bytes; it may capture "
+                      f"large objects that cannot be stored apart. Pass them as arguments instead.")
+    return pickled, hashlib.sha256(pickled).hexdigest(), used
+
+
+def _large_captured_objects(func: Callable) -> Dict[int, Tuple[str, bytes]]:
+    """The objects a function refers to through its closure and globals that are too large to embed.
+
+    Only the values the function names directly are considered: an object inside one of
+    them, or captured by another function it calls, is embedded whatever its size. Values
+    whose size is known to be small are skipped without serializing them.
+
+    Returns (sha256 digest, serialized bytes) by object id.
+    """
+    from pathway.runtime import serializers
+
+    try:
+        captured = inspect.getclosurevars(func)
+    except (TypeError, ValueError):
+        return {}
+
+    large = {}
+    for value in list(captured.nonlocals.values()) + list(captured.globals.values()):
+        # code is pickled with the function, by reference or by value
+        if id(value) in large or isinstance(value, (types.ModuleType, type, types.FunctionType,
+                                                    types.BuiltinFunctionType, types.MethodType)):
+            continue
+        size = _size_bound(value)
+        if size is not None and size + _SERIALIZED_OVERHEAD < EXTERNALIZE_THRESHOLD:
+            continue
+        buffer = io.BytesIO()
+        try:
+            serializers.dump(value, buffer)
+        except Exception:
+            continue
+        if buffer.tell() >= EXTERNALIZE_THRESHOLD:
+            data = buffer.getvalue()
+            large[id(value)] = (hashlib.sha256(data).hexdigest(), data)
+    return large
+
+
+def _size_bound(value) -> Optional[int]:
+    """At most the size of the serialized data of ``value``, where that is cheap to tell, or None."""
+    if value is None or isinstance(value, (bool, int, float, complex)):
+        return 0
+    if isinstance(value, str):
+        # encoded as UTF-8
+        return 4 * len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, memoryview):
+        return value.nbytes
+    # numpy arrays and pandas series, unless they hold Python objects
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int) and getattr(getattr(value, 'dtype', None), 'hasobject', True) is False:
+        return nbytes
+    return None
+
+
+def _s3_object_exists(s3_client, bucket: str, object_key: str) -> bool:
+    from botocore.exceptions import ClientError
+
+    try:
+        s3_client.head_object(Bucket=bucket, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+    return True
 
 
 def pickle_object(func: Callable, session, bucket: str, s3_key_prefix: str):
     """
     Package source files and upload a compress tar file to S3.
     """
+    import cloudpickle
 
     pickled = cloudpickle.dumps(func)
 
@@ -57,6 +225,7 @@ def unpickle_object(func: Callable, session, bucket: str, s3_key_prefix: str):
     """
     Package source files and upload a compress tar file to S3.
     """
+    import cloudpickle
 
     pickled = cloudpickle.dumps(func)
 
@@ -66,13 +235,31 @@ def unpickle_object(func: Callable, session, bucket: str, s3_key_prefix: str):
     return f's3://{bucket}/{s3_key_prefix}/func.pkl'
 
 
-def upload_code_package(source: str, session, bucket: str, s3_key_prefix: str):
+def upload_environment_definition(path: str, s3_client, bucket: str, s3_key_prefix: str = 'env') -> str:
+    """Upload an environment definition once per content, as ``{s3_key_prefix}/<sha256>/<file name>``.
+
+    The upload is skipped while the file keeps its size and modification time, and when
+    an object with the same content is already in the bucket.
+    """
+    stat = os.stat(path)
+    cache_key = (bucket, os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    location = _uploaded_environments.get(cache_key)
+    if location is None:
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        object_key = f'{s3_key_prefix}/{digest}/{os.path.basename(path)}'
+        if not _s3_object_exists(s3_client, bucket, object_key):
+            s3_client.upload_file(Filename=path, Bucket=bucket, Key=object_key)
+        location = _uploaded_environments[cache_key] = f's3://{bucket}/{object_key}'
+    return location
+
+
+def upload_code_package(source: str, s3_client, bucket: str, s3_key_prefix: str):
     """
     Package source files and upload a compress tar file to S3.
     """
     base_name = os.path.basename(source)
-    s3_resource = session.resource("s3", region_name=session.region_name)
-    s3_resource.Bucket(bucket).upload_file(Key=f'{s3_key_prefix}/{base_name}', Filename=source)
+    s3_client.upload_file(Filename=source, Bucket=bucket, Key=f'{s3_key_prefix}/{base_name}')
 
     return f's3://{bucket}/{s3_key_prefix}/{base_name}'
 
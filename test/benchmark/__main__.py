@@ -0,0 +1,55 @@
+"""Run the benchmarks offline against an in-memory S3 stand-in.
+
+    python -m test.benchmark --output after.json
+    python -m test.benchmark --output after.json --compare before.json --threshold 0.2
+
+The benchmarks cover serialization round trips of NumPy, pandas and nested dict payloads
+at several sizes, S3 upload and download throughput, argument reconstruction, the
+startup of ``processing_script`` and the client-side cost of a submission. Results are
+saved as JSON. With ``--compare``, the run exits with status 1 if any benchmark is
+slower than the baseline by more than the threshold.
+"""
+from unittest.mock import patch
+
+import argparse
+import sys
+
+from . import benchmarks  # noqa: F401 registers the suites
+from test.fake_s3 import FakeS3Client
+from .harness import compare, load, run, save
+
+DEFAULT_SIZES = (2 ** 20, 16 * 2 ** 20, 64 * 2 ** 20)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m test.benchmark', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help="where to save the results as JSON")
+    parser.add_argument('--compare', help="the results of an earlier run to compare with")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="the slowdown over the baseline reported as a regression (default 0.2, 20%%)")
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')],
+                        default=list(DEFAULT_SIZES), help="comma-separated payload sizes in bytes")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds added to every request to the S3 stand-in")
+    parser.add_argument('--filter', help="only run the benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    s3_client = FakeS3Client(latency=args.latency)
+    with patch('pathway.runtime.clients.client', return_value=s3_client):
+        document = run(args.sizes, args.repeat, s3_client, pattern=args.filter)
+    document['environment'].update(sizes=args.sizes, repeat=args.repeat, latency=args.latency)
+
+    if args.output:
+        save(document, args.output)
+    if args.compare:
+        regressions = compare(load(args.compare), document, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
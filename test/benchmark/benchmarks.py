@@ -0,0 +1,155 @@
+from typing import Iterator, List
+
+import contextlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from pathway import util
+from pathway.runtime import serializers
+from pathway.runtime.dataset import DataObject, Input, Output, _PickleDataLoader
+from pathway.runtime.process_entry_point import processing_script
+from pathway.runtime.transfer import S3Reader, S3Writer
+from .harness import Case, suite
+
+BUCKET = 'benchmark'
+
+
+def numpy_payload(size: int):
+    return np.random.default_rng(0).random(size // 8)
+
+
+def pandas_payload(size: int):
+    # about 40 bytes a row
+    rows = max(1, size // 40)
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'value': rng.random(rows),
+                         'count': rng.integers(0, 1000, rows),
+                         'label': pd.Categorical(rng.choice(['a', 'b', 'c'], rows)),
+                         'name': [f'item-{i % 1000}' for i in range(rows)]})
+
+
+def dict_payload(size: int):
+    # about 400 bytes a record
+    return {f'record-{i}': {'values': list(range(10)), 'weights': [0.5] * 10, 'name': f'name-{i}',
+                            'nested': {'flag': i % 2 == 0, 'tags': ['x', 'y']}}
+            for i in range(max(1, size // 400))}
+
+
+PAYLOADS = {'numpy': numpy_payload, 'pandas': pandas_payload, 'dict': dict_payload}
+
+
+def _size_name(size: int) -> str:
+    return f'{size // 2 ** 20}MiB' if size >= 2 ** 20 else f'{size // 2 ** 10}KiB'
+
+
+@suite
+def serialization(sizes: List[int], s3_client) -> Iterator[Case]:
+    for kind, make in PAYLOADS.items():
+        for size in sizes:
+            data = make(size)
+            buffer = io.BytesIO()
+            serializers.dump(data, buffer)
+            nbytes = buffer.tell()
+
+            def round_trip(data=data):
+                stream = io.BytesIO()
+                serializers.dump(data, stream)
+                stream.seek(0)
+                serializers.load(stream)
+
+            def through_s3(data=data, key=f'{kind}-{size}.pkl'):
+                _PickleDataLoader.save_to_s3(data, f's3://{BUCKET}/{key}')
+                _PickleDataLoader.load_from_s3(f's3://{BUCKET}/{key}')
+
+            yield Case(f'serialization/{kind}/{_size_name(size)}', round_trip, nbytes)
+            yield Case(f'loader/{kind}/{_size_name(size)}', through_s3, nbytes)
+
+
+@suite
+def transfer(sizes: List[int], s3_client) -> Iterator[Case]:
+    for size in sizes:
+        payload = os.urandom(size)
+        key = f'transfer-{size}'
+
+        def upload(payload=payload, key=key):
+            with S3Writer(f's3://{BUCKET}/{key}', s3_client=s3_client) as writer:
+                writer.write(payload)
+
+        def download(key=key):
+            with S3Reader(f's3://{BUCKET}/{key}', s3_client=s3_client) as reader:
+                reader.read()
+
+        yield Case(f'transfer/upload/{_size_name(size)}', upload, size)
+        yield Case(f'transfer/download/{_size_name(size)}', download, size, setup=upload)
+
+
+@suite
+def runtime(sizes: List[int], s3_client) -> Iterator[Case]:
+    scratch = tempfile.mkdtemp(prefix='pathway-benchmark-')
+    weights = numpy_payload(sizes[0])
+
+    def func(x: DataObject, y: DataObject, data: Input, output: Output, count: int, rate: float, name: str,
+             enabled: bool) -> DataObject:
+        return weights[:count] * rate
+
+    def clear_caches():
+        util._uploaded_objects.clear()
+
+    def pickle():
+        util.pickle_func(func, s3_client, BUCKET)
+
+    yield Case('runtime/pickle_func', pickle, setup=clear_caches)
+
+    code = util.pickle_func(func, s3_client, BUCKET)
+    with contextlib.redirect_stdout(io.StringIO()):
+        _PickleDataLoader.save_to_s3(numpy_payload(sizes[0]), f's3://{BUCKET}/arguments/x.pkl')
+        _PickleDataLoader.save_to_s3(dict_payload(sizes[0]), f's3://{BUCKET}/arguments/y.pkl')
+    arguments = ['--func-code', code,
+                 '--x', f's3://{BUCKET}/arguments/x.pkl', '--y', f's3://{BUCKET}/arguments/y.pkl',
+                 '--data', f's3://{BUCKET}/data/', '--output', f's3://{BUCKET}/output/',
+                 '--count', '10', '--rate', '0.5', '--name', 'benchmark', '--enabled', 'True',
+                 '--return', f'file://{scratch}/return.pkl']
+
+    def start(arguments=arguments):
+        processing_script(arguments)
+
+    def noop():
+        return None
+
+    yield Case('runtime/arguments', start)
+    yield Case('runtime/arguments_prefetched', lambda: start(arguments + ['--pathway-prefetch', 'x,y']))
+
+    noop_code = util.pickle_func(noop, s3_client, BUCKET)
+    yield Case('runtime/startup', lambda: processing_script(['--func-code', noop_code]))
+
+
+@suite
+def client(sizes: List[int], s3_client) -> Iterator[Case]:
+    from unittest.mock import Mock, patch
+
+    from pathway import invoke
+    from pathway.decorators import processing_job
+    from pathway.invoke import ProcessingJob
+
+    session = Mock()
+    session.default_bucket.return_value = BUCKET
+
+    @processing_job(image_uri='image', instance_type='ml.m5.large')
+    def func(data: DataObject, rate: float, name: str) -> DataObject:
+        return data * rate
+
+    data = numpy_payload(2 ** 10)
+
+    def forget():
+        invoke._plans.clear()
+        util._uploaded_objects.clear()
+
+    # the SageMaker API calls are left out; the rest is the client-side cost of a submission
+    with patch('sagemaker.processing.Processor'), patch('pathway.invoke.get_sagemaker_session', return_value=session), \
+            patch.object(ProcessingJob, 'monitor'):
+        yield Case('client/first_submit', lambda: func(data, 0.5, 'first'), setup=forget)
+        yield Case('client/submit', lambda: func(data, 0.5, 'again'))
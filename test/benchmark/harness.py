@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+@dataclass
+class Case:
+    """One measurement: ``run()`` is timed ``repeat`` times after ``setup()``, if any, before each run."""
+    name: str
+    run: Callable[[], None]
+    nbytes: int = 0
+    setup: Optional[Callable[[], None]] = None
+
+
+_suites: List[Callable[..., Iterator[Case]]] = []
+
+
+def suite(func: Callable[..., Iterator[Case]]) -> Callable[..., Iterator[Case]]:
+    """Register a generator of cases; it is called with the payload sizes and the S3 client."""
+    _suites.append(func)
+    return func
+
+
+def run(sizes: List[int], repeat: int, s3_client, pattern: Optional[str] = None) -> Dict:
+    results = {}
+    for make_cases in _suites:
+        for case in make_cases(sizes, s3_client):
+            if pattern and pattern not in case.name:
+                continue
+            durations = []
+            for _ in range(repeat):
+                if case.setup is not None:
+                    case.setup()
+                # the runtime reports every step on stdout
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    case.run()
+                    durations.append(time.perf_counter() - start)
+            result = {'min': min(durations), 'median': statistics.median(durations), 'runs': durations}
+            if case.nbytes:
+                result['bytes'] = case.nbytes
+                result['throughput'] = case.nbytes / result['min']
+            results[case.name] = result
+            print(_format(case.name, result), flush=True)
+    return {'environment': _environment(), 'results': results}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """The names of the cases that got slower than the baseline by more than ``threshold`` (0.2 is 20%)."""
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['min'] / before['min']
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print(f"{name:<48} {before['min'] * 1e3:10.2f} ms {result['min'] * 1e3:10.2f} ms {ratio:6.2f}x {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def save(document: Dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(document, file, indent=1)
+
+
+def load(path: str) -> Dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def _format(name: str, result: Dict) -> str:
+    line = f"{name:<48} {result['min'] * 1e3:10.2f} ms (median {result['median'] * 1e3:.2f} ms)"
+    if 'throughput' in result:
+        line += f" {result['throughput'] / 2 ** 20:10.1f} MiB/s"
+    return line
+
+
+def _environment() -> Dict:
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'revision': revision, 'time': time.time()}
@@ -0,0 +1,90 @@
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class FakeS3Client:
+    """An in-memory stand-in for the subset of the S3 client API used by pathway.
+
+    ``objects`` maps ``(bucket, key)`` to bytes, and ``calls`` lists the name of every
+    request. ``latency`` seconds are added to every request, to show how well transfers
+    overlap requests the way they would against S3.
+    """
+
+    def __init__(self, objects=None, latency: float = 0.0):
+        self.objects = dict(objects or {})
+        self.uploads = {}
+        self.calls = []
+        self._latency = latency
+        self._lock = threading.Lock()
+
+    def _request(self, name):
+        with self._lock:
+            self.calls.append(name)
+        if self._latency:
+            time.sleep(self._latency)
+
+    def put_object(self, Bucket, Key, Body):
+        self._request('put_object')
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key):
+        self._request('create_multipart_upload')
+        with self._lock:
+            upload_id = f'upload-{len(self.uploads)}-{Key}'
+            self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._request('upload_part')
+        with self._lock:
+            self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._request('complete_multipart_upload')
+        with self._lock:
+            parts = self.uploads.pop(UploadId)
+            self.objects[(Bucket, Key)] = b''.join(parts[p['PartNumber']] for p in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._request('abort_multipart_upload')
+        with self._lock:
+            self.uploads.pop(UploadId, None)
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+
+        self._request('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return self._summary(Bucket, Key, ContentLength=len(self.objects[(Bucket, Key)]))
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._request('get_object')
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+        return {'Body': io.BytesIO(data)}
+
+    def get_paginator(self, operation_name):
+        return _ListObjectsPaginator(self)
+
+    def _summary(self, bucket, key, **fields):
+        return dict(fields, ETag=f'"{hash(self.objects[(bucket, key)])}"', LastModified=datetime.now(timezone.utc))
+
+
+class _ListObjectsPaginator:
+    """``list_objects_v2`` as a single page."""
+
+    def __init__(self, client: FakeS3Client):
+        self._client = client
+
+    def paginate(self, Bucket, Prefix=''):
+        self._client._request('list_objects_v2')
+        keys = sorted(key for bucket, key in self._client.objects if bucket == Bucket and key.startswith(Prefix))
+        return [{'Contents': [self._client._summary(Bucket, key, Key=key, Size=len(self._client.objects[(Bucket, key)]))
+                              for key in keys]}]
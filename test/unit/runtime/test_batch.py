@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from pathway.runtime import batch
+from pathway.runtime.dataset import AbstractDataObject, _PickleDataLoader
+
+
+def _double(x):
+    if x < 0:
+        raise ValueError("negative")
+    return 2 * x
+
+
+class _Loaded(AbstractDataObject):
+    def __init__(self, value):
+        self.value = value
+        self.loaded_by = []
+
+    def get(self):
+        self.loaded_by.append(os.getpid())
+        return self.value
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.uri = 'file://' + os.path.join(self.directory.name, 'results' + batch.BATCH_SUFFIX)
+
+    def test_split_item_uri(self):
+        self.assertEqual(('s3://b/k/results.batch', 12), batch.split_item_uri('s3://b/k/results.batch#12'))
+        self.assertIsNone(batch.split_item_uri('s3://b/k/return.pkl'))
+        self.assertIsNone(batch.split_item_uri('s3://b/k/results.batch'))
+
+    def test_round_trip(self):
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                batch.run_batch(_double, [{'x': i} for i in range(5)], self.uri, max_workers=workers)
+                batch._indexes.clear()
+
+                self.assertEqual(5, len(batch.read_index(self.uri)))
+                self.assertEqual([0, 2, 4, 6, 8], [batch.load_item(self.uri, i) for i in range(5)])
+                self.assertEqual(6, _PickleDataLoader.load_from_s3(batch.item_uri(self.uri, 3)))
+
+    def test_arguments_loaded_before_fork(self):
+        arguments = [_Loaded(i) for i in range(4)]
+
+        batch.run_batch(_double, [{'x': argument} for argument in arguments], self.uri, max_workers=2)
+
+        self.assertEqual([[os.getpid()]] * 4, [argument.loaded_by for argument in arguments])
+        self.assertEqual([0, 2, 4, 6], [batch.load_item(self.uri, i) for i in range(4)])
+
+    def test_failed_item(self):
+        batch.run_batch(_double, [{'x': 1}, {'x': -1}], self.uri, max_workers=1)
+
+        self.assertEqual(2, batch.load_item(self.uri, 0))
+        with self.assertRaisesRegex(RuntimeError, 'negative'):
+            batch.load_item(self.uri, 1)
+
+    def test_not_a_batch(self):
+        with open(self.uri[len('file://'):], 'wb') as file:
+            file.write(b'\0' * 64)
+
+        with self.assertRaises(ValueError):
+            batch.read_index(self.uri)
+
+
+if __name__ == '__main__':
+    unittest.main()
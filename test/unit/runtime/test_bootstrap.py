@@ -1,8 +1,15 @@
+import io
+import os
+import tempfile
 import unittest
-from unittest.mock import patch
-from pathway.runtime.bootstrap import bootstrap
+from unittest.mock import Mock, patch
 
+from botocore.exceptions import ClientError
 
+from pathway.runtime.bootstrap import bootstrap, _restore_snapshot, _save_snapshot, _snapshot_key
+
+
+@patch.dict(os.environ, {'PATHWAY_ENV_SNAPSHOT': '0'})
 class BootstrapTestCase(unittest.TestCase):
     @patch('pathway.runtime.bootstrap._download_env_definition')
     @patch('pathway.runtime.bootstrap._conda_update')
@@ -19,5 +26,109 @@ class BootstrapTestCase(unittest.TestCase):
         mock_conda_update.assert_called_with('env.yml')
 
 
+@patch('pathway.runtime.bootstrap._download_env_definition')
+@patch('pathway.runtime.bootstrap._snapshot_key', return_value='abc')
+@patch('pathway.runtime.bootstrap._save_snapshot')
+@patch('pathway.runtime.bootstrap._conda_update')
+class BootstrapSnapshotTestCase(unittest.TestCase):
+    @patch('pathway.runtime.bootstrap._restore_snapshot', return_value=True)
+    def test_cache_hit_skips_install(self, mock_restore, mock_conda_update, mock_save, mock_key, mock_download):
+        bootstrap('s3://my-bucket/job/env.yml')
+        mock_restore.assert_called_once_with('my-bucket', 'abc')
+        mock_conda_update.assert_not_called()
+        mock_save.assert_not_called()
+
+    @patch('pathway.runtime.bootstrap._restore_snapshot', return_value=False)
+    def test_cache_miss_builds_snapshot(self, mock_restore, mock_conda_update, mock_save, mock_key, mock_download):
+        bootstrap('s3://my-bucket/job/env.yml')
+        mock_conda_update.assert_called_once_with('env.yml')
+        mock_save.assert_called_once_with('my-bucket', 'abc')
+
+
+class RestoreSnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = patch('pathway.runtime.bootstrap.SNAPSHOT_CACHE_DIR', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.directory = directory.name
+
+    def _client(self, error_code):
+        def download_file(bucket, key, path):
+            with open(path, 'wb') as file:
+                file.write(b'partial')
+            raise ClientError({'Error': {'Code': error_code}}, 'GetObject')
+
+        client = Mock()
+        client.download_file.side_effect = download_file
+        return client
+
+    @patch('pathway.runtime.bootstrap._unpack')
+    def test_miss_is_not_reported_as_hit(self, mock_unpack):
+        with patch('pathway.runtime.clients.client', return_value=self._client('404')), \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.assertFalse(_restore_snapshot('bucket', 'abc'))
+
+        self.assertNotIn('cache hit', stdout.getvalue())
+        self.assertIn('cache miss', stdout.getvalue())
+        self.assertEqual([], os.listdir(self.directory))
+        mock_unpack.assert_not_called()
+
+    @patch('pathway.runtime.bootstrap._unpack')
+    def test_failed_download_leaves_no_local_copy(self, mock_unpack):
+        with patch('pathway.runtime.clients.client', return_value=self._client('500')):
+            with self.assertRaises(ClientError):
+                _restore_snapshot('bucket', 'abc')
+
+        self.assertEqual([], os.listdir(self.directory))
+
+
+class SnapshotKeyTestCase(unittest.TestCase):
+    def test_image_is_part_of_the_key(self):
+        with tempfile.TemporaryDirectory() as directory:
+            definition = os.path.join(directory, 'requirements.txt')
+            with open(definition, 'w') as file:
+                file.write('numpy\n')
+
+            with patch('pathway.runtime.bootstrap._image_identity', return_value=b'numpy==1.0'):
+                key = _snapshot_key(definition)
+                self.assertEqual(key, _snapshot_key(definition))
+            with patch('pathway.runtime.bootstrap._image_identity', return_value=b'numpy==2.0'):
+                self.assertNotEqual(key, _snapshot_key(definition))
+
+
+class SaveSnapshotTestCase(unittest.TestCase):
+    @patch('pathway.runtime.bootstrap._snapshot_marker')
+    def test_failed_upload_does_not_fail_the_job(self, mock_marker):
+        client = Mock()
+        client.upload_file.side_effect = ClientError({'Error': {'Code': '403'}}, 'PutObject')
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('pathway.runtime.bootstrap.SNAPSHOT_CACHE_DIR', directory), \
+                patch('pathway.runtime.bootstrap.check_output'), \
+                patch('pathway.runtime.clients.client', return_value=client), \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            mock_marker.return_value = os.path.join(directory, 'marker')
+            _save_snapshot('bucket', 'abc')
+
+        self.assertIn('not saved', stdout.getvalue())
+
+    @patch('pathway.runtime.bootstrap._snapshot_marker')
+    def test_failed_pack_leaves_no_local_copy(self, mock_marker):
+        def pack(command):
+            with open(command.split()[2], 'wb') as file:
+                file.write(b'partial')
+            raise RuntimeError('disk full')
+
+        with tempfile.TemporaryDirectory() as directory, \
+                patch('pathway.runtime.bootstrap.SNAPSHOT_CACHE_DIR', directory), \
+                patch('pathway.runtime.bootstrap.check_output', side_effect=pack), \
+                patch('sys.stdout', new_callable=io.StringIO):
+            mock_marker.return_value = os.path.join(directory, 'marker')
+            _save_snapshot('bucket', 'abc')
+
+            self.assertEqual(['marker'], os.listdir(directory))
+
+
 if __name__ == '__main__':
     unittest.main()
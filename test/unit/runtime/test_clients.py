@@ -0,0 +1,24 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from pathway.runtime import clients
+
+
+class ClientsTestCase(unittest.TestCase):
+    def test_client_shared_across_threads(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            created = list(executor.map(lambda _: clients.client('s3', 'us-east-1'), range(32)))
+
+        self.assertTrue(all(client is created[0] for client in created))
+
+    def test_client_per_region(self):
+        self.assertIsNot(clients.client('s3', 'us-east-1'), clients.client('s3', 'us-west-2'))
+        self.assertIs(clients.boto_session('us-west-2'), clients.boto_session('us-west-2'))
+
+    def test_connection_pool_size(self):
+        client = clients.client('s3', 'us-east-1')
+        self.assertEqual(client.meta.config.max_pool_connections, clients.MAX_POOL_CONNECTIONS)
+
+
+if __name__ == '__main__':
+    unittest.main()
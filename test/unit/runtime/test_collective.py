@@ -0,0 +1,100 @@
+import multiprocessing
+import socket
+import threading
+import time
+import unittest
+
+from pathway.runtime.collective import Communicator, _RANK
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _free_ports(count):
+    sockets = [socket.socket() for _ in range(count)]
+    for s in sockets:
+        s.bind(('127.0.0.1', 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def _run_rank(rank, addresses, results):
+    with Communicator(rank, addresses, timeout=30) as communicator:
+        communicator.barrier()
+        config = communicator.broadcast({'seed': 42} if rank == 0 else None)
+        gathered = communicator.gather(rank * 10)
+        total = communicator.reduce(rank + 1)
+        everywhere = communicator.allreduce([rank])
+        array_sum = None
+        if numpy is not None:
+            array_sum = communicator.allreduce(numpy.full(1000, rank, dtype='int64')).sum()
+        results[rank] = (config, gathered, total, everywhere, array_sum)
+
+
+class CommunicatorTestCase(unittest.TestCase):
+    def test_collectives_across_processes(self):
+        size = 5
+        addresses = [('127.0.0.1', port) for port in _free_ports(size)]
+        with multiprocessing.Manager() as manager:
+            results = manager.dict()
+            processes = [multiprocessing.Process(target=_run_rank, args=(rank, addresses, results))
+                         for rank in range(size)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(timeout=60)
+                self.assertEqual(process.exitcode, 0)
+            results = dict(results)
+
+        for rank in range(size):
+            config, gathered, total, everywhere, array_sum = results[rank]
+            self.assertEqual(config, {'seed': 42})
+            self.assertEqual(gathered, [0, 10, 20, 30, 40] if rank == 0 else None)
+            self.assertEqual(total, 15 if rank == 0 else None)
+            self.assertEqual(sorted(everywhere), [0, 1, 2, 3, 4])
+            if numpy is not None:
+                self.assertEqual(array_sum, 10 * 1000)
+
+    def test_single_rank(self):
+        with Communicator(0, [('127.0.0.1', _free_ports(1)[0])]) as communicator:
+            communicator.barrier()
+            self.assertEqual(communicator.broadcast('x'), 'x')
+            self.assertEqual(communicator.gather(1), [1])
+            self.assertEqual(communicator.reduce(3), 3)
+
+    def test_connection_from_outside_the_cluster_rejected(self):
+        addresses = [('127.0.0.1', port) for port in _free_ports(2)]
+        communicators = {}
+        root = threading.Thread(target=lambda: communicators.update(root=Communicator(0, addresses, timeout=30)))
+        root.start()
+
+        stranger = socket.socket()
+        stranger.bind(('127.0.0.2', 0))
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                stranger.connect(addresses[0])
+                break
+            except ConnectionRefusedError:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+        try:
+            stranger.sendall(_RANK.pack(1))
+            self.assertEqual(b'', stranger.recv(1))
+        except ConnectionResetError:
+            pass
+        stranger.close()
+
+        with Communicator(1, addresses, timeout=30) as child:
+            root.join(timeout=30)
+            with communicators['root'] as parent:
+                self.assertEqual(parent.broadcast('x'), 'x')
+                self.assertEqual(child.broadcast(), 'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import os
+import unittest
+from unittest.mock import patch
+
+from pathway.runtime import compression
+from pathway.runtime.compression import CompressingWriter, open_decompressed, compress_bytes, decompress_bytes
+from pathway.runtime.dataset import _PickleDataLoader
+from pathway.util import tmpdir
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4
+except ImportError:
+    lz4 = None
+
+
+def _compressible(size):
+    return (b'feature,value\n' * (size // 14 + 1))[:size]
+
+
+class ChooseCodecTestCase(unittest.TestCase):
+    def test_small_payload_uncompressed(self):
+        self.assertIsNone(compression.choose_codec(b'a' * 100, complete=True))
+
+    def test_incompressible_payload_uncompressed(self):
+        self.assertIsNone(compression.choose_codec(os.urandom(1024 * 1024), complete=False))
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_compressible_payload(self):
+        self.assertEqual(compression.choose_codec(_compressible(1024 * 1024), complete=False), 'zstd')
+
+    def test_no_codec_installed(self):
+        with patch('pathway.runtime.compression.available_codecs', return_value=[]):
+            self.assertIsNone(compression.choose_codec(_compressible(1024 * 1024), complete=False))
+
+
+class CompressingWriterTestCase(unittest.TestCase):
+    def test_plain_payload_has_no_framing(self):
+        payload = os.urandom(1024 * 1024)
+        self.assertEqual(compress_bytes(payload), payload)
+        self.assertEqual(decompress_bytes(payload), payload)
+
+    @unittest.skipIf(zstandard is None or lz4 is None, "zstandard or lz4 is not installed")
+    def test_round_trip_in_chunks(self):
+        payload = _compressible(3 * 1024 * 1024 + 17)
+        for codec in ('zstd', 'lz4'):
+            with self.subTest(codec=codec):
+                file = io.BytesIO()
+                with CompressingWriter(file, codec=codec, chunk_size=256 * 1024, max_workers=3) as writer:
+                    for offset in range(0, len(payload), 100000):
+                        writer.write(payload[offset:offset + 100000])
+
+                self.assertLess(len(file.getvalue()), len(payload) // 5)
+                file.seek(0)
+                with open_decompressed(file, max_workers=3) as reader:
+                    self.assertEqual(reader.read(), payload)
+
+    @unittest.skipIf(zstandard is None, "zstandard is not installed")
+    def test_auto_compresses_large_payload(self):
+        payload = _compressible(1024 * 1024)
+        compressed = compress_bytes(payload)
+
+        self.assertTrue(compressed.startswith(compression.MAGIC))
+        self.assertEqual(decompress_bytes(compressed), payload)
+
+
+@unittest.skipIf(zstandard is None, "zstandard is not installed")
+class SaveCompressionTestCase(unittest.TestCase):
+    def test_local_path_uncompressed(self):
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'return.pkl')
+            _PickleDataLoader.save_to_s3(_compressible(1024 * 1024), path)
+
+            with open(path, 'rb') as file:
+                self.assertFalse(file.read().startswith(compression.MAGIC))
+
+    def test_staged_output_compressed(self):
+        with tmpdir() as directory, patch('pathway.runtime.dataset.STAGED_OUTPUT_DIR', directory):
+            path = os.path.join(directory, 'return.pkl')
+            _PickleDataLoader.save_to_s3(_compressible(1024 * 1024), path)
+
+            with open(path, 'rb') as file:
+                self.assertTrue(file.read().startswith(compression.MAGIC))
+            self.assertEqual(_compressible(1024 * 1024), _PickleDataLoader.load_from_s3(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from pathway.runtime import batch, disk_cache
+from pathway.runtime.dataset import _AsyncDataObject, _PickleDataLoader
+from pathway.runtime.disk_cache import DiskCache
+
+
+def _negate(x):
+    if x == 0:
+        raise ValueError("zero")
+    return -x
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = DiskCache(os.path.join(self.directory, 'cache'), max_bytes=1 << 20)
+        self.uri = f'file://{self.directory}/result.pkl'
+
+    def test_downloaded_once_per_version(self):
+        _PickleDataLoader.save_to_s3([1, 2, 3], self.uri)
+
+        with patch('pathway.runtime.disk_cache.open_reader', wraps=disk_cache.open_reader) as open_reader:
+            first = self.cache.fetch(self.uri)
+            self.assertEqual(first, self.cache.fetch(self.uri))
+            self.assertEqual([1, 2, 3], self.cache.load(self.uri))
+            self.assertEqual(1, open_reader.call_count)
+
+            time.sleep(0.01)
+            _PickleDataLoader.save_to_s3([4], self.uri)
+            self.assertNotEqual(first, self.cache.fetch(self.uri))
+            self.assertEqual(2, open_reader.call_count)
+
+    def test_least_recently_used_evicted(self):
+        cache = DiskCache(os.path.join(self.directory, 'small'), max_bytes=2500)
+        paths = {}
+        for name in ('a', 'b', 'c'):
+            uri = f'file://{self.directory}/{name}'
+            with open(uri[len('file://'):], 'wb') as file:
+                file.write(name.encode() * 1000)
+            paths[name] = cache.fetch(uri)
+            # 'a' is used again before 'c' is added
+            if name == 'b':
+                os.utime(paths['a'], (time.time() + 1, time.time() + 1))
+
+        self.assertTrue(os.path.exists(paths['a']))
+        self.assertFalse(os.path.exists(paths['b']))
+        self.assertTrue(os.path.exists(paths['c']))
+
+    def test_new_entry_not_evicted(self):
+        cache = DiskCache(os.path.join(self.directory, 'small'), max_bytes=1500)
+        for name in ('a', 'b'):
+            with open(os.path.join(self.directory, name), 'wb') as file:
+                file.write(name.encode() * 1000)
+
+        first = cache.fetch(f'file://{self.directory}/a')
+        second = cache.fetch(f'file://{self.directory}/b')
+
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+
+    def test_larger_than_cache_read_directly(self):
+        cache = DiskCache(os.path.join(self.directory, 'small'), max_bytes=1000)
+        _PickleDataLoader.save_to_s3(list(range(10000)), self.uri)
+
+        self.assertIsNone(cache.fetch(self.uri))
+        self.assertEqual(list(range(10000)), cache.load(self.uri))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'small')))
+
+    def test_batch_items(self):
+        uri = f'file://{self.directory}/results{batch.BATCH_SUFFIX}'
+        batch.run_batch(_negate, [{'x': 1}, {'x': 0}], uri, max_workers=1)
+
+        self.assertEqual(-1, self.cache.load(batch.item_uri(uri, 0)))
+        with self.assertRaisesRegex(RuntimeError, 'zero'):
+            self.cache.load(batch.item_uri(uri, 1))
+
+    def test_missing_object(self):
+        with self.assertRaises(FileNotFoundError):
+            self.cache.fetch(f'file://{self.directory}/missing')
+
+
+class AsyncDataObjectTestCase(unittest.TestCase):
+    def test_none_result_loaded_once(self):
+        job = Mock()
+        job.is_completed.return_value = True
+        data_object = _AsyncDataObject(job, 's3://bucket/job/outputs/return.pkl')
+
+        with patch('pathway.runtime.disk_cache.load_result', return_value=None) as load_result:
+            self.assertIsNone(data_object.get())
+            self.assertIsNone(data_object.get())
+
+        load_result.assert_called_once_with('s3://bucket/job/outputs/return.pkl')
+
+    def test_prefetch_when_job_completes(self):
+        job = Mock()
+        job.is_completed.return_value = True
+        job.add_done_callback.side_effect = lambda callback: callback(job)
+        cache = Mock()
+        data_object = _AsyncDataObject(job, 's3://bucket/job/outputs/return.pkl')
+
+        with patch('pathway.runtime.disk_cache.get_disk_cache', return_value=cache):
+            data_object.prefetch()
+            disk_cache._executor.submit(lambda: None).result()
+
+        cache.fetch.assert_called_once_with('s3://bucket/job/outputs/return.pkl')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+
+from pathway.runtime import metrics
+from pathway.runtime.metrics import Metrics, load_metrics
+from pathway.runtime.process_entry_point import processing_script
+from pathway.util import tmpdir
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_phases_and_bytes(self):
+        with Metrics(host='algo-1') as collected:
+            with metrics.phase('code_fetch', uri='s3://bucket/code.pkl'):
+                metrics.add_bytes(100)
+                metrics.add_bytes(50)
+            with metrics.phase('user_function'):
+                pass
+
+        document = collected.to_dict()
+        self.assertEqual('Completed', document['status'])
+        self.assertEqual(['code_fetch', 'user_function'], [record['name'] for record in document['phases']])
+        self.assertEqual(150, document['phases'][0]['bytes'])
+        self.assertIn('throughput', document['phases'][0])
+        self.assertNotIn('bytes', document['phases'][1])
+
+    def test_inactive_metrics_are_ignored(self):
+        with metrics.phase('user_function') as record:
+            metrics.add_bytes(10)
+        self.assertEqual({}, record)
+
+    def test_save_and_load(self):
+        with tmpdir() as directory:
+            with self.assertRaises(RuntimeError):
+                with Metrics(host='algo-2') as collected:
+                    raise RuntimeError("boom")
+            collected.save(f'file://{directory}/metrics')
+
+            documents = load_metrics(f'file://{directory}/metrics')
+
+        self.assertEqual(['algo-2'], list(documents))
+        self.assertEqual('Failed', documents['algo-2']['status'])
+        self.assertIn('boom', documents['algo-2']['error'])
+
+    def test_processing_script_writes_metrics(self):
+        def func(x: float):
+            pass
+
+        with tmpdir() as directory, \
+                patch('pathway.runtime.process_entry_point._get_function', return_value=func):
+            processing_script(['--func-code', 'file:///func', '--x', '0.0', '--pathway-metrics', directory])
+
+            [document] = load_metrics(directory).values()
+
+        self.assertEqual('Completed', document['status'])
+        self.assertEqual(['user_function', 'output_flush'], [record['name'] for record in document['phases']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,13 @@
+import os
+import time
 import unittest
 
+import cloudpickle
+
 from pathway.runtime.process_entry_point import processing_script
-from pathway.runtime.dataset import DataObject
+from pathway.runtime.dataset import DataObject, _PickleDataLoader
+from pathway.util import tmpdir
+from test.fake_s3 import FakeS3Client
 from unittest.mock import Mock, patch
 
 
@@ -54,6 +60,41 @@ class ProcessingEntryPointTestCase(unittest.TestCase):
                     func_mock.assert_called_once_with(x=3)
                     mock_save_to_s3.assert_called_once_with(4, '/opt/return')
 
+    def test_arguments_downloaded_during_bootstrap(self):
+        client = FakeS3Client()
+
+        def func(x: DataObject) -> DataObject:
+            return x + 1
+
+        def bootstrap(env_def):
+            # both objects are fetched before the environment is ready
+            deadline = time.monotonic() + 10
+            while client.calls.count('get_object') < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(client.calls.count('get_object'), 2)
+
+        client.objects[('bucket', 'func.pkl')] = cloudpickle.dumps(func)
+        with patch('pathway.runtime.clients.client', return_value=client), \
+                patch('pathway.runtime.process_entry_point.bootstrap', side_effect=bootstrap), tmpdir() as directory:
+            _PickleDataLoader.save_to_s3(3, 's3://bucket/x.pkl')
+            processing_script(['--func-code', 's3://bucket/func.pkl', '--env-def', 's3://env-def',
+                               '--x', 's3://bucket/x.pkl', '--pathway-prefetch', 'x',
+                               '--return', f'file://{directory}/return.pkl'])
+
+            self.assertEqual(4, _PickleDataLoader.load_from_s3(f'file://{directory}/return.pkl'))
+
+    def test_parameters_named_like_runtime_options(self):
+        func_mock = Mock()
+
+        def func(batch: str, m: int, metrics: str):
+            func_mock(batch=batch, m=m, metrics=metrics)
+
+        with patch('pathway.runtime.process_entry_point._get_function', return_value=func), tmpdir() as directory:
+            processing_script(['--func-code', 's3://func', '--batch', 'hello', '--m', '3', '--metrics', 'x',
+                               '--pathway-metrics', directory])
+
+            func_mock.assert_called_once_with(batch='hello', m=3, metrics='x')
+            self.assertTrue(os.listdir(directory))
 
 if __name__ == '__main__':
     unittest.main()
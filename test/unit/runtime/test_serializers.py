@@ -0,0 +1,152 @@
+import io
+import os
+import pickle
+import unittest
+
+from pathway.runtime import serializers
+from pathway.util import tmpdir
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pandas
+    import pyarrow
+except ImportError:
+    pandas = None
+
+
+def _round_trip(data):
+    file = io.BytesIO()
+    name = serializers.dump(data, file)
+    file.seek(0)
+    return name, serializers.load(file)
+
+
+class SerializersTestCase(unittest.TestCase):
+    def test_pickle_out_of_band_buffers(self):
+        data = {'small': b'abc', 'large': bytearray(b'x' * (serializers.OUT_OF_BAND_THRESHOLD * 2))}
+
+        name, loaded = _round_trip(data)
+
+        self.assertEqual(name, 'pickle5')
+        self.assertEqual(loaded, data)
+
+    def test_canonical_sets_in_fixed_order(self):
+        words = [f'word-{i}' for i in range(1000)]
+        # equal sets built in another order can iterate in another order
+        first, second = io.BytesIO(), io.BytesIO()
+        serializers.dump({'words': set(words), 'frozen': frozenset(words)}, first, canonical=True)
+        serializers.dump({'words': set(reversed(words)), 'frozen': frozenset(reversed(words))}, second,
+                         canonical=True)
+
+        self.assertEqual(first.getvalue(), second.getvalue())
+        first.seek(0)
+        self.assertEqual({'words': set(words), 'frozen': frozenset(words)}, serializers.load(first))
+
+    def test_plain_pickle_without_canonical(self):
+        data = {'records': [{'id': i, 'value': i * 1.5} for i in range(100)], 'tags': {'a', 'b'}}
+        file = io.BytesIO()
+
+        serializers.dump(data, file)
+
+        # storage stays on the C pickler; no persistent ids are written
+        self.assertNotIn(serializers.SET_PERSISTENT_ID.encode(), file.getvalue())
+        file.seek(0)
+        self.assertEqual(data, serializers.load(file))
+
+    def test_serialized_is_canonical(self):
+        words = [f'word-{i}' for i in range(100)]
+
+        first, second = serializers.Serialized(set(words)), serializers.Serialized(set(reversed(words)))
+
+        self.assertEqual(first.digest, second.digest)
+        stored = io.BytesIO()
+        serializers.dump(first, stored)
+        stored.seek(0)
+        self.assertEqual(set(words), serializers.load(stored))
+
+    def test_legacy_pickle(self):
+        file = io.BytesIO(pickle.dumps([1, 2, 3]))
+        self.assertEqual(serializers.load(file), [1, 2, 3])
+
+    def test_load_file_maps_buffers(self):
+        data = bytearray(b'y' * (serializers.OUT_OF_BAND_THRESHOLD * 2))
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'data')
+            with open(path, 'wb') as file:
+                serializers.dump(data, file)
+            self.assertEqual(serializers.load_file(path), data)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        array = numpy.arange(100000, dtype='float64').reshape(1000, 100)
+
+        name, loaded = _round_trip(array)
+        self.assertEqual(name, 'npy')
+        numpy.testing.assert_array_equal(loaded, array)
+
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'array')
+            with open(path, 'wb') as file:
+                serializers.dump(array, file)
+            mapped = serializers.load_file(path)
+            self.assertIsInstance(mapped, numpy.memmap)
+            numpy.testing.assert_array_equal(mapped, array)
+            del mapped
+
+    @unittest.skipIf(pandas is None, "pandas and pyarrow are not installed")
+    def test_pandas(self):
+        frame = pandas.DataFrame({'a': range(10),
+                                  'b': pandas.Series([str(i) for i in range(10)], dtype='string'),
+                                  'c': pandas.Categorical(['x', 'y'] * 5),
+                                  'd': pandas.array([1, None] * 5, dtype='Int64'),
+                                  'e': pandas.date_range('2020-01-01', periods=10, tz='UTC')})
+
+        name, loaded = _round_trip(frame)
+
+        self.assertEqual(name, 'arrow-pandas')
+        pandas.testing.assert_frame_equal(loaded, frame)
+
+    @unittest.skipIf(pandas is None, "pandas and pyarrow are not installed")
+    def test_pandas_falls_back_to_pickle(self):
+        frame = pandas.DataFrame({'a': [object(), 1]})
+
+        name, _ = _round_trip(frame)
+
+        self.assertEqual(name, 'pickle5')
+
+    @unittest.skipIf(pandas is None, "pandas and pyarrow are not installed")
+    def test_pandas_lossy_in_arrow_pickled(self):
+        frames = {
+            'missing in object column': pandas.DataFrame({'a': pandas.Series([1, None], dtype=object)}),
+            'dict cells': pandas.DataFrame({'a': [{'x': 1}, {'y': 2}]}),
+            'list cells': pandas.DataFrame({'a': [[1], [2, 3]]}),
+            'complex': pandas.DataFrame({'a': numpy.array([1j, 2])}),
+            'object labels': pandas.DataFrame({'a': [1, 2]}, index=pandas.Index([1, 'y'], dtype=object)),
+        }
+        for case, frame in frames.items():
+            with self.subTest(case):
+                name, loaded = _round_trip(frame)
+
+                self.assertEqual(name, 'pickle5')
+                pandas.testing.assert_frame_equal(loaded, frame)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_subclass_pickled(self):
+        masked = numpy.ma.masked_array([1.0, 2.0, 3.0], mask=[False, True, False])
+        matrix = numpy.matrix([[1, 2], [3, 4]])
+
+        for data in (masked, matrix):
+            with self.subTest(type(data).__name__):
+                name, loaded = _round_trip(data)
+
+                self.assertEqual(name, 'pickle5')
+                self.assertIs(type(data), type(loaded))
+        numpy.testing.assert_array_equal(masked.mask, _round_trip(masked)[1].mask)
+
+
+if __name__ == '__main__':
+    unittest.main()
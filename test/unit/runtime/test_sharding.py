@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import Mock, patch
+
+from pathway.runtime.dataset import Input
+from pathway.runtime.process_entry_point import processing_script
+from pathway.runtime.sharding import InputSlice, shard_input
+from test.fake_s3 import FakeS3Client
+
+
+def _read(client, slices):
+    return b''.join(client.objects[('bucket', s.path[len('s3://bucket/'):])][s.start:s.end] for s in slices)
+
+
+class ShardInputTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeS3Client({
+            ('bucket', 'data/a.csv'): b''.join(b'a%03d\n' % i for i in range(100)),
+            ('bucket', 'data/b.csv'): b''.join(b'b%05d\n' % i for i in range(30)),
+            ('bucket', 'data/c.csv'): b'c\n' * 7,
+            ('bucket', 'other/d.csv'): b'd\n',
+        })
+
+    def _shards(self, sharding, size):
+        return [shard_input(Input('s3://bucket/data/', sharding=sharding), rank, size, s3_client=self.client).slices
+                for rank in range(size)]
+
+    def test_key_sharding_balances_objects(self):
+        shards = self._shards('key', 2)
+
+        self.assertEqual(shards[0], [InputSlice('s3://bucket/data/a.csv', 0, 500)])
+        self.assertEqual([s.path for s in shards[1]], ['s3://bucket/data/b.csv', 's3://bucket/data/c.csv'])
+
+    def test_range_sharding_covers_input(self):
+        shards = self._shards('range', 3)
+
+        self.assertEqual(b''.join(_read(self.client, slices) for slices in shards),
+                         b''.join(data for (_, key), data in sorted(self.client.objects.items()) if key.startswith('data/')))
+        self.assertEqual([sum(s.end - s.start for s in slices) for slices in shards], [241, 241, 242])
+
+    def test_record_sharding_keeps_records_whole(self):
+        for size in (1, 2, 3, 5, 16):
+            with self.subTest(size=size):
+                records = []
+                for slices in self._shards('record', size):
+                    for s in slices:
+                        data = _read(self.client, [s])
+                        self.assertTrue(data.endswith(b'\n'))
+                        records.extend(data.splitlines())
+                self.assertEqual(len(records), 137)
+
+    def test_single_object(self):
+        data = shard_input(Input('s3://bucket/data/c.csv', sharding='range'), 0, 1, s3_client=self.client)
+
+        self.assertEqual(data.slices, [InputSlice('s3://bucket/data/c.csv', 0, 14)])
+
+    def test_directory_without_slash_skips_sibling_prefix(self):
+        self.client.objects[('bucket', 'data-old/e.csv')] = b'e\n'
+
+        data = shard_input(Input('s3://bucket/data', sharding='key'), 0, 1, s3_client=self.client)
+
+        self.assertEqual(['s3://bucket/data/a.csv', 's3://bucket/data/b.csv', 's3://bucket/data/c.csv'],
+                         [s.path for s in data.slices])
+
+    def test_boundary_before_first_delimiter(self):
+        # a boundary closer to the start of the object than the delimiter is long
+        self.client.objects[('bucket', 'crlf.csv')] = b'ab\r\ncd\r\n'
+
+        shards = [shard_input(Input('s3://bucket/crlf.csv', sharding='record', record_delimiter=b'\r\n'),
+                              rank, 8, s3_client=self.client).slices for rank in range(8)]
+
+        self.assertEqual([b'ab\r\n', b'cd\r\n'], [_read(self.client, [s]) for slices in shards for s in slices])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            shard_input(Input('s3://bucket/data/', sharding='random'), 0, 1, s3_client=self.client)
+
+
+class ShardedProcessingScriptTestCase(unittest.TestCase):
+    @patch('pathway.runtime.process_entry_point.Cluster')
+    def test_input_sharded_by_rank(self, cluster_mock):
+        cluster_mock.return_value.rank = 1
+        cluster_mock.return_value.size = 4
+        func_mock = Mock()
+
+        def func(data: Input):
+            func_mock(data=data)
+
+        with patch('pathway.runtime.process_entry_point._get_function', return_value=func), \
+                patch('pathway.runtime.process_entry_point.shard_input') as shard_input_mock:
+            processing_script(['--func-code', 's3://func', '--data', 's3://bucket/data/',
+                               '--data-sharding', 'record', '--data-record-delimiter', '0a'])
+
+            shard_input_mock.assert_called_once_with(Input('s3://bucket/data/', sharding='record'), 1, 4)
+            func_mock.assert_called_once_with(data=shard_input_mock.return_value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+import io
+import os
+import unittest
+from unittest.mock import patch
+
+from pathway.runtime.dataset import Input, Output, _PickleDataLoader, _close_outputs
+from pathway.runtime.sharding import InputSlice
+from pathway.runtime.transfer import ChainedReader, S3Reader, S3Writer, MIN_PART_SIZE, open_reader, open_writer, \
+    ObjectInfo
+from pathway.util import tmpdir
+from test.fake_s3 import FakeS3Client
+
+
+class S3WriterTestCase(unittest.TestCase):
+    def test_small_object_single_put(self):
+        client = FakeS3Client()
+        with S3Writer('s3://bucket/key', s3_client=client) as writer:
+            writer.write(b'hello')
+
+        self.assertEqual(client.objects[('bucket', 'key')], b'hello')
+        self.assertEqual(client.calls, ['put_object'])
+
+    def test_multipart_upload(self):
+        client = FakeS3Client()
+        payload = bytes(range(256)) * (3 * MIN_PART_SIZE // 256 + 7)
+        with S3Writer('s3://bucket/key', part_size=MIN_PART_SIZE, max_concurrency=2, s3_client=client) as writer:
+            writer.write(payload)
+
+        self.assertEqual(client.objects[('bucket', 'key')], payload)
+        self.assertEqual(client.calls.count('upload_part'), 4)
+
+    def test_abort_on_error(self):
+        client = FakeS3Client()
+        with self.assertRaises(RuntimeError):
+            with S3Writer('s3://bucket/key', part_size=MIN_PART_SIZE, s3_client=client) as writer:
+                writer.write(b'x' * (MIN_PART_SIZE + 1))
+                raise RuntimeError
+
+        self.assertIn('abort_multipart_upload', client.calls)
+        self.assertNotIn(('bucket', 'key'), client.objects)
+
+
+class S3ReaderTestCase(unittest.TestCase):
+    def test_read_in_ranges(self):
+        client = FakeS3Client()
+        payload = bytes(range(256)) * 100
+        client.objects[('bucket', 'key')] = payload
+
+        with S3Reader('s3://bucket/key', part_size=1000, max_concurrency=3, s3_client=client) as reader:
+            self.assertEqual(reader.read(), payload)
+
+        self.assertEqual(client.calls.count('get_object'), 26)
+
+    def test_read_byte_range(self):
+        client = FakeS3Client()
+        client.objects[('bucket', 'key')] = b'0123456789'
+
+        with S3Reader('s3://bucket/key', part_size=3, s3_client=client, start=2, end=8) as reader:
+            self.assertEqual(reader.read(), b'234567')
+
+
+class LocalStreamTestCase(unittest.TestCase):
+    def test_file_uri_round_trip(self):
+        with tmpdir() as directory:
+            uri = f'file://{directory}/nested/key'
+            with open_writer(uri) as writer:
+                writer.write(b'0123456789')
+
+            with open_reader(uri, start=2, end=8) as reader:
+                self.assertEqual(reader.size, 8)
+                self.assertEqual(reader.read(), b'234567')
+
+    def test_abort_on_error(self):
+        with tmpdir() as directory:
+            with self.assertRaises(RuntimeError):
+                with open_writer(os.path.join(directory, 'key')) as writer:
+                    writer.write(b'partial')
+                    raise RuntimeError()
+
+            self.assertEqual(os.listdir(directory), [])
+
+
+class ChainedReaderTestCase(unittest.TestCase):
+    def test_read_across_objects(self):
+        client = FakeS3Client()
+        client.objects[('bucket', 'a')] = b'0123456789'
+        client.objects[('bucket', 'b')] = b'abcdef'
+
+        with patch('pathway.runtime.clients.client', return_value=client):
+            with ChainedReader([('s3://bucket/a', 2, 10), ('s3://bucket/b', 0, 6)], part_size=3) as reader:
+                self.assertEqual(io.BufferedReader(reader, buffer_size=4).read(), b'23456789abcdef')
+                self.assertEqual(reader.bytes_read, 14)
+
+    def test_next_object_is_prefetched(self):
+        client = FakeS3Client()
+        client.objects[('bucket', 'a')] = b'01234'
+        client.objects[('bucket', 'b')] = b'56789'
+
+        with patch('pathway.runtime.clients.client', return_value=client):
+            with ChainedReader([('s3://bucket/a', 0, 5), ('s3://bucket/b', 0, 5)], part_size=5) as reader:
+                self.assertEqual(reader.read(5), b'01234')
+                reader._upcoming._pending[0].result()
+                self.assertEqual(client.calls.count('get_object'), 2)
+
+
+class InputStreamTestCase(unittest.TestCase):
+    def test_open_prefix(self):
+        client = FakeS3Client()
+        client.objects[('bucket', 'data/1')] = b'one\n'
+        client.objects[('bucket', 'data/2')] = b'two\n'
+
+        with patch('pathway.runtime.clients.client', return_value=client), \
+                patch('pathway.runtime.transfer.list_objects',
+                      return_value=[ObjectInfo('s3://bucket/data/1', 4, 0, ''), ObjectInfo('s3://bucket/data/2', 4, 0, '')]):
+            with Input('s3://bucket/data/').open() as stream:
+                self.assertEqual(stream.read(), b'one\ntwo\n')
+
+    def test_iter_records_of_slices(self):
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'records')
+            with open(path, 'wb') as file:
+                file.write(b'{"a": 1}|{"a": 2}|{"a": 3}|')
+            data = Input(path, record_delimiter=b'|', slices=[InputSlice(path, 9, 27)])
+
+            self.assertEqual([{'a': 2}, {'a': 3}], list(data.iter_records(format='json')))
+            self.assertEqual(['{"a": 2}', '{"a": 3}'], list(data.iter_records(format='text')))
+
+    def test_iter_records_of_directory(self):
+        with tmpdir() as directory:
+            for name, content in (('1.csv', b'a,b\n1,"x\ny"\n'), ('2.csv', b'2,z')):
+                with open(os.path.join(directory, name), 'wb') as file:
+                    file.write(content)
+            data = Input(f'file://{directory}')
+
+            self.assertEqual([b'a,b', b'1,"x', b'y"', b'2,z'], list(data.iter_records(part_size=2)))
+            self.assertEqual([['a', 'b'], ['1', 'x\ny'], ['2', 'z']], list(data.iter_records(format='csv')))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            next(Input('unused').iter_records(format='parquet'))
+
+
+class OutputStreamTestCase(unittest.TestCase):
+    def test_multipart_upload_completed_on_close(self):
+        client = FakeS3Client()
+        payload = b'x' * (2 * MIN_PART_SIZE + 1)
+
+        with patch('pathway.runtime.clients.client', return_value=client):
+            stream = Output('s3://bucket/prefix/').open(name='data', part_size=MIN_PART_SIZE, max_concurrency=1)
+            stream.write(payload)
+            self.assertNotIn(('bucket', 'prefix/data'), client.objects)
+            _close_outputs()
+
+        self.assertEqual(client.objects[('bucket', 'prefix/data')], payload)
+        self.assertEqual(client.calls.count('upload_part'), 3)
+
+    def test_discarded_on_failure(self):
+        with tmpdir() as directory:
+            stream = Output(os.path.join(directory, 'text')).open('w')
+            stream.write('partial')
+            _close_outputs(abort=True)
+
+            self.assertTrue(stream.closed)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_unsupported_mode(self):
+        with self.assertRaises(ValueError):
+            Output('unused').open('rb')
+
+
+class PickleDataLoaderTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        client = FakeS3Client()
+        data = {'values': list(range(1000)), 'blob': b'x' * 100000}
+
+        with patch('pathway.runtime.clients.client', return_value=client):
+            _PickleDataLoader.save_to_s3(data, 's3://bucket/data.pkl')
+            self.assertEqual(_PickleDataLoader.load_from_s3('s3://bucket/data.pkl', part_size=4096), data)
+
+    def test_load_through_local_file(self):
+        client = FakeS3Client()
+        data = bytearray(b'z' * 200000)
+
+        with patch('pathway.runtime.clients.client', return_value=client), \
+                patch.object(_PickleDataLoader, 'MMAP_THRESHOLD', 0), tmpdir() as directory:
+            _PickleDataLoader.save_to_s3(data, 's3://bucket/prefix/data.pkl')
+            loaded = _PickleDataLoader.load_from_s3('s3://bucket/prefix/data.pkl', mmap_dir=directory)
+
+            self.assertEqual(loaded, data)
+            self.assertEqual(os.listdir(directory), ['prefix_data.pkl'])
+
+    def test_file_uri_round_trip(self):
+        data = bytearray(b'z' * 200000)
+
+        with tmpdir() as directory:
+            _PickleDataLoader.save_to_s3(data, f'file://{directory}/data.pkl')
+            self.assertEqual(_PickleDataLoader.load_from_s3(f'file://{directory}/data.pkl'), data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from pathway.cache import ResultCache, call_key
+from pathway.runtime import serializers
+from pathway.decorators import processing_job
+from pathway.runtime.dataset import DataObject, Output
+
+
+def func(data: DataObject, factor: float) -> DataObject:
+    return data * factor
+
+
+@processing_job(image_uri='unused', instance_type='local', cache=True)
+def cached_scale(data: DataObject, factor: float) -> DataObject:
+    return data * factor
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.result = os.path.join(self.root.name, 'return.pkl')
+        with open(self.result, 'wb') as file:
+            file.write(b'result')
+
+    def test_key_depends_on_content(self):
+        cache = ResultCache(f'file://{self.root.name}')
+
+        key = cache.key(func, 'image', 1, None, {'data': np.ones(3), 'factor': 2.0})
+
+        self.assertEqual(key, cache.key(func, 'image', 1, None, {'data': np.ones(3), 'factor': 2.0}))
+        self.assertNotEqual(key, cache.key(func, 'image', 1, None, {'data': np.zeros(3), 'factor': 2.0}))
+        self.assertNotEqual(key, cache.key(func, 'image', 1, None, {'data': np.ones(3), 'factor': 3.0}))
+        self.assertNotEqual(key, cache.key(func, 'other', 1, None, {'data': np.ones(3), 'factor': 2.0}))
+        self.assertNotEqual(key, cache.key(func, 'image', 1, None, {'data': Output('s3://bucket/out'),
+                                                                     'factor': 2.0}))
+
+    def test_key_is_the_same_in_every_process(self):
+        # string hashing, and so the order of set members, changes with the hash seed
+        script = textwrap.dedent('''
+            from pathway.cache import call_key
+
+            LABELS = {'x', 'y', 'z', 'w', 'v'}
+
+            def labelled(data, options):
+                return [label for label in LABELS if label in data]
+
+            print(call_key(labelled, 'image', 1, None,
+                           {'data': frozenset({'x', 'y', 'z', 'w'}), 'options': {'tags': {'a', 'b', 'c', 'd'}}}))
+        ''')
+        keys = set()
+        for seed in ('1', '2', '3'):
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=os.pathsep.join(sys.path))
+            output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                                    check=True).stdout
+            keys.add(output.split()[-1])
+
+        self.assertEqual(1, len(keys))
+
+    def test_key_follows_captured_values(self):
+        scale = [2]
+
+        def scaled(x):
+            return x * scale[0]
+
+        before = call_key(scaled, 'image', 1, None, {'x': 1})
+        scale[0] = 100
+
+        self.assertNotEqual(before, call_key(scaled, 'image', 1, None, {'x': 1}))
+
+    def test_serialized_arguments_are_kept(self):
+        serialized = {}
+        data = {'values': list(range(100))}
+
+        key = call_key(func, 'image', 1, None, {'data': data, 'factor': 2.0}, serialized)
+
+        self.assertEqual(key, call_key(func, 'image', 1, None, {'data': data, 'factor': 2.0}))
+        self.assertEqual(['data'], list(serialized))
+        expected, kept = io.BytesIO(), io.BytesIO()
+        serializers.dump(data, expected)
+        serializers.dump(serialized['data'], kept)
+        self.assertEqual(expected.getvalue(), kept.getvalue())
+
+    def test_put_and_get(self):
+        cache = ResultCache(f'file://{self.root.name}')
+
+        self.assertIsNone(cache.get('key'))
+        cache.put('key', 'job-name', self.result)
+
+        entry = cache.get('key')
+        self.assertEqual('job-name', entry.job_name)
+        self.assertEqual(self.result, entry.result)
+
+    def test_expired_entry(self):
+        cache = ResultCache(f'file://{self.root.name}', ttl=-1)
+
+        cache.put('key', 'job-name', self.result)
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_missing_result(self):
+        cache = ResultCache(f'file://{self.root.name}')
+
+        cache.put('key', 'job-name', self.result)
+        os.remove(self.result)
+
+        self.assertIsNone(cache.get('key'))
+
+    def test_evict_oldest(self):
+        cache = ResultCache(f'file://{self.root.name}', max_entries=2)
+
+        for i, key in enumerate(['a', 'b', 'c']):
+            cache.put(key, f'job-{key}', self.result)
+            entry = os.path.join(self.root.name, 'pathway-cache', f'{key}.json')
+            modified = time.time() - 100 * (3 - i)
+            os.utime(entry, (modified, modified))
+
+        cache.put('d', 'job-d', self.result)
+
+        self.assertEqual(['c.json', 'd.json'], sorted(os.listdir(os.path.join(self.root.name, 'pathway-cache'))))
+
+
+class CachedProcessingJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.store = tempfile.TemporaryDirectory()
+        patcher = patch('pathway.local.LOCAL_STORE_DIR', self.store.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.store.cleanup)
+
+    def test_hit_reuses_completed_job(self):
+        first = cached_scale(np.arange(4.0), 2.0)
+        first.wait()
+
+        with patch('pathway.local._launch') as launch_mock:
+            second = cached_scale(np.arange(4.0), 2.0)
+
+        launch_mock.assert_not_called()
+        self.assertEqual(first.job_name, second.job_name)
+        self.assertTrue(second.is_completed())
+        np.testing.assert_array_equal(np.arange(4.0) * 2.0, second.results.get())
+
+    def test_miss_on_changed_argument(self):
+        first = cached_scale(np.arange(4.0), 2.0)
+        first.wait()
+
+        second = cached_scale(np.arange(4.0), 3.0)
+        second.wait()
+
+        self.assertNotEqual(first.job_name, second.job_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+# cumulative import time of the runtime entry point, in seconds; boto3 alone takes longer
+IMPORT_TIME_BUDGET = float(os.environ.get('PATHWAY_IMPORT_TIME_BUDGET', '0.2'))
+
+HEAVY_MODULES = ('boto3', 'botocore', 'sagemaker', 'cloudpickle', 'numpy', 'pandas', 'pyarrow')
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True,
+                          env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+
+
+class ImportTimeTestCase(unittest.TestCase):
+    def test_runtime_cli_within_budget(self):
+        output = _python('-X', 'importtime', '-c', 'import pathway.runtime.cli.cli').stderr
+
+        match = re.search(r'^import time:\s+\d+ \|\s+(\d+) \| pathway\.runtime\.cli\.cli$', output, re.MULTILINE)
+        self.assertIsNotNone(match, output)
+        self.assertLess(int(match.group(1)) / 1e6, IMPORT_TIME_BUDGET)
+
+    def test_heavy_modules_not_imported(self):
+        modules = ['pathway.runtime.cli.cli', 'pathway.decorators', 'pathway.invoke', 'pathway.local',
+                   'pathway.cache', 'pathway.pipeline', 'pathway.monitor']
+        script = f"import sys, {', '.join(modules)}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+
+        self.assertEqual('', _python('-c', script).stdout.strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
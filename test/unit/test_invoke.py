@@ -1,15 +1,25 @@
 import unittest
-from typing import Callable, Any, Union
+from typing import Callable, Any, Union, get_type_hints
 from unittest.mock import patch, ANY, Mock
 
-from pathway.invoke import run_processing_job
+import numpy as np
+from botocore.exceptions import ClientError
+
+from pathway.invoke import run_processing_job, map_processing_jobs, _start_processing_job, ProcessingJob
+from pathway.pipeline import PipelineSession
 from pathway.runtime.dataset import Input, Output, DataObject, _AsyncDataObject
 
 
-@patch('pathway.invoke.Processor')
+@patch('pathway.invoke.get_sagemaker_session')
+@patch('sagemaker.processing.Processor')
 @patch('pathway.invoke.pickle_func', return_value='s3://func')
 class ProcessingJobTestCase(unittest.TestCase):
-    def test_run_function_as_processing_job(self, pickle_func_mock, processor_mock):
+    def setUp(self):
+        monitor_patcher = patch.object(ProcessingJob, 'monitor')
+        monitor_patcher.start()
+        self.addCleanup(monitor_patcher.stop)
+
+    def test_run_function_as_processing_job(self, pickle_func_mock, processor_mock, session_mock):
         def func(data: Input, output: Output, split_ratio: float):
             pass
 
@@ -17,6 +27,7 @@ class ProcessingJobTestCase(unittest.TestCase):
         run_processing_job(
             image_uri=base_image,
             instance_type='ml.m5.large',
+            instance_count=1,
             environment_definition=None,
             func=func,
             arguments_dict={
@@ -30,7 +41,6 @@ class ProcessingJobTestCase(unittest.TestCase):
             instance_type='ml.m5.large',
             instance_count=1,
             role="arn:aws:iam::789267064511:role/service-role/AmazonSageMaker-ExecutionRole-20200403T112353",
-            entrypoint=['pathway-runtime'],
             sagemaker_session=ANY
         )
 
@@ -38,7 +48,8 @@ class ProcessingJobTestCase(unittest.TestCase):
             arguments=['--func-code', 's3://func',
                        '--data', 's3://input.csv',
                        '--output', 's3://output.csv',
-                       '--split_ratio', '0.7'],
+                       '--split_ratio', '0.7',
+                       '--pathway-metrics', '/opt/ml/processing/outputs/metrics'],
             inputs=ANY,
             outputs=ANY,
             job_name=ANY,
@@ -46,7 +57,25 @@ class ProcessingJobTestCase(unittest.TestCase):
             logs=False
         )
 
-    def test_run_function_with_data_objects(self, pickle_func_mock, processor_mock):
+    def test_function_metadata_computed_once(self, pickle_func_mock, processor_mock, session_mock):
+        def func(split_ratio: float) -> DataObject:
+            pass
+
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        with patch('pathway.invoke.get_type_hints', wraps=get_type_hints) as type_hints_mock:
+            for ratio in (0.1, 0.2, 0.3):
+                job = run_processing_job(image_uri='base_image', instance_type='ml.m5.large', instance_count=1,
+                                         environment_definition=None, func=func,
+                                         arguments_dict={'split_ratio': ratio})
+
+        type_hints_mock.assert_called_once_with(func)
+        # the code is pickled on every call, in case what it captures has changed
+        self.assertEqual(3, pickle_func_mock.call_count)
+        self.assertEqual(3, processor_mock.return_value.run.call_count)
+        self.assertEqual('0.3', processor_mock.return_value.run.call_args.kwargs['arguments'][3])
+        self.assertTrue(job.results._path.endswith('/outputs/return.pkl'))
+
+    def test_run_function_with_data_objects(self, pickle_func_mock, processor_mock, session_mock):
 
         def func(input_data: DataObject) -> DataObject:
             pass
@@ -58,6 +87,7 @@ class ProcessingJobTestCase(unittest.TestCase):
             job = run_processing_job(
                 image_uri=base_image,
                 instance_type='ml.m5.large',
+                instance_count=1,
                 environment_definition=None,
                 func=func,
                 arguments_dict={
@@ -71,13 +101,13 @@ class ProcessingJobTestCase(unittest.TestCase):
                 instance_type='ml.m5.large',
                 instance_count=1,
                 role="arn:aws:iam::789267064511:role/service-role/AmazonSageMaker-ExecutionRole-20200403T112353",
-                entrypoint=['pathway-runtime'],
                 sagemaker_session=ANY
             )
 
             processor_mock.return_value.run.assert_called_once_with(
                 arguments=['--func-code', 's3://func',
                            '--input_data', '/opt/ml/processing/inputs/input_data/input_data.pkl',
+                           '--pathway-metrics', '/opt/ml/processing/outputs/metrics',
                            '--return', '/opt/ml/processing/outputs/return.pkl'
                            ],
                 inputs=ANY,
@@ -89,7 +119,7 @@ class ProcessingJobTestCase(unittest.TestCase):
 
         mock_save_to_s3.assert_called_once()
 
-    def test_run_function_chain_jobs(self, pickle_func_mock, processor_mock):
+    def test_run_function_chain_jobs(self, pickle_func_mock, processor_mock, session_mock):
 
         def func(input_data: DataObject) -> DataObject:
             pass
@@ -101,6 +131,7 @@ class ProcessingJobTestCase(unittest.TestCase):
             job = run_processing_job(
                 image_uri=base_image,
                 instance_type='ml.m5.large',
+                instance_count=1,
                 func=func,
                 environment_definition=None,
                 arguments_dict={
@@ -114,13 +145,13 @@ class ProcessingJobTestCase(unittest.TestCase):
                 instance_type='ml.m5.large',
                 instance_count=1,
                 role="arn:aws:iam::789267064511:role/service-role/AmazonSageMaker-ExecutionRole-20200403T112353",
-                entrypoint=['pathway-runtime'],
                 sagemaker_session=ANY
             )
 
             processor_mock.return_value.run.assert_called_once_with(
                 arguments=['--func-code', 's3://func',
-                           '--input_data', 's3://first-job/input.pkl',
+                           '--input_data', '/opt/ml/processing/inputs/input_data/input.pkl',
+                           '--pathway-metrics', '/opt/ml/processing/outputs/metrics',
                            '--return', '/opt/ml/processing/outputs/return.pkl'
                            ],
                 inputs=ANY,
@@ -132,6 +163,264 @@ class ProcessingJobTestCase(unittest.TestCase):
 
         mock_save_to_s3.assert_not_called()
 
+    def test_chained_job_submitted_once_upstream_completes(self, pickle_func_mock, processor_mock, session_mock):
+        def func(input_data: DataObject) -> DataObject:
+            pass
+
+        upstream = Mock(job_name='first-job')
+        upstream.is_completed.return_value = False
+        input_data = _AsyncDataObject(job=upstream, path="s3://first-job/input.pkl")
+
+        job = run_processing_job(image_uri='base_image', instance_type='ml.m5.large', instance_count=1,
+                                 func=func, environment_definition=None, arguments_dict={'input_data': input_data})
+
+        processor_mock.return_value.run.assert_not_called()
+        self.assertEqual('Pending', job.describe()['ProcessingJobStatus'])
+
+        upstream.is_completed.return_value = True
+        done_callback = upstream.add_done_callback.call_args.args[0]
+        done_callback(upstream)
+        self.assertTrue(job._started.wait(timeout=10))
+        processor_mock.return_value.run.assert_called_once()
+
+    def test_chained_job_abandoned_when_upstream_fails(self, pickle_func_mock, processor_mock, session_mock):
+        def func(input_data: DataObject) -> DataObject:
+            pass
+
+        upstream = Mock(job_name='first-job')
+        upstream.is_completed.return_value = False
+        input_data = _AsyncDataObject(job=upstream, path="s3://first-job/input.pkl")
+        job = run_processing_job(image_uri='base_image', instance_type='ml.m5.large', instance_count=1,
+                                 func=func, environment_definition=None, arguments_dict={'input_data': input_data})
+
+        upstream.add_done_callback.call_args.args[0](upstream)
+
+        with self.assertRaises(ValueError):
+            job.wait()
+        processor_mock.return_value.run.assert_not_called()
+        job.monitor.track.assert_called_with(job.job_name, status='Failed')
+
+
+@patch('sagemaker.workflow.steps.ProcessingStep')
+@patch('sagemaker.workflow.pipeline_context.PipelineSession')
+@patch('pathway.invoke.get_sagemaker_session')
+@patch('sagemaker.processing.Processor')
+@patch('pathway.invoke.pickle_func', return_value='s3://func')
+class PipelineStepTestCase(unittest.TestCase):
+    def _build(self, *calls, **kwargs):
+        def func(data: DataObject, rate: float) -> DataObject:
+            pass
+
+        with PipelineSession('daily'), patch('pathway.runtime.dataset._PickleDataLoader.save_to_s3'):
+            for arguments in calls:
+                run_processing_job(image_uri='base_image', instance_type='ml.m5.large', instance_count=1,
+                                   func=func, environment_definition=None, arguments_dict=arguments, **kwargs)
+
+    def test_unchanged_step_has_same_name_and_arguments(self, pickle_func_mock, processor_mock, session_mock,
+                                                        pipeline_session_mock, step_mock):
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        self._build({'data': np.arange(4), 'rate': 0.5})
+        self._build({'data': np.arange(4), 'rate': 0.5}, {'data': np.arange(4), 'rate': 2.0})
+
+        names = [call.kwargs['name'] for call in step_mock.call_args_list]
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[1], names[2])
+        self.assertTrue(names[0].startswith('func-'))
+        arguments = [call.kwargs['arguments'] for call in processor_mock.return_value.run.call_args_list]
+        self.assertEqual(arguments[0], arguments[1])
+        self.assertNotEqual(arguments[1], arguments[2])
+
+    def test_outputs_under_execution_id(self, pickle_func_mock, processor_mock, session_mock,
+                                        pipeline_session_mock, step_mock):
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        self._build({'data': np.arange(4), 'rate': 0.5})
+
+        name = step_mock.call_args.kwargs['name']
+        outputs = processor_mock.return_value.run.call_args.kwargs['outputs']
+        # each execution of the pipeline writes its own outputs
+        self.assertEqual({'Std:Join': {'On': '/', 'Values': [f's3://bucket/pipelines/daily/{name}',
+                                                             {'Get': 'Execution.PipelineExecutionId'},
+                                                             'outputs']}},
+                         outputs[0].destination.expr)
+        inputs = processor_mock.return_value.run.call_args.kwargs['inputs']
+        self.assertEqual(f's3://bucket/pipelines/daily/{name}/data.pkl', inputs[0].source)
+
+    def test_same_call_twice_gets_numbered_step(self, pickle_func_mock, processor_mock, session_mock,
+                                                pipeline_session_mock, step_mock):
+        self._build({'data': 1, 'rate': 0.5}, {'data': 1, 'rate': 0.5})
+
+        first, second = [call.kwargs['name'] for call in step_mock.call_args_list]
+        self.assertEqual(f'{first}-2', second)
+
+    def test_step_cache_config(self, pickle_func_mock, processor_mock, session_mock, pipeline_session_mock,
+                               step_mock):
+        from sagemaker.workflow.steps import CacheConfig
+
+        self._build({'data': 1, 'rate': 0.5})
+        self._build({'data': 1, 'rate': 0.5}, cache=True)
+        self._build({'data': 1, 'rate': 0.5}, cache=CacheConfig(enable_caching=True, expire_after='P30D'))
+
+        configs = [call.kwargs['cache_config'] for call in step_mock.call_args_list]
+        self.assertIsNone(configs[0])
+        self.assertEqual('PT168H', configs[1].expire_after)
+        self.assertEqual('P30D', configs[2].expire_after)
+
+
+@patch('pathway.invoke.get_sagemaker_session')
+@patch('sagemaker.processing.Processor')
+@patch('pathway.invoke.pickle_func', return_value='s3://func')
+class ProcessingChannelsTestCase(unittest.TestCase):
+    def setUp(self):
+        monitor_patcher = patch.object(ProcessingJob, 'monitor')
+        monitor_patcher.start()
+        self.addCleanup(monitor_patcher.stop)
+
+    def _run(self, func, arguments_dict, **kwargs):
+        return run_processing_job(image_uri='base_image', instance_type='ml.m5.large', instance_count=2,
+                                  environment_definition=None, func=func, arguments_dict=arguments_dict,
+                                  **kwargs)
+
+    def test_data_and_return_channels(self, pickle_func_mock, processor_mock, session_mock):
+        def func(input_data: DataObject) -> DataObject:
+            pass
+
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        with patch('pathway.runtime.dataset._PickleDataLoader.save_to_s3'):
+            job = self._run(func, {'input_data': DataObject.set(0.3)}, input_mode='FastFile')
+
+        run_kwargs = processor_mock.return_value.run.call_args.kwargs
+        [processing_input] = run_kwargs['inputs']
+        self.assertEqual(processing_input.source, f's3://bucket/{job.job_name}/input_data.pkl')
+        self.assertEqual(processing_input.destination, '/opt/ml/processing/inputs/input_data')
+        self.assertEqual(processing_input.input_name, 'input-data')
+        self.assertEqual(processing_input.s3_input_mode, 'FastFile')
+        [processing_output] = run_kwargs['outputs']
+        self.assertEqual(processing_output.source, '/opt/ml/processing/outputs')
+        self.assertEqual(processing_output.destination, f's3://bucket/{job.job_name}/outputs')
+        self.assertEqual(job.results._path, f's3://bucket/{job.job_name}/outputs/return.pkl')
+
+    def test_input_with_mode_sharded_by_key(self, pickle_func_mock, processor_mock, session_mock):
+        def func(data: Input):
+            pass
+
+        self._run(func, {'data': Input('s3://bucket/data/', sharding='key', mode='File')})
+
+        run_kwargs = processor_mock.return_value.run.call_args.kwargs
+        self.assertEqual(run_kwargs['arguments'], ['--func-code', 's3://func',
+                                                   '--data', '/opt/ml/processing/inputs/data',
+                                                   '--pathway-metrics', '/opt/ml/processing/outputs/metrics'])
+        [processing_input] = run_kwargs['inputs']
+        self.assertEqual(processing_input.s3_data_distribution_type, 'ShardedByS3Key')
+
+    def test_input_with_mode_rejects_range_sharding(self, pickle_func_mock, processor_mock, session_mock):
+        def func(data: Input):
+            pass
+
+        with self.assertRaises(ValueError):
+            self._run(func, {'data': Input('s3://bucket/data/', sharding='range', mode='File')})
+
+    def test_without_channels(self, pickle_func_mock, processor_mock, session_mock):
+        def func(input_data: DataObject) -> DataObject:
+            pass
+
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        with patch('pathway.runtime.dataset._PickleDataLoader.save_to_s3'):
+            job = self._run(func, {'input_data': DataObject.set(0.3)}, input_mode=None)
+
+        run_kwargs = processor_mock.return_value.run.call_args.kwargs
+        prefix = f's3://bucket/{job.job_name}'
+        self.assertEqual(run_kwargs['arguments'][2:], ['--input_data', f'{prefix}/input_data.pkl',
+                                                       '--pathway-prefetch', 'input_data',
+                                                       '--pathway-metrics', f'{prefix}/outputs/metrics',
+                                                       '--return', f'{prefix}/outputs/return.pkl'])
+        self.assertEqual(run_kwargs['inputs'], [])
+
+
+class FakeJob:
+    def __init__(self, arguments_dict):
+        self.arguments_dict = arguments_dict
+
+
+@patch('pathway.invoke.wait_any', side_effect=lambda jobs, timeout=None: jobs[-1])
+@patch('pathway.invoke.run_processing_job', side_effect=lambda *args, **kwargs: FakeJob(kwargs['arguments_dict']))
+class MapProcessingJobsTestCase(unittest.TestCase):
+    def _map(self, func, iterable, shared_arguments=None, **kwargs):
+        return list(map_processing_jobs('base_image', instance_type='ml.m5.large', instance_count=1,
+                                        environment_definition=None, func=func, iterable=iterable,
+                                        shared_arguments=shared_arguments or {}, **kwargs))
+
+    def test_one_job_per_item(self, run_processing_job_mock, wait_any_mock):
+        def func(x: int, y: float = 0.5):
+            pass
+
+        jobs = self._map(func, [1, (2, 0.1), {'x': 3}], max_concurrency=2)
+
+        self.assertEqual(run_processing_job_mock.call_count, 3)
+        self.assertCountEqual([dict(job.arguments_dict) for job in jobs],
+                              [{'x': 1}, {'x': 2, 'y': 0.1}, {'x': 3}])
+
+    def test_max_in_flight(self, run_processing_job_mock, wait_any_mock):
+        def func(x: int):
+            pass
+
+        jobs = self._map(func, range(5), max_in_flight=2)
+
+        self.assertEqual(len(jobs), 5)
+        self.assertTrue(all(len(call.args[0]) <= 2 for call in wait_any_mock.call_args_list))
+
+    def test_failed_submission_raised_after_started_jobs(self, run_processing_job_mock, wait_any_mock):
+        def func(x: int):
+            pass
+
+        def run(*args, **kwargs):
+            if kwargs['arguments_dict']['x'] == 1:
+                raise ValueError("no capacity")
+            return FakeJob(kwargs['arguments_dict'])
+
+        run_processing_job_mock.side_effect = run
+        yielded = []
+        with self.assertRaisesRegex(ValueError, 'no capacity'):
+            for job in map_processing_jobs('base_image', instance_type='ml.m5.large', instance_count=1,
+                                           environment_definition=None, func=func, iterable=range(4),
+                                           shared_arguments={}, max_concurrency=1):
+                yielded.append(job.arguments_dict['x'])
+
+        self.assertCountEqual([0, 2, 3], yielded)
+
+    @patch('pathway.invoke.get_sagemaker_session')
+    def test_shared_arguments_uploaded_once(self, session_mock, run_processing_job_mock, wait_any_mock):
+        def func(x: int, table: DataObject):
+            pass
+
+        session_mock.return_value.default_bucket.return_value = 'bucket'
+        with patch('pathway.runtime.dataset._PickleDataLoader.save_to_s3') as mock_save_to_s3:
+            jobs = self._map(func, range(3), shared_arguments={'table': DataObject.set([1, 2, 3])})
+
+        mock_save_to_s3.assert_called_once()
+        self.assertEqual(mock_save_to_s3.call_args.args[0], [1, 2, 3])
+        self.assertEqual(len({job.arguments_dict['table']._path for job in jobs}), 1)
+
+
+class StartProcessingJobTestCase(unittest.TestCase):
+    @patch('time.sleep')
+    def test_retry_on_throttling(self, sleep_mock):
+        processor = Mock()
+        processor.run.side_effect = [ClientError({'Error': {'Code': 'ThrottlingException'}}, 'CreateProcessingJob'),
+                                     None]
+
+        _start_processing_job(processor, job_name='job')
+
+        self.assertEqual(processor.run.call_count, 2)
+
+    def test_no_retry_on_other_errors(self):
+        processor = Mock()
+        processor.run.side_effect = ClientError({'Error': {'Code': 'ValidationException'}}, 'CreateProcessingJob')
+
+        with self.assertRaises(ClientError):
+            _start_processing_job(processor, job_name='job')
+
+        processor.run.assert_called_once()
+
 
 if __name__ == '__main__':
     unittest.main()
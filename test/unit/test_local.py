@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from pathway import local
+from pathway.decorators import processing_job
+from pathway.monitor import wait_all
+from pathway.runtime.dataset import DataObject, Output
+
+
+@processing_job(image_uri='unused', instance_type='local')
+def scale(data: DataObject, factor: float) -> DataObject:
+    return data * factor
+
+
+@processing_job(image_uri='unused', instance_type='local')
+def total(data: DataObject) -> DataObject:
+    return float(data.sum())
+
+
+@processing_job(image_uri='unused', instance_type='local')
+def write_lines(count: int, output: Output):
+    # left open: the runtime completes the upload
+    stream = output.open('w', name='lines.txt')
+    for i in range(count):
+        stream.write(f'{i}\n')
+
+
+@processing_job(image_uri='unused', instance_type='local')
+def fail(data: DataObject) -> DataObject:
+    raise RuntimeError("boom")
+
+
+class LocalProcessingJobTestCase(unittest.TestCase):
+    def setUp(self):
+        self.store = tempfile.TemporaryDirectory()
+        patcher = patch('pathway.local.LOCAL_STORE_DIR', self.store.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.store.cleanup)
+
+    def test_chained_jobs(self):
+        scaled = scale(np.arange(10, dtype=np.float64), 2.0)
+        summed = total(scaled.results)
+
+        summed.wait()
+
+        self.assertTrue(scaled.is_completed())
+        self.assertEqual('Completed', summed.status())
+        self.assertEqual(90.0, summed.results.get())
+        self.assertTrue(summed.results._path.startswith(f'file://{self.store.name}/'))
+        phases = [record['name'] for record in summed.metrics()['local']['phases']]
+        self.assertEqual(['code_fetch', 'code_unpickle', 'argument_load', 'user_function', 'output_flush',
+                          'result_save'], phases)
+
+    def test_jobs_run_in_parallel(self):
+        jobs = [scale(np.ones(4), float(i)) for i in range(4)]
+
+        self.assertTrue(wait_all(jobs, timeout=120))
+        self.assertEqual([4.0 * i for i in range(4)], [float(job.results.get().sum()) for job in jobs])
+
+    def test_output_stream_is_completed(self):
+        write_lines(1000, Output(f'file://{self.store.name}/written')).wait()
+
+        with open(os.path.join(self.store.name, 'written', 'lines.txt')) as file:
+            self.assertEqual([str(i) for i in range(1000)], file.read().split())
+
+    def test_failure_propagates_downstream(self):
+        failed = fail(np.ones(4))
+        downstream = total(failed.results)
+
+        with self.assertRaises(RuntimeError):
+            failed.wait()
+        with self.assertRaises(ValueError):
+            downstream.wait()
+        self.assertEqual('Failed', failed.status())
+        self.assertIn('boom', failed.describe()['FailureReason'])
+
+    def test_map(self):
+        finished = list(scale.map([(np.ones(2), 1.0), (np.ones(2), 3.0)]))
+
+        self.assertEqual(2, len(finished))
+        self.assertEqual({2.0, 6.0}, {float(job.results.get().sum()) for job in finished})
+
+    def test_batch(self):
+        results = scale.batch([{'data': np.ones(2) * i} for i in range(5)], per_job=2, factor=2.0)
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(3, len({id(result._job) for result in results}))
+        self.assertTrue(wait_all([result._job for result in results], timeout=120))
+        self.assertTrue(results[0]._path.endswith('.batch#0'))
+        self.assertEqual([4.0 * i for i in range(5)], [float(result.get().sum()) for result in results])
+
+    def test_batch_item_failure(self):
+        results = fail.batch([np.ones(2), np.ones(3)])
+
+        results[1]._job.wait()
+        with self.assertRaisesRegex(RuntimeError, 'boom'):
+            results[1].get()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+from botocore.exceptions import ClientError
+
+from pathway.monitor import JobMonitor
+
+
+def _summaries(**statuses):
+    return {'ProcessingJobSummaries': [
+        {'ProcessingJobName': name, 'ProcessingJobStatus': status} for name, status in statuses.items()
+    ]}
+
+
+class JobMonitorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.client = Mock()
+        # a long interval keeps the background thread out of the way
+        self.monitor = JobMonitor(self.client, interval=3600)
+
+    def test_one_list_call_updates_all_jobs(self):
+        self.client.list_processing_jobs.return_value = _summaries(a='Completed', b='InProgress', other='Failed')
+        self.monitor.track('a')
+        self.monitor.track('b')
+
+        self.monitor.refresh()
+
+        self.client.list_processing_jobs.assert_called_once()
+        self.assertEqual(self.monitor.status('a'), 'Completed')
+        self.assertEqual(self.monitor.status('b'), 'InProgress')
+
+    def test_paginates_until_all_jobs_found(self):
+        self.client.list_processing_jobs.side_effect = [
+            dict(_summaries(a='InProgress'), NextToken='next'),
+            _summaries(b='Stopped'),
+        ]
+        self.monitor.track('a')
+        self.monitor.track('b')
+
+        self.monitor.refresh()
+
+        self.assertEqual(self.client.list_processing_jobs.call_count, 2)
+        self.assertEqual(self.client.list_processing_jobs.call_args.kwargs['NextToken'], 'next')
+        self.assertEqual(self.monitor.status('b'), 'Stopped')
+
+    def test_done_callback_and_wait(self):
+        callback = Mock()
+        self.client.list_processing_jobs.return_value = _summaries(a='InProgress', b='InProgress')
+        self.monitor.add_done_callback('a', callback)
+        self.monitor.track('b')
+        self.monitor.refresh()
+        callback.assert_not_called()
+        self.assertIsNone(self.monitor.wait_any(['a', 'b'], timeout=0))
+
+        self.client.list_processing_jobs.return_value = _summaries(a='Completed', b='InProgress')
+        self.monitor.refresh()
+
+        callback.assert_called_once_with('a', 'Completed')
+        self.assertEqual(self.monitor.wait_any(['a', 'b'], timeout=0), 'a')
+        self.assertFalse(self.monitor.wait_all(['a', 'b'], timeout=0))
+
+    def test_finished_jobs_not_listed_again(self):
+        self.client.list_processing_jobs.return_value = _summaries(a='Completed')
+        self.monitor.track('a')
+        self.monitor.refresh()
+        self.monitor.refresh()
+
+        self.client.list_processing_jobs.assert_called_once()
+
+    def test_known_status_not_listed(self):
+        self.monitor.track('a', status='Completed')
+
+        self.assertEqual(self.monitor.wait_any(['a'], timeout=0), 'a')
+        self.monitor.refresh()
+        self.client.list_processing_jobs.assert_not_called()
+
+    def test_known_terminal_status_calls_back(self):
+        callback = Mock()
+        self.monitor.add_done_callback('a', callback)
+
+        self.monitor.track('a', status='Failed')
+
+        callback.assert_called_once_with('a', 'Failed')
+
+    def test_failing_callback_does_not_stop_others(self):
+        callback = Mock()
+        self.monitor.add_done_callback('a', Mock(side_effect=RuntimeError("broken")))
+        self.monitor.add_done_callback('a', callback)
+        self.client.list_processing_jobs.return_value = _summaries(a='Completed')
+
+        self.monitor.refresh()
+
+        callback.assert_called_once_with('a', 'Completed')
+
+    def test_job_never_listed_is_given_up(self):
+        monitor = JobMonitor(self.client, interval=3600, missing_after=0)
+        callback = Mock()
+        self.client.list_processing_jobs.return_value = _summaries(b='InProgress')
+        monitor.track('a', submitted_at=datetime.now(timezone.utc))
+        monitor.track('b', submitted_at=datetime.now(timezone.utc))
+        monitor.track('c')
+        monitor.add_done_callback('a', callback)
+
+        monitor.refresh()
+
+        callback.assert_called_once_with('a', 'Failed')
+        self.assertEqual('InProgress', monitor.status('b'))
+        # a job tracked before it was submitted is not given up
+        self.assertIsNone(monitor.status('c'))
+
+    def test_held_job_not_listed_until_submitted(self):
+        callback = Mock()
+        self.client.list_processing_jobs.return_value = _summaries(a='InProgress')
+        self.monitor.hold('b')
+        self.monitor.add_done_callback('b', callback)
+        self.assertIsNone(self.monitor.status('b'))
+        self.assertIsNone(self.monitor.wait_any(['b'], timeout=0))
+
+        self.monitor.refresh()
+        self.client.list_processing_jobs.assert_not_called()
+
+        self.monitor.track('a')
+        self.monitor.refresh()
+        self.client.list_processing_jobs.assert_called_once()
+        self.assertIsNone(self.monitor.status('b'))
+        self.client.list_processing_jobs.assert_called_once()
+
+        self.monitor.track('b', submitted_at=datetime.now(timezone.utc))
+        self.client.list_processing_jobs.return_value = _summaries(a='InProgress', b='Completed')
+        self.monitor.refresh()
+        callback.assert_called_once_with('b', 'Completed')
+
+    def test_held_job_abandoned_calls_back(self):
+        callback = Mock()
+        self.monitor.hold('a')
+        self.monitor.add_done_callback('a', callback)
+
+        self.monitor.track('a', status='Failed')
+
+        callback.assert_called_once_with('a', 'Failed')
+        self.client.list_processing_jobs.assert_not_called()
+
+    def test_polling_backs_off_on_throttling(self):
+        monitor = JobMonitor(self.client, interval=0.01, max_interval=0.04)
+        calls = []
+
+        def list_processing_jobs(**kwargs):
+            calls.append(kwargs)
+            if len(calls) < 3:
+                raise ClientError({'Error': {'Code': 'ThrottlingException'}}, 'ListProcessingJobs')
+            return _summaries(a='Completed')
+
+        self.client.list_processing_jobs.side_effect = list_processing_jobs
+        monitor.track('a')
+
+        self.assertTrue(monitor.wait_all(['a'], timeout=5))
+        self.assertEqual(len(calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
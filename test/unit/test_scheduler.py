@@ -0,0 +1,151 @@
+import threading
+import time
+import unittest
+
+from pathway.scheduler import DagScheduler, upstream_jobs
+from pathway.runtime.dataset import _AsyncDataObject, _StoredDataObject
+
+
+class FakeJob:
+    def __init__(self, job_name):
+        self.job_name = job_name
+        self.status = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def is_completed(self):
+        return self.status == 'Completed'
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if self.status is None:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def finish(self, status='Completed'):
+        with self._lock:
+            self.status = status
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class DagSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.launched = []
+        self.abandoned = {}
+        self.condition = threading.Condition()
+
+    def _schedule(self, scheduler, name, upstream=()):
+        job = FakeJob(name)
+
+        def launch():
+            with self.condition:
+                self.launched.append(name)
+                self.condition.notify_all()
+
+        def abandon(reason):
+            with self.condition:
+                self.abandoned[name] = reason
+                self.condition.notify_all()
+            job.finish('Failed')
+
+        scheduler.schedule(job, upstream, launch, abandon)
+        return job
+
+    def _wait_for(self, predicate):
+        with self.condition:
+            self.assertTrue(self.condition.wait_for(predicate, timeout=10))
+
+    def test_job_waits_for_upstream(self):
+        scheduler = DagScheduler()
+        first = self._schedule(scheduler, 'first')
+        second = self._schedule(scheduler, 'second', [first])
+        self.assertEqual(['first'], self.launched)
+
+        first.finish()
+
+        self._wait_for(lambda: self.launched == ['first', 'second'])
+        second.finish()
+
+    def test_completed_upstream_does_not_wait(self):
+        scheduler = DagScheduler()
+        done = FakeJob('done')
+        done.status = 'Completed'
+
+        self._schedule(scheduler, 'next', [done])
+
+        self.assertEqual(['next'], self.launched)
+
+    def test_failure_abandons_downstream(self):
+        scheduler = DagScheduler()
+        first = self._schedule(scheduler, 'first')
+        second = self._schedule(scheduler, 'second', [first])
+        third = self._schedule(scheduler, 'third', [second])
+
+        first.finish('Failed')
+
+        self._wait_for(lambda: 'third' in self.abandoned)
+        self.assertEqual(['first'], self.launched)
+        self.assertIn("['first']", self.abandoned['second'])
+        self.assertIn("['second']", self.abandoned['third'])
+        self.assertEqual('Failed', third.status)
+
+    def test_cap_runs_critical_path_first(self):
+        scheduler = DagScheduler(max_running=1)
+        blocker = self._schedule(scheduler, 'blocker')
+        self._schedule(scheduler, 'short')
+        long = self._schedule(scheduler, 'long')
+        # 'long' heads a chain of three jobs, 'short' is on its own
+        middle = self._schedule(scheduler, 'middle', [long])
+        self._schedule(scheduler, 'last', [middle])
+        self.assertEqual(['blocker'], self.launched)
+
+        blocker.finish()
+        self._wait_for(lambda: len(self.launched) == 2)
+        self.assertEqual('long', self.launched[1])
+
+        long.finish()
+        self._wait_for(lambda: len(self.launched) == 3)
+        # 'middle' is still ahead of 'short' on the critical path
+        self.assertEqual('middle', self.launched[2])
+        self.assertNotIn('short', self.launched)
+
+    def test_cancel_before_launch(self):
+        scheduler = DagScheduler()
+        first = self._schedule(scheduler, 'first')
+        second = self._schedule(scheduler, 'second', [first])
+
+        self.assertTrue(scheduler.cancel('second'))
+        self.assertFalse(scheduler.cancel('first'))
+        first.finish()
+        time.sleep(0.1)
+
+        self.assertEqual(['first'], self.launched)
+        self.assertIsNone(second.status)
+
+    def test_launch_error_is_raised_when_started_at_once(self):
+        scheduler = DagScheduler(max_running=1)
+        job = FakeJob('broken')
+
+        def launch():
+            raise RuntimeError("no capacity")
+
+        with self.assertRaises(RuntimeError):
+            scheduler.schedule(job, [], launch, lambda reason: job.finish('Failed'))
+
+        # the slot is given back
+        self._schedule(scheduler, 'next')
+        self.assertEqual(['next'], self.launched)
+
+    def test_upstream_jobs(self):
+        first, second = FakeJob('first'), FakeJob('second')
+        calls = [{'x': _AsyncDataObject(first, 'file:///x'), 'y': _StoredDataObject('file:///y'), 'z': 1},
+                 {'x': _AsyncDataObject(first, 'file:///x'), 'y': _AsyncDataObject(second, 'file:///y')}]
+
+        self.assertEqual([first, second], upstream_jobs(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+from pathway import util
+from pathway.runtime.process_entry_point import _get_function
+from pathway.util import pickle_func, pickle_func_to_directory, tmpdir
+
+
+def _not_found(*args, **kwargs):
+    raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+
+
+class PickleFuncTestCase(unittest.TestCase):
+    def setUp(self):
+        util._uploaded_objects.clear()
+        self.s3_client = Mock()
+
+    def test_content_addressed_key(self):
+        def func(x: int):
+            return x
+
+        self.s3_client.head_object.side_effect = _not_found
+
+        location = pickle_func(func, self.s3_client, 'my-bucket')
+
+        self.assertRegex(location, r'^s3://my-bucket/code/[0-9a-f]{64}\.pkl$')
+        self.s3_client.put_object.assert_called_once()
+
+    def test_repeat_submission_skips_upload(self):
+        def func(x: int):
+            return x
+
+        self.s3_client.head_object.side_effect = _not_found
+
+        first = pickle_func(func, self.s3_client, 'my-bucket')
+        second = pickle_func(func, self.s3_client, 'my-bucket')
+
+        self.assertEqual(first, second)
+        self.s3_client.head_object.assert_called_once()
+        self.s3_client.put_object.assert_called_once()
+
+    def test_mutated_capture_uploaded_again(self):
+        scale = [2]
+
+        def func(x: int):
+            return x * scale[0]
+
+        self.s3_client.head_object.side_effect = _not_found
+
+        first = pickle_func(func, self.s3_client, 'my-bucket')
+        scale[0] = 100
+        second = pickle_func(func, self.s3_client, 'my-bucket')
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(2, self.s3_client.put_object.call_count)
+
+    def test_existing_object_not_uploaded(self):
+        def func(x: int):
+            return x
+
+        pickle_func(func, self.s3_client, 'my-bucket')
+
+        self.s3_client.put_object.assert_not_called()
+
+    def test_large_captured_object_stored_apart(self):
+        table = np.arange(1000, dtype=np.float64)
+
+        def func(x: int):
+            return table[x]
+
+        self.s3_client.head_object.side_effect = _not_found
+
+        with patch('pathway.util.EXTERNALIZE_THRESHOLD', 4096):
+            location = pickle_func(func, self.s3_client, 'my-bucket')
+
+        keys = [call.kwargs['Key'] for call in self.s3_client.put_object.call_args_list]
+        self.assertEqual(2, len(keys))
+        self.assertRegex(keys[0], r'^code/blobs/[0-9a-f]{64}\.pkl$')
+        self.assertEqual(location, f's3://my-bucket/{keys[1]}')
+        self.assertLess(len(self.s3_client.put_object.call_args_list[1].kwargs['Body']), 4096)
+
+    def test_blob_shared_between_functions(self):
+        table = np.arange(1000, dtype=np.float64)
+
+        def first(x: int):
+            return table[x]
+
+        def second(x: int):
+            return table[-x]
+
+        self.s3_client.head_object.side_effect = _not_found
+
+        with patch('pathway.util.EXTERNALIZE_THRESHOLD', 4096):
+            pickle_func(first, self.s3_client, 'my-bucket')
+            pickle_func(second, self.s3_client, 'my-bucket')
+
+        keys = [call.kwargs['Key'] for call in self.s3_client.put_object.call_args_list]
+        self.assertEqual(1, len([key for key in keys if '/blobs/' in key]))
+        self.assertEqual(3, len(keys))
+
+    def test_large_payload_warning(self):
+        blob = np.ones(1000)
+
+        def func(x: int):
+            return blob
+
+        with patch('pathway.util.LARGE_PAYLOAD_THRESHOLD', 1024), \
+                patch('pathway.util.EXTERNALIZE_THRESHOLD', 1 << 30), \
+                self.assertWarnsRegex(UserWarning, 'func pickles to'):
+            pickle_func(func, self.s3_client, 'my-bucket')
+
+
+class UploadEnvironmentDefinitionTestCase(unittest.TestCase):
+    def setUp(self):
+        util._uploaded_environments.clear()
+        self.s3_client = Mock()
+        self.s3_client.head_object.side_effect = _not_found
+
+    def test_uploaded_once_per_content(self):
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'environment.yml')
+            with open(path, 'w') as file:
+                file.write('dependencies: [numpy]')
+
+            first = util.upload_environment_definition(path, self.s3_client, 'my-bucket')
+            second = util.upload_environment_definition(path, self.s3_client, 'my-bucket')
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^s3://my-bucket/env/[0-9a-f]{64}/environment\.yml$')
+        self.s3_client.upload_file.assert_called_once()
+        self.s3_client.head_object.assert_called_once()
+
+    def test_changed_file_uploaded_again(self):
+        with tmpdir() as directory:
+            path = os.path.join(directory, 'requirements.txt')
+            locations = []
+            for content in ('numpy', 'numpy\npandas'):
+                with open(path, 'w') as file:
+                    file.write(content)
+                locations.append(util.upload_environment_definition(path, self.s3_client, 'my-bucket'))
+
+        self.assertNotEqual(locations[0], locations[1])
+        self.assertEqual(2, self.s3_client.upload_file.call_count)
+
+
+class ExternalizedObjectTestCase(unittest.TestCase):
+    def test_small_captured_objects_not_serialized(self):
+        table = np.arange(10, dtype=np.float64)
+        name = 'table'
+        options = {'scale': 2}
+
+        def func(x: int):
+            return table[x], name, options
+
+        with patch('pathway.runtime.serializers.dump') as dump_mock:
+            self.assertEqual({}, util._large_captured_objects(func))
+
+        # only the dict, whose size is not known without serializing it
+        dump_mock.assert_called_once()
+        self.assertIs(options, dump_mock.call_args.args[0])
+
+    def test_runtime_loads_stored_object(self):
+        table = np.arange(1000, dtype=np.float64)
+
+        def func(x: int):
+            return table[x]
+
+        with tmpdir() as directory, patch('pathway.util.EXTERNALIZE_THRESHOLD', 4096):
+            location = pickle_func_to_directory(func, directory)
+            self.assertEqual(1, len(os.listdir(os.path.join(directory, 'code', 'blobs'))))
+
+            loaded = _get_function(location)
+
+        self.assertEqual(7.0, loaded(7))
+
+    def test_runtime_loads_captured_sets(self):
+        labels = {'x', 'y', 'z'}
+        frozen = frozenset({1, 2, 3})
+
+        def func(x):
+            return x in labels, x in frozen
+
+        with tmpdir() as directory:
+            loaded = _get_function(pickle_func_to_directory(func, directory))
+
+        self.assertEqual((True, False), loaded('x'))
+        self.assertEqual((False, True), loaded(2))
+
+
+if __name__ == '__main__':
+    unittest.main()